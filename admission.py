@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Control de admisión para nServer: un límite de peticiones por IP con
+    token bucket (por clase de ruta, p. ej. lecturas frente a escrituras)
+    y un tope global de peticiones atendiéndose a la vez (las conexiones
+    inactivas y los streams de eventos no cuentan). Cuando se supera
+    un límite el servidor responde 429 o 503 con Retry-After en lugar de
+    aceptar más trabajo.
+"""
+import threading
+import time
+
+MAX_CLIENTS = 10000
+
+
+class RateLimiter:
+    """Token bucket per key: rate tokens per second, at most burst stored."""
+
+    def __init__(self, rate, burst=None, max_clients=MAX_CLIENTS):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.max_clients = max_clients
+        self.buckets = {}  # key -> [tokens, last update]
+        self.lock = threading.Lock()
+
+    def acquire(self, key, now=None):
+        """Take a token for key. Returns 0 if allowed, otherwise the seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                if len(self.buckets) >= self.max_clients:
+                    self._prune(now)
+                bucket = self.buckets[key] = [self.burst, now]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0.0
+            bucket[0] = tokens
+            return (1 - tokens) / self.rate
+
+    def _prune(self, now):
+        # A bucket that has refilled completely behaves like a new one, so it can go.
+        full = [key for key, (tokens, updated) in self.buckets.items()
+                if tokens + (now - updated) * self.rate >= self.burst]
+        for key in full:
+            del self.buckets[key]
+        if len(self.buckets) >= self.max_clients:
+            del self.buckets[min(self.buckets, key=lambda k: self.buckets[k][1])]
+
+
+class InFlightSlot:
+    """One connection's place under the global cap on requests being served.
+
+    The connection gives it back while it only waits (idle between
+    keep-alive requests) or streams events for as long as the client
+    listens, so those cannot lock everybody else out; reacquire() takes a
+    place again before the next request is served.
+    """
+
+    def __init__(self, semaphore):
+        self.semaphore = semaphore
+        self.held = True
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self.semaphore.release()
+
+    def reacquire(self):
+        """True if the connection holds a place now, False if the server is full."""
+        if not self.held:
+            self.held = self.semaphore.acquire(blocking=False)
+        return self.held
+
+
+def parse_limit(spec):
+    """Parse 'CLASS=RATE[/BURST]' (e.g. 'write=5/20') into (class, rate, burst)."""
+    route_class, sep, value = spec.partition("=")
+    rate, _, burst = value.partition("/")
+    try:
+        if not sep or not route_class:
+            raise ValueError
+        return route_class, float(rate), float(burst) if burst else None
+    except ValueError:
+        raise ValueError(f"Invalid rate limit {spec!r}, expected CLASS=RATE[/BURST]") from None
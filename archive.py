@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Descarga de varios ficheros de Server/ en una sola respuesta: un tar que
+    se genera mientras se envía, fichero a fichero y en trozos, sin montar
+    el archivo ni en memoria ni en disco. Cada entrada es una cabecera tar
+    (PAX, para nombres largos o no ASCII) seguida del contenido del fichero
+    y del relleno hasta el siguiente bloque de 512 bytes.
+"""
+import fnmatch
+import os
+import stat
+import tarfile
+
+ARCHIVE_PATH = "/_archive"
+ARCHIVE_CONTENT_TYPE = "application/x-tar"
+ARCHIVE_MAX_FILES = 10000  # per request, so one glob cannot make the server walk and send everything forever
+BLOCK = tarfile.BLOCKSIZE
+READ_CHUNK = 256 * 1024
+
+
+def select_paths(available, paths=(), pattern=None):
+    """The paths to archive: the given ones in order, then those in available matching pattern.
+
+    available holds relative paths with "/"; a pattern such as "*.txt" or
+    "docs/*" is matched against them with fnmatch (so "*" also crosses
+    "/"). Duplicates are dropped.
+    """
+    selected = list(dict.fromkeys(path.strip("/") for path in paths if path.strip("/")))
+    if pattern:
+        seen = set(selected)
+        selected += [path for path in sorted(available) if fnmatch.fnmatchcase(path, pattern) and path not in seen]
+    return selected
+
+
+def tar_stream(root, rel_paths, chunk=READ_CHUNK):
+    """Yield a tar archive of root/rel_path for each path, reading every file in pieces.
+
+    A file that vanished by the time its turn comes is left out. The size
+    in each header is the one the file had when it was opened: if the file
+    grows meanwhile only that much is sent, and if it shrinks the entry
+    is padded with zeros, so the archive always stays well-formed.
+    """
+    for rel_path in rel_paths:
+        try:
+            f = open(os.path.join(root, *rel_path.split("/")), "rb")
+        except (FileNotFoundError, IsADirectoryError):
+            continue
+        with f:
+            st = os.fstat(f.fileno())
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            info = tarfile.TarInfo(rel_path)
+            info.size = st.st_size
+            info.mtime = int(st.st_mtime)
+            info.mode = 0o644
+            yield info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+            remaining = st.st_size
+            while remaining:
+                data = f.read(min(chunk, remaining))
+                if not data:
+                    print(f"{rel_path} shrank while it was being archived")
+                    data = bytes(min(chunk, remaining))
+                remaining -= len(data)
+                yield data
+        padding = -st.st_size % BLOCK
+        if padding:
+            yield bytes(padding)
+    yield bytes(2 * BLOCK)  # end-of-archive marker
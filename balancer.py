@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Modo proxy inverso / balanceador de carga de nServer. En lugar de servir
+    Server/, el servidor reenvía cada petición a uno de varios nServer
+    (--backend HOST:PUERTO, repetible) reutilizando conexiones keep-alive
+    hacia ellos. El backend se elige por turnos (round-robin), por el que
+    tenga menos peticiones en curso (least-conn) o por un hash consistente
+    de la ruta (hash), de modo que cada fichero va casi siempre al mismo
+    backend aunque se añadan o quiten otros. Un hilo comprueba /_health de
+    cada backend periódicamente; si no se puede conectar con uno, la
+    petición se reintenta en otro.
+
+How to execute:
+    python3 nServer.py --port 8081
+    python3 nServer.py --port 8082
+    python3 nServer.py --port 8080 --backend localhost:8081 --backend localhost:8082 --balance least-conn
+    curl http://localhost:8080/_balancer
+"""
+import bisect
+import hashlib
+import http.client
+import itertools
+import threading
+import time
+
+BALANCE_STRATEGIES = ("round-robin", "least-conn", "hash")
+HEALTH_PATH = "/_health"
+HEALTH_INTERVAL = 2.0    # seconds between active health checks
+HEALTH_TIMEOUT = 1.0
+FAIL_THRESHOLD = 2       # failed checks before a backend is taken out (a refused connection counts at once)
+CONNECT_TIMEOUT = 2.0
+PROXY_BUFFER_MAX = 1024 * 1024  # larger (or unsized) upstream bodies are streamed to the client instead of buffered
+UPSTREAM_TIMEOUT = 30.0  # seconds the backend gets to answer
+POOL_SIZE = 32           # idle connections kept per backend
+POOL_IDLE_TIMEOUT = 4.0  # below the backends' keep-alive timeout, so they do not close a connection we reuse
+HASH_REPLICAS = 100      # points of each backend on the hash ring
+MAX_ATTEMPTS = 3
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE")
+# Meaningful for one connection only, so never forwarded in either direction.
+HOP_BY_HOP = frozenset(("connection", "keep-alive", "proxy-connection", "proxy-authenticate",
+                        "proxy-authorization", "te", "trailer", "transfer-encoding", "upgrade"))
+
+
+class UpstreamConnectError(OSError):
+    """The backend could not be reached, so the request was never sent and can go to another one."""
+
+
+def parse_backend(spec):
+    """(host, port) from 'HOST:PORT' (or 'http://HOST:PORT')."""
+    host, sep, port = spec.split("://", 1)[-1].rstrip("/").rpartition(":")
+    if not sep or not host or not port.isdigit():
+        raise ValueError(f"Invalid backend {spec!r}, expected HOST:PORT")
+    return host, int(port)
+
+
+class Backend:
+    """One upstream server: its pool of idle keep-alive connections, load and health."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.name = f"{host}:{port}"
+        self.idle = []  # [(connection, idle since)], most recent last
+        self.lock = threading.Lock()
+        self.active = 0
+        self.healthy = True
+        self.failures = 0
+        self.requests = 0
+        self.errors = 0
+
+    def acquire(self):
+        """A connection to the backend and whether it was reused from the pool."""
+        now = time.monotonic()
+        with self.lock:
+            self.active += 1
+            self.requests += 1
+            while self.idle:
+                conn, since = self.idle.pop()
+                if now - since < POOL_IDLE_TIMEOUT:
+                    return conn, True
+                conn.close()
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=CONNECT_TIMEOUT)
+        try:
+            conn.connect()
+        except OSError as e:
+            self.release(None)
+            raise UpstreamConnectError(f"{self.name}: {e}") from None
+        conn.sock.settimeout(UPSTREAM_TIMEOUT)
+        return conn, False
+
+    def release(self, conn, reusable=False):
+        with self.lock:
+            self.active -= 1
+            if conn is not None and reusable and len(self.idle) < POOL_SIZE:
+                self.idle.append((conn, time.monotonic()))
+                return
+        if conn is not None:
+            conn.close()
+
+    def close_idle(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn, _ in idle:
+            conn.close()
+
+    def mark(self, ok, at_once=False):
+        """Record the result of a health check or a request; at_once takes the backend out immediately."""
+        with self.lock:
+            if ok:
+                self.failures = 0
+                came_back = not self.healthy
+                self.healthy = True
+            else:
+                self.failures += 1
+                came_back = False
+                went_down = self.healthy and (at_once or self.failures >= FAIL_THRESHOLD)
+                if went_down:
+                    self.healthy = False
+        if came_back:
+            print(f"Backend {self.name} is healthy again")
+        elif not ok and went_down:
+            print(f"Backend {self.name} marked down")
+            self.close_idle()
+
+    def status(self):
+        return {"backend": self.name, "healthy": self.healthy, "active": self.active, "idle": len(self.idle),
+                "requests": self.requests, "errors": self.errors}
+
+
+class Balancer:
+    """Picks a backend per request and forwards it, retrying elsewhere when a backend cannot be reached."""
+
+    def __init__(self, backends, strategy="round-robin", health_interval=HEALTH_INTERVAL):
+        if strategy not in BALANCE_STRATEGIES:
+            raise ValueError(f"Unknown balancing strategy {strategy!r}")
+        self.backends = [Backend(*parse_backend(spec)) for spec in backends]
+        if not self.backends:
+            raise ValueError("At least one backend is needed")
+        self.strategy = strategy
+        self.health_interval = health_interval
+        self.counter = itertools.count()
+        ring = sorted((self.hash_key(f"{backend.name}#{i}"), n)
+                      for n, backend in enumerate(self.backends) for i in range(HASH_REPLICAS))
+        self.ring_keys = [key for key, _ in ring]
+        self.ring_backends = [self.backends[n] for _, n in ring]
+        self.stopping = threading.Event()
+
+    @staticmethod
+    def hash_key(value):
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+    def start(self):
+        if self.health_interval:
+            threading.Thread(target=self.check_health, name="health-checks", daemon=True).start()
+
+    def stop(self):
+        self.stopping.set()
+        for backend in self.backends:
+            backend.close_idle()
+
+    def check_health(self):
+        while not self.stopping.wait(self.health_interval):
+            for backend in self.backends:
+                conn = http.client.HTTPConnection(backend.host, backend.port, timeout=HEALTH_TIMEOUT)
+                try:
+                    conn.request("GET", HEALTH_PATH, headers={"Connection": "close"})
+                    response = conn.getresponse()
+                    response.read()
+                    backend.mark(response.status == 200)
+                except (OSError, http.client.HTTPException):
+                    backend.mark(False)
+                finally:
+                    conn.close()
+
+    def candidates(self, path, exclude):
+        """Backends to try for path, best first. Unhealthy ones are only used if none is healthy."""
+        pool = [b for b in self.backends if b.healthy and b not in exclude] or \
+               [b for b in self.backends if b not in exclude]
+        if not pool:
+            return []
+        if self.strategy == "hash":
+            # Walk the ring clockwise from the path's point: removing a backend only moves its own paths.
+            start = bisect.bisect(self.ring_keys, self.hash_key(path.split("?", 1)[0]))
+            ordered = []
+            for i in range(len(self.ring_backends)):
+                backend = self.ring_backends[(start + i) % len(self.ring_backends)]
+                if backend in pool and backend not in ordered:
+                    ordered.append(backend)
+                    if len(ordered) == len(pool):
+                        break
+            return ordered
+        turn = next(self.counter) % len(pool)
+        ordered = pool[turn:] + pool[:turn]
+        if self.strategy == "least-conn":
+            ordered.sort(key=lambda b: b.active)  # stable, so ties keep the round-robin order
+        return ordered
+
+    def forward(self, method, path, headers, body, client_ip):
+        """Send the request upstream. Returns (backend, response); the response is ready to be read.
+
+        The caller must read the whole response and then call
+        backend.release(conn, reusable) with the connection stored in
+        response.upstream_conn. Raises UpstreamConnectError when no backend
+        could be reached.
+        """
+        upstream_headers = {name: value for name, value in headers.items() if name.lower() not in HOP_BY_HOP}
+        forwarded_for = headers.get("X-Forwarded-For")
+        upstream_headers["X-Forwarded-For"] = f"{forwarded_for}, {client_ip}" if forwarded_for else client_ip
+        if body or method in ("POST", "PUT"):
+            upstream_headers["Content-Length"] = str(len(body))
+        tried = []
+        last_error = None
+        while len(tried) < MAX_ATTEMPTS:
+            order = self.candidates(path, tried)
+            if not order:
+                break
+            backend = order[0]
+            tried.append(backend)
+            try:
+                response = self.send(backend, method, path, upstream_headers, body)
+            except UpstreamConnectError as e:
+                backend.errors += 1
+                backend.mark(False, at_once=True)
+                last_error = e
+                continue
+            backend.mark(True)
+            return backend, response
+        raise UpstreamConnectError(str(last_error) if last_error else "no backend available")
+
+    def send(self, backend, method, path, headers, body):
+        conn, reused = backend.acquire()
+        try:
+            conn.request(method, path, body=body or None, headers=headers)
+            response = conn.getresponse()
+        except (ConnectionError, http.client.RemoteDisconnected, http.client.BadStatusLine) as e:
+            backend.release(conn)
+            if not reused or method not in IDEMPOTENT_METHODS:
+                raise
+            # The backend closed the pooled connection while it was idle: try once on a fresh one.
+            conn, _ = backend.acquire()
+            try:
+                conn.request(method, path, body=body or None, headers=headers)
+                response = conn.getresponse()
+            except BaseException:
+                backend.release(conn)
+                raise
+        except BaseException:
+            backend.release(conn)
+            raise
+        response.upstream_conn = conn
+        return response
+
+    def status(self):
+        return {"strategy": self.strategy, "backends": [backend.status() for backend in self.backends]}
+
+
+def read_chunks(response, backend, size=65536):
+    """Yield the body of an upstream response as it arrives; the connection is closed afterwards."""
+    try:
+        while True:
+            data = response.read1(size)
+            if not data:
+                break
+            yield data
+    except (OSError, http.client.HTTPException):
+        pass
+    finally:
+        backend.release(response.upstream_conn)
+
+
+def response_headers(response):
+    """Upstream response headers minus the hop-by-hop ones, as (name, value) pairs."""
+    return [(name, value) for name, value in response.getheaders() if name.lower() not in HOP_BY_HOP]
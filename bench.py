@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Generador de carga para medir el servidor HTTP (nServer.py o server.py).
+    Lanza peticiones concurrentes con una mezcla configurable (ficheros
+    estáticos pequeños/grandes, HEAD y CRUD sobre /resources) y muestra
+    throughput, percentiles de latencia, tasa de errores y bytes/segundo.
+
+How to execute:
+    1. Arranca el servidor (o usa --spawn para que lo arranque este script).
+    2. Ejecuta, por ejemplo:
+           python3 bench.py --port 8080 --concurrency 16 --duration 10
+           python3 bench.py --spawn nServer --mix static_small=3,resources_get=1 --json result.json
+    Con --json - el informe se imprime como JSON por la salida estándar.
+
+    Los escenarios de escritura usan la categoría indicada con --category
+    (por defecto "bench"), cuyo contenido se sobrescribe al empezar.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from nClient import build_request
+
+BUFFER_SIZE = 65536
+SCENARIOS = (
+    "static_small", "static_large", "head",
+    "resources_get", "resources_post", "resources_put", "resources_delete",
+)
+DEFAULT_MIX = "static_small=4,static_large=1,head=2,resources_get=2,resources_post=1,resources_put=1,resources_delete=1"
+
+
+class Scenario:
+    def __init__(self, name, method, path, expected, body=None, content_type=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.expected = expected
+        self.body = body
+        self.content_type = content_type
+
+
+class LoadGenerator:
+    def __init__(self, host, port, mix, concurrency=8, duration=10.0, total_requests=None,
+                 category="bench", seed_items=1000, timeout=10.0):
+        self.host = host
+        self.port = port
+        self.mix = mix
+        self.concurrency = concurrency
+        self.duration = duration
+        self.total_requests = total_requests
+        self.category = category
+        self.seed_items = seed_items
+        self.timeout = timeout
+        self.live_ids = list(range(1, seed_items + 1))
+        self.ids_lock = threading.Lock()
+        self.results_lock = threading.Lock()
+        self.results = []
+        self.issued = 0
+
+    def request(self, scenario):
+        """Send one request on a fresh connection; return (status, bytes_received)."""
+        message = build_request(
+            method=scenario.method,
+            path=scenario.path,
+            host=self.host,
+            body=scenario.body,
+            content_type=scenario.content_type,
+        )
+        with socket.create_connection((self.host, self.port), timeout=self.timeout) as sock:
+            sock.sendall(message.encode('utf-8') if isinstance(message, str) else message)
+            status_line = b''
+            received = 0
+            while True:
+                chunk = sock.recv(BUFFER_SIZE)
+                if not chunk:
+                    break
+                if not status_line:
+                    status_line = chunk.split(b'\r\n', 1)[0]
+                received += len(chunk)
+        parts = status_line.split()
+        status = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+        return status, received
+
+    def seed(self):
+        items = [{"id": i, "nombre": f"item {i}", "valor": i} for i in range(1, self.seed_items + 1)]
+        # Only POST creates a missing category; the PUT then replaces its contents.
+        self.request(Scenario(
+            "seed", "POST", f"/resources/{self.category}", (201,),
+            body=json.dumps({"nombre": "seed"}), content_type="application/json"
+        ))
+        status, _ = self.request(Scenario(
+            "seed", "PUT", f"/resources/{self.category}", (200,),
+            body=json.dumps(items), content_type="application/json"
+        ))
+        if status != 200:
+            raise RuntimeError(f"Could not seed category '{self.category}' (status {status})")
+
+    def next_scenario(self, rng):
+        name = rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        base = f"/resources/{self.category}"
+        if name == "static_small":
+            return Scenario(name, "GET", "/index.html", (200,))
+        if name == "static_large":
+            return Scenario(name, "GET", "/a.gif", (200,))
+        if name == "head":
+            return Scenario(name, "HEAD", "/a.mp4", (200,))
+        if name == "resources_get":
+            return Scenario(name, "GET", base, (200,))
+        if name == "resources_post":
+            body = json.dumps({"nombre": "bench", "valor": rng.random()})
+            return Scenario(name, "POST", base, (201,), body=body, content_type="application/json")
+        with self.ids_lock:
+            if not self.live_ids:
+                return Scenario("resources_get", "GET", base, (200,))
+            if name == "resources_delete":
+                item_id = self.live_ids.pop(rng.randrange(len(self.live_ids)))
+            else:
+                item_id = rng.choice(self.live_ids)
+        if name == "resources_delete":
+            return Scenario(name, "DELETE", f"{base}/{item_id}", (200,))
+        body = json.dumps({"nombre": "bench actualizado", "valor": rng.random()})
+        return Scenario(name, "PUT", f"{base}/{item_id}", (200, 404), body=body, content_type="application/json")
+
+    def claim(self, deadline):
+        with self.results_lock:
+            if self.total_requests is not None:
+                if self.issued >= self.total_requests:
+                    return False
+            elif time.perf_counter() >= deadline:
+                return False
+            self.issued += 1
+            return True
+
+    def worker(self, deadline, seed):
+        rng = random.Random(seed)
+        local = []
+        while self.claim(deadline):
+            scenario = self.next_scenario(rng)
+            start = time.perf_counter()
+            try:
+                status, received = self.request(scenario)
+                error = status not in scenario.expected
+            except OSError:
+                status, received, error = 0, 0, True
+            local.append((scenario.name, time.perf_counter() - start, status, received, error))
+        with self.results_lock:
+            self.results.extend(local)
+
+    def run(self):
+        if any(name.startswith("resources_") and name != "resources_get" for name in self.mix):
+            self.seed()
+        start = time.perf_counter()
+        deadline = start + self.duration
+        threads = [
+            threading.Thread(target=self.worker, args=(deadline, i), daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return summarize(self.results, time.perf_counter() - start)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize_group(samples, elapsed):
+    latencies = sorted(s[1] for s in samples)
+    errors = sum(1 for s in samples if s[4])
+    received = sum(s[3] for s in samples)
+    statuses = {}
+    for s in samples:
+        statuses[str(s[2])] = statuses.get(str(s[2]), 0) + 1
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": errors / len(samples) if samples else 0.0,
+        "throughput_rps": len(samples) / elapsed if elapsed else 0.0,
+        "bytes_received": received,
+        "bytes_per_sec": received / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 50) * 1000,
+            "p90": percentile(latencies, 90) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": (latencies[-1] if latencies else 0.0) * 1000,
+        },
+        "status_codes": statuses,
+    }
+
+
+def summarize(results, elapsed):
+    report = summarize_group(results, elapsed)
+    report["elapsed_sec"] = elapsed
+    report["scenarios"] = {
+        name: summarize_group([s for s in results if s[0] == name], elapsed)
+        for name in sorted({s[0] for s in results})
+    }
+    return report
+
+
+def print_report(report):
+    def line(name, r):
+        lat = r["latency_ms"]
+        print(f"{name:<18}{r['requests']:>8}{r['throughput_rps']:>10.1f}{lat['p50']:>9.2f}{lat['p90']:>9.2f}"
+              f"{lat['p99']:>9.2f}{lat['max']:>9.2f}{r['error_rate'] * 100:>8.2f}%{r['bytes_per_sec'] / 1e6:>10.2f}")
+    print(f"\nElapsed: {report['elapsed_sec']:.2f}s")
+    print(f"{'scenario':<18}{'reqs':>8}{'req/s':>10}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>9}{'MB/s':>10}")
+    for name, r in report["scenarios"].items():
+        line(name, r)
+    line("TOTAL", report)
+
+
+def parse_mix(text):
+    mix = {}
+    for entry in text.split(","):
+        name, _, weight = entry.strip().partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario '{name}'. Valid: {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def spawn_server(module, host, port):
+    code = f"import {module}; {module}.SimpleHTTPServer(host={host!r}, port={port}).start()"
+    proc = subprocess.Popen(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{module} did not start listening on {host}:{port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the HTTP lab servers")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--concurrency", "-c", type=int, default=8)
+    parser.add_argument("--duration", "-d", type=float, default=10.0, help="seconds to run (ignored with --requests)")
+    parser.add_argument("--requests", "-n", type=int, default=None, help="total number of requests to send")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"weighted scenarios (default: {DEFAULT_MIX})")
+    parser.add_argument("--category", default="bench", help="resource category used by write scenarios")
+    parser.add_argument("--seed-items", type=int, default=1000)
+    parser.add_argument("--spawn", choices=["nServer", "server"], help="start this server locally before the run")
+    parser.add_argument("--json", dest="json_path", help="write the report as JSON to this file ('-' for stdout)")
+    args = parser.parse_args()
+
+    proc = spawn_server(args.spawn, args.host, args.port) if args.spawn else None
+    try:
+        generator = LoadGenerator(
+            args.host, args.port, args.mix,
+            concurrency=args.concurrency,
+            duration=args.duration,
+            total_requests=args.requests,
+            category=args.category,
+            seed_items=args.seed_items,
+        )
+        report = generator.run()
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+    report["config"] = {
+        "host": args.host, "port": args.port, "concurrency": args.concurrency,
+        "duration": args.duration, "requests": args.requests, "mix": args.mix, "server": args.spawn,
+    }
+    if args.json_path == "-":
+        print(json.dumps(report, indent=4))
+        return
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        print(f"\nReport written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
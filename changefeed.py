@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Registro en memoria de los cambios de /resources para el endpoint
+    Server-Sent Events /resources/{categoria}/_changes. Cada categoría tiene
+    su propio número de secuencia y un buffer circular con los últimos
+    eventos, de modo que un cliente que se reconecta con Last-Event-ID
+    recibe solo lo que se perdió (o un aviso de que debe recargar todo si
+    ya no está en el buffer). Además hay un registro global (categoría None)
+    con todos los cambios en orden, que es el que siguen las réplicas.
+"""
+import json
+import secrets
+import threading
+from collections import deque
+
+RING_SIZE = 1024
+
+
+class ChangeEvent:
+    __slots__ = ("seq", "kind", "category", "resource_id", "data")
+
+    def __init__(self, seq, kind, category, resource_id, data):
+        self.seq = seq
+        self.kind = kind
+        self.category = category
+        self.resource_id = resource_id
+        self.data = data
+
+    def to_dict(self):
+        return {"seq": self.seq, "category": self.category, "id": self.resource_id, "data": self.data}
+
+
+class ChangeFeed:
+    """Per-category sequence numbers and ring buffers of recent changes.
+
+    Event ids are "<epoch>-<seq>". The epoch is random per feed, so an id
+    from before a restart is recognised as unknown rather than mistaken
+    for a recent position. Every change is also appended to the log of
+    category None, with its own sequence, which covers all categories.
+    """
+
+    def __init__(self, ring_size=RING_SIZE):
+        self.ring_size = ring_size
+        self.epoch = secrets.token_hex(4)
+        self.seqs = {}
+        self.rings = {}
+        self.changed = threading.Condition()
+
+    def event_id(self, seq):
+        return f"{self.epoch}-{seq}"
+
+    def parse_event_id(self, value):
+        """Sequence number from a Last-Event-ID header, or None if it is not from this feed."""
+        epoch, _, seq = (value or "").strip().partition("-")
+        return int(seq) if epoch == self.epoch and seq.isdigit() else None
+
+    def current(self, category):
+        return self.seqs.get(category, 0)
+
+    def publish(self, category, kind, resource_id=None, data=None):
+        with self.changed:
+            event = self._append(category, category, kind, resource_id, data)
+            self._append(None, category, kind, resource_id, data)
+            self.changed.notify_all()
+        return event
+
+    def _append(self, log, category, kind, resource_id, data):
+        seq = self.seqs.get(log, 0) + 1
+        self.seqs[log] = seq
+        event = ChangeEvent(seq, kind, category, resource_id, data)
+        ring = self.rings.get(log)
+        if ring is None:
+            ring = self.rings[log] = deque(maxlen=self.ring_size)
+        ring.append(event)
+        return event
+
+    def since(self, category, seq):
+        """Events after seq, or None if some of them have already left the ring buffer."""
+        with self.changed:
+            current = self.seqs.get(category, 0)
+            if seq > current:
+                return None
+            ring = self.rings.get(category, ())
+            missing = current - seq
+            if missing > len(ring):
+                return None
+            return list(ring)[len(ring) - missing:] if missing else []
+
+    def wait(self, category, seq, timeout):
+        """Block until category has events after seq (or timeout) and return since(category, seq)."""
+        with self.changed:
+            self.changed.wait_for(lambda: self.seqs.get(category, 0) != seq, timeout)
+            return self.since(category, seq)
+
+
+def format_event(event_id, kind, payload):
+    """One SSE message; event_id None leaves the client's Last-Event-ID unchanged."""
+    data = json.dumps(payload, ensure_ascii=False)
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {kind}\ndata: {data}\n\n".encode("utf-8")
+
+
+def parse_events(lines):
+    """Yield (id, event, data) from an iterable of SSE lines (str, without or with newline)."""
+    event_id = kind = None
+    data = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line:
+            if data:
+                yield event_id, kind or "message", "\n".join(data)
+            kind, data = None, []
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        value = value[1:] if value.startswith(" ") else value
+        if field == "id":
+            event_id = value
+        elif field == "event":
+            kind = value
+        elif field == "data":
+            data.append(value)
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Índice en memoria de los ficheros públicos de Server/ (tamaño, fecha de
+    modificación y tipo de contenido). Un hilo en segundo plano lo mantiene
+    al día con inotify cuando está disponible (Linux) o recorriendo el
+    directorio periódicamente en otro caso, de modo que los ficheros que se
+    copian a mano aparecen sin reiniciar el servidor.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import stat
+import struct
+import sys
+import threading
+from collections import namedtuple
+
+FileInfo = namedtuple("FileInfo", "size mtime content_type")
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+# IN_MODIFY is left out on purpose: uploads would fire it for every write();
+# IN_CLOSE_WRITE reports the file once it is complete.
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def load_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+    return libc
+
+
+class DirectoryIndex:
+    def __init__(self, root, exclude=("private",), content_type=None, poll_interval=1.0, use_inotify=True,
+                 ignore=None):
+        self.root = os.path.abspath(root)
+        self.exclude = set(exclude)
+        self.ignore = ignore or (lambda name: False)
+        self.content_type = content_type or (lambda path: "application/octet-stream")
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.entries = {}
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.active = False
+        self.backend = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._watches = {}
+
+    def add_listener(self, func):
+        """func(rel_path) is called after an entry is added, changed or removed."""
+        self.listeners.append(func)
+
+    def start(self):
+        if self.active:
+            return
+        self._stop.clear()
+        libc = load_inotify() if self.use_inotify else None
+        fd = libc.inotify_init1(os.O_CLOEXEC) if libc else -1
+        if fd >= 0:
+            self.backend = "inotify"
+            self._libc, self._fd = libc, fd
+            self._watch_tree(self.root)
+            target = self._inotify_loop
+        else:
+            self.backend = "polling"
+            target = self._poll_loop
+        self.rescan()
+        self.active = True
+        self._thread = threading.Thread(target=target, name="dirindex", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        self.active = False
+
+    def get(self, rel_path):
+        return self.entries.get(rel_path)
+
+    def listing(self):
+        return [
+            {"path": path.replace(os.sep, "/"), "size": info.size, "mtime": info.mtime, "content_type": info.content_type}
+            for path, info in sorted(self.entries.items())
+        ]
+
+    def is_excluded(self, rel_path):
+        return rel_path.split(os.sep, 1)[0] in self.exclude or self.ignore(os.path.basename(rel_path))
+
+    def refresh(self, rel_path):
+        """Re-stat one path now (used after the server writes or deletes a file itself)."""
+        if self.is_excluded(rel_path):
+            return
+        try:
+            st = os.stat(os.path.join(self.root, rel_path))
+        except OSError:
+            st = None
+        if st is not None and stat.S_ISDIR(st.st_mode):
+            self.rescan()
+            return
+        info = FileInfo(st.st_size, st.st_mtime, self.content_type(rel_path)) \
+            if st is not None and stat.S_ISREG(st.st_mode) else None
+        with self.lock:
+            changed = self.entries.get(rel_path) != info
+            if info is None:
+                self.entries.pop(rel_path, None)
+            else:
+                self.entries[rel_path] = info
+        if changed:
+            self._notify(rel_path)
+
+    def rescan(self):
+        fresh = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            rel_dir = os.path.relpath(dirpath, self.root)
+            if rel_dir == ".":
+                dirnames[:] = [d for d in dirnames if d not in self.exclude]
+                rel_dir = ""
+            for name in filenames:
+                if self.ignore(name):
+                    continue
+                rel_path = os.path.join(rel_dir, name)
+                try:
+                    st = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                if stat.S_ISREG(st.st_mode):
+                    fresh[rel_path] = FileInfo(st.st_size, st.st_mtime, self.content_type(rel_path))
+        with self.lock:
+            old, self.entries = self.entries, fresh
+        for path in set(old) | set(fresh):
+            if old.get(path) != fresh.get(path):
+                self._notify(path)
+
+    def _notify(self, rel_path):
+        for func in self.listeners:
+            try:
+                func(rel_path)
+            except Exception as e:
+                print(f"Directory index listener failed: {e}")
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            self.rescan()
+
+    def _watch_tree(self, top):
+        for dirpath, dirnames, _ in os.walk(top):
+            rel_dir = os.path.relpath(dirpath, self.root)
+            if rel_dir == ".":
+                dirnames[:] = [d for d in dirnames if d not in self.exclude]
+                rel_dir = ""
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd >= 0:
+                self._watches[wd] = rel_dir
+
+    def _inotify_loop(self):
+        try:
+            while not self._stop.is_set():
+                ready, _, _ = select.select([self._fd], [], [], 0.5)
+                if not ready:
+                    continue
+                data = os.read(self._fd, 64 * 1024)
+                self._handle_events(data)
+        finally:
+            os.close(self._fd)
+
+    def _handle_events(self, data):
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self.rescan()
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            rel_dir = self._watches.get(wd)
+            if rel_dir is None or not name:
+                continue
+            rel_path = os.path.join(rel_dir, name)
+            if self.is_excluded(rel_path):
+                continue
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(os.path.join(self.root, rel_path))
+                self.rescan()
+            else:
+                self.refresh(rel_path)
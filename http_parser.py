@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Parser incremental de peticiones HTTP/1.1 compartido por nServer.py y
+    server.py. Se le van pasando los bytes según llegan del socket con
+    feed(); solo busca el final de las cabeceras en los datos nuevos y
+    aplica límites de tamaño (431 para cabeceras, 413 para el cuerpo). Los
+    cuerpos deben llevar Content-Length: Transfer-Encoding se rechaza. Un
+    cuerpo que se guarda en memoria no puede pasar de max_body; uno que se
+    pasa a stream_body() (p. ej. a un fichero) tiene su propio límite,
+    max_streamed_body, bastante mayor.
+"""
+import socket
+import time
+from collections.abc import Mapping
+from http import HTTPStatus
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_HEADERS = 100
+MAX_BODY_BYTES = 64 * 1024 * 1024               # bodies kept in memory
+MAX_STREAMED_BODY_BYTES = 16 * 1024 * 1024 * 1024  # bodies handed to stream_body() as they arrive
+
+
+class HTTPParseError(Exception):
+    def __init__(self, status, message=""):
+        super().__init__(message or status.phrase)
+        self.status = status
+
+    @property
+    def status_line(self):
+        return f"{self.status.value} {self.status.phrase}"
+
+
+class ClientTimeout(HTTPParseError):
+    """The peer missed a deadline while sending the request (phase "headers"/"body") or reading the response ("send")."""
+
+    def __init__(self, phase):
+        super().__init__(HTTPStatus.REQUEST_TIMEOUT, f"Client too slow ({phase})")
+        self.phase = phase
+
+
+class Headers(Mapping):
+    """Case-insensitive header mapping that keeps repeated fields.
+
+    Lookups return the values of a repeated field joined with ", ";
+    get_all() returns them separately.
+    """
+
+    def __init__(self, items=()):
+        self._fields = {}
+        for name, value in items:
+            self.add(name, value)
+
+    def add(self, name, value):
+        field = self._fields.get(name.lower())
+        if field is None:
+            self._fields[name.lower()] = (name, [value])
+        else:
+            field[1].append(value)
+
+    def get_all(self, name):
+        field = self._fields.get(name.lower())
+        return list(field[1]) if field else []
+
+    def __getitem__(self, name):
+        return ", ".join(self._fields[name.lower()][1])
+
+    def __contains__(self, name):
+        return isinstance(name, str) and name.lower() in self._fields
+
+    def __iter__(self):
+        return (name for name, _ in self._fields.values())
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        return f"Headers({list(self.items())!r})"
+
+
+class RequestParser:
+    def __init__(self, max_header_bytes=MAX_HEADER_BYTES, max_headers=MAX_HEADERS, max_body=MAX_BODY_BYTES,
+                 max_streamed_body=None):
+        """max_streamed_body: largest body accepted for stream_body(); None if bodies are never streamed."""
+        self.max_header_bytes = max_header_bytes
+        self.max_headers = max_headers
+        self.max_body = max_body
+        self.max_streamed_body = max_streamed_body
+        self.buffer = bytearray()
+        self._scan_from = 0
+        self._body = None
+        self.method = self.path = self.version = None
+        self.request_line = ""
+        self.headers = None
+        self.headers_raw = ""
+        self.content_length = 0
+        self.leftover = b''
+        self.complete = False
+        self.body_hasher = None
+        self.body_consumer = None
+        self.streamed = 0
+
+    @property
+    def headers_complete(self):
+        return self.headers is not None
+
+    @property
+    def remaining(self):
+        """Body bytes still expected from the peer."""
+        return max(0, self.content_length - self.streamed - len(self.buffer)) if self.headers is not None else 0
+
+    @property
+    def body(self):
+        if self._body is None:
+            return bytes(self.buffer[:self.content_length])
+        return self._body
+
+    def hash_body(self, hasher):
+        """Update hasher with the body while it is received, starting with what is already buffered."""
+        self.body_hasher = hasher
+        hasher.update(self.buffer[:self.content_length])
+
+    def buffer_body(self):
+        """Declare that the body will be kept in memory: refuse it now if it is larger than max_body.
+
+        Until stream_body() or this is called, only max_streamed_body is
+        checked; feed() still refuses an in-memory body once it grows past
+        max_body.
+        """
+        if self.content_length > self.max_body:
+            raise HTTPParseError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+    def stream_body(self, consumer):
+        """Hand the body to consumer(bytes) as it is received instead of keeping it; body is then b''."""
+        self.body_consumer = consumer
+        self._stream()
+
+    def _stream(self):
+        part = bytes(self.buffer[:self.content_length - self.streamed])
+        if part:
+            del self.buffer[:len(part)]
+            self.streamed += len(part)
+            self.body_consumer(part)
+        self._check_complete()
+
+    def feed(self, data):
+        """Add received bytes; return True once headers and the whole body are available."""
+        if self.body_hasher is not None:
+            room = self.content_length - len(self.buffer)
+            if room > 0:
+                self.body_hasher.update(data[:room])
+        self.buffer += data
+        if self.headers is None:
+            end = self.buffer.find(b'\r\n\r\n', self._scan_from)
+            if end == -1:
+                if len(self.buffer) > self.max_header_bytes:
+                    raise HTTPParseError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+                self._scan_from = max(0, len(self.buffer) - 3)
+                return False
+            if end > self.max_header_bytes:
+                raise HTTPParseError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+            self._parse_head(bytes(self.buffer[:end]))
+            del self.buffer[:end + 4]
+        if self.body_consumer is not None:
+            self._stream()
+        else:
+            if min(len(self.buffer), self.content_length) > self.max_body:
+                raise HTTPParseError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+            self._check_complete()
+        return self.complete
+
+    def _check_complete(self):
+        in_buffer = self.content_length - self.streamed
+        if len(self.buffer) >= in_buffer:
+            self._body = bytes(self.buffer[:in_buffer])
+            self.leftover = bytes(self.buffer[in_buffer:])
+            self.complete = True
+
+    def _parse_head(self, head):
+        self.headers_raw = head.decode('utf-8', errors='ignore')
+        lines = self.headers_raw.split('\r\n')
+        self.request_line = lines[0]
+        parts = lines[0].split()
+        if len(parts) != 3:
+            raise HTTPParseError(HTTPStatus.BAD_REQUEST, f"Malformed request line: {lines[0]!r}")
+        self.method, self.path, self.version = parts
+        if len(lines) - 1 > self.max_headers:
+            raise HTTPParseError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Too many header fields")
+        headers = Headers()
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers.add(name.strip(), value.strip())
+        # Chunked bodies are not decoded. Ignoring Transfer-Encoding would read the chunks on a kept-alive
+        # connection as the next request (request smuggling), so the request is refused and the connection closed.
+        if 'Transfer-Encoding' in headers:
+            if 'Content-Length' in headers:
+                raise HTTPParseError(HTTPStatus.BAD_REQUEST, "Both Transfer-Encoding and Content-Length")
+            raise HTTPParseError(HTTPStatus.NOT_IMPLEMENTED, "Transfer-Encoding is not supported, send Content-Length")
+        lengths = set(headers.get_all('Content-Length'))
+        if len(lengths) > 1:
+            raise HTTPParseError(HTTPStatus.BAD_REQUEST, "Conflicting Content-Length headers")
+        if lengths:
+            value = lengths.pop()
+            if not (value.isascii() and value.isdigit()):
+                raise HTTPParseError(HTTPStatus.BAD_REQUEST, f"Invalid Content-Length: {value!r}")
+            self.content_length = int(value)
+            if self.content_length > max(self.max_body, self.max_streamed_body or 0):
+                raise HTTPParseError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        self.headers = headers
+
+
+def recv_before(sock, size, deadline, phase):
+    """recv() that raises ClientTimeout(phase) if nothing arrives before deadline (time.monotonic(); None = no limit)."""
+    if deadline is None:
+        sock.settimeout(None)
+    else:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise ClientTimeout(phase)
+        sock.settimeout(remaining)
+    try:
+        return sock.recv(size)
+    except socket.timeout:
+        raise ClientTimeout(phase) from None
+
+
+def lingering_close(sock, timeout=1.0, limit=256 * 1024):
+    """Stop writing and drain some pending input before close.
+
+    Closing a socket with unread data makes the kernel send a reset, which
+    can discard the error response we just sent (e.g. a 413 or 431).
+    """
+    try:
+        sock.shutdown(socket.SHUT_WR)
+        deadline = time.monotonic() + timeout
+        drained = 0
+        while drained < limit:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            sock.settimeout(remaining)
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            drained += len(chunk)
+    except OSError:
+        pass
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Manifiesto de los ficheros públicos de Server/ para GET /_manifest: ruta,
+    tamaño, fecha de modificación y sha256 de cada uno, que es lo que
+    necesita un cliente para sincronizar una carpeta sin descargar nada.
+    Los hashes se guardan en Server/private/hashes.json junto con el tamaño
+    y la fecha del fichero del que salieron, así que solo se recalculan los
+    de los ficheros que cambian (y no todos tras reiniciar el servidor).
+"""
+import hashlib
+import json
+import os
+import threading
+
+from storage import DURABILITY_NONE, atomic_write
+
+
+class HashCache:
+    """sha256 of public files, reused while the file keeps the size and mtime it had when hashed."""
+
+    def __init__(self, root, path, durability=DURABILITY_NONE):
+        self.root = root
+        self.path = path
+        self.durability = durability
+        self.lock = threading.Lock()
+        self.dirty = False
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, rel_path, size, mtime):
+        entry = self.entries.get(rel_path)
+        if entry and entry["size"] == size and entry["mtime"] == mtime:
+            return entry["sha256"]
+        return None
+
+    def digest(self, rel_path):
+        """(size, mtime, sha256) of the file now, hashing it only if it changed; None if it is gone."""
+        try:
+            with open(os.path.join(self.root, rel_path), "rb") as f:
+                st = os.fstat(f.fileno())
+                cached = self.lookup(rel_path, st.st_size, st.st_mtime)
+                if cached is not None:
+                    return st.st_size, st.st_mtime, cached
+                digest = hashlib.file_digest(f, "sha256").hexdigest()
+                after = os.fstat(f.fileno())
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+        # Only remember it if nobody wrote to the file while it was being read.
+        if (after.st_size, after.st_mtime) == (st.st_size, st.st_mtime):
+            self.remember(rel_path, st.st_size, st.st_mtime, digest)
+        return st.st_size, st.st_mtime, digest
+
+    def remember(self, rel_path, size, mtime, digest):
+        with self.lock:
+            self.entries[rel_path] = {"sha256": digest, "size": size, "mtime": mtime}
+            self.dirty = True
+
+    def forget(self, rel_path):
+        """Called when a file is written or deleted."""
+        with self.lock:
+            if self.entries.pop(rel_path, None) is not None:
+                self.dirty = True
+
+    def save(self):
+        """Write the cache back if it changed, dropping files that no longer exist."""
+        with self.lock:
+            if not self.dirty:
+                return
+            self.entries = {path: entry for path, entry in self.entries.items()
+                            if os.path.exists(os.path.join(self.root, path))}
+            data = json.dumps(self.entries, ensure_ascii=False).encode("utf-8")
+            self.dirty = False
+        try:
+            atomic_write(self.path, data, self.durability)
+        except OSError as e:
+            print(f"Could not save the hash cache: {e}")
+
+
+def build_manifest(hashes, rel_paths):
+    """[{"path", "size", "mtime", "sha256"}] for rel_paths, skipping the ones that disappeared meanwhile."""
+    manifest = []
+    for rel_path in sorted(rel_paths):
+        current = hashes.digest(rel_path)
+        if current is None:
+            continue
+        size, mtime, digest = current
+        manifest.append({"path": rel_path.replace(os.sep, "/"), "size": size, "mtime": mtime, "sha256": digest})
+    hashes.save()
+    return manifest
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Métricas del servidor en formato de texto de Prometheus.
+
+    Cada hilo acumula sus contadores en un diccionario propio (sin locks en
+    el camino de la petición); al terminar la conexión se vuelcan a los
+    totales compartidos con flush(). render() suma totales y hilos vivos.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Metrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._totals = {}
+        self._shards = {}
+        self._meta = {}
+        self._callbacks = {}
+
+    def describe(self, name, kind, help_text):
+        self._meta[name] = (kind, help_text)
+
+    def gauge_callback(self, name, help_text, func):
+        """Register a gauge whose value is computed by func() at scrape time."""
+        self._meta[name] = ("gauge", help_text)
+        self._callbacks[name] = func
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards[threading.get_ident()] = shard
+        return shard
+
+    def inc(self, name, labels=(), value=1):
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def dec(self, name, labels=(), value=1):
+        self.inc(name, labels, -value)
+
+    def observe(self, name, labels, value):
+        shard = self._shard()
+        key = (name, labels)
+        hist = shard.get(key)
+        if hist is None:
+            hist = shard[key] = [0] * (len(self.buckets) + 3)
+        hist[bisect_left(self.buckets, value)] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+    def flush(self):
+        """Fold the calling thread's shard into the shared totals."""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            return
+        with self._lock:
+            self._shards.pop(threading.get_ident(), None)
+            self._merge(self._totals, shard)
+        self._local.shard = None
+
+    @staticmethod
+    def _merge(target, shard):
+        for key, value in list(shard.items()):
+            if isinstance(value, list):
+                current = target.get(key)
+                if current is None:
+                    target[key] = list(value)
+                else:
+                    for i, v in enumerate(value):
+                        current[i] += v
+            else:
+                target[key] = target.get(key, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            merged = {k: list(v) if isinstance(v, list) else v for k, v in self._totals.items()}
+            shards = list(self._shards.values())
+        for shard in shards:
+            self._merge(merged, shard.copy())
+        return merged
+
+    def value(self, name, labels=()):
+        value = self.snapshot().get((name, labels), 0)
+        return value[-1] if isinstance(value, list) else value
+
+    def render(self):
+        samples = {}
+        for (name, labels), value in self.snapshot().items():
+            samples.setdefault(name, []).append((labels, value))
+        lines = []
+        for name in sorted(set(self._meta) | set(samples)):
+            kind, help_text = self._meta.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if name in self._callbacks:
+                try:
+                    lines.append(f"{name} {format_value(self._callbacks[name]())}")
+                except Exception:
+                    pass
+                continue
+            for labels, value in sorted(samples.get(name, []), key=lambda s: s[0]):
+                if kind == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + (float("inf"),), value):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else format_value(bound)
+                        lines.append(f"{name}_bucket{format_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {format_value(value[-2])}")
+                    lines.append(f"{name}_count{format_labels(labels)} {value[-1]}")
+                else:
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 9)) if value != int(value) else str(int(value))
+    return str(value)
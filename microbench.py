@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Micro-benchmarks de las funciones que se ejecutan en cada petición
+    (parseo de cabeceras, construcción de respuestas, serialización JSON,
+    tipos de contenido, búsqueda de recursos y logging), sin abrir ningún
+    socket de escucha. Los datos se generan en un directorio temporal.
+
+How to execute:
+    python3 microbench.py                   # compara con la línea base guardada
+    python3 microbench.py --save-baseline   # guarda los resultados como línea base
+    python3 microbench.py --items 200000 --tolerance 0.25 --filter json
+
+    Devuelve código de salida 1 si alguna función es más lenta que la línea
+    base en más del margen de tolerancia.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+import nServer
+from http_parser import RequestParser
+
+DEFAULT_BASELINE = os.path.join(BASE_DIR, "microbench_baseline.json")
+
+REQUEST_GET = (
+    b"GET /index.html HTTP/1.1\r\n"
+    b"Host: localhost\r\n"
+    b"User-Agent: microbench\r\n"
+    b"Accept: */*\r\n"
+    b"If-Modified-Since: 2000-01-01 00:00:00\r\n"
+    b"Connection: close\r\n\r\n"
+)
+REQUEST_POST = (
+    b"POST /resources/bench HTTP/1.1\r\n"
+    b"Host: localhost\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Content-Length: 38\r\n"
+    b"Connection: close\r\n\r\n"
+    b'{"nombre": "gato", "origen": "Espana"}'
+)
+
+
+class FakeSocket:
+    """Minimal stand-in for an accepted client socket."""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+        self.sent = 0
+
+    def recv(self, size):
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += len(chunk)
+        return chunk
+
+    def sendall(self, data):
+        self.sent += len(data)
+
+    def sendmsg(self, buffers):
+        sent = sum(map(len, buffers))
+        self.sent += sent
+        return sent
+
+    def settimeout(self, timeout):
+        pass
+
+    def getpeername(self):
+        return ("127.0.0.1", 50000)
+
+    def close(self):
+        pass
+
+
+def synthetic_items(count):
+    return [
+        {"id": i, "nombre": f"Gato {i}", "origen": "España", "tamaño": "Mediano",
+         "curiosidad": "Elemento generado para las pruebas de rendimiento."}
+        for i in range(1, count + 1)
+    ]
+
+
+def prepare_tree(root):
+    os.makedirs(os.path.join(root, "Server", "private"), exist_ok=True)
+    with open(os.path.join(root, "Server", "index.html"), "w", encoding="utf-8") as f:
+        f.write("<html><body>" + "x" * 4096 + "</body></html>")
+    with open(os.path.join(root, "Server", "private", "resources.json"), "w", encoding="utf-8") as f:
+        json.dump({"gatos": synthetic_items(10)}, f)
+
+
+def build_benchmarks(items):
+    srv = nServer.SimpleHTTPServer()
+    large = synthetic_items(items)
+    category = synthetic_items(1000)
+    last_id = large[-1]["id"]
+    headers_raw = REQUEST_POST.split(b"\r\n\r\n")[0].decode()
+    body_str = REQUEST_POST.split(b"\r\n\r\n")[1].decode()
+    content = b"x" * 4096
+
+    def handle_get():
+        srv.handle_request(FakeSocket(REQUEST_GET))
+
+    def parse_bytewise():
+        parser = RequestParser()
+        for i in range(len(REQUEST_POST)):
+            parser.feed(REQUEST_POST[i:i + 1])
+
+    return {
+        "nServer.handle_request[GET static]": handle_get,
+        "http_parser.RequestParser.feed[POST]": lambda: RequestParser().feed(REQUEST_POST),
+        "http_parser.RequestParser.feed[POST, 1-byte chunks]": parse_bytewise,
+        "nServer.build_response[4KB]": lambda: srv.build_response("200 OK", content, content_type="text/html"),
+        "nServer.respond_json[1000 items]": lambda: srv.respond_json(category),
+        "nServer.get_content_type": lambda: srv.get_content_type("media/video.MP4"),
+        f"nServer.find_by_id[{items} items]": lambda: srv.find_by_id(large, last_id),
+        f"nServer.get_next_id[{items} items]": lambda: srv.get_next_id(large),
+        "nServer.log_full_request": lambda: srv.log_full_request(("127.0.0.1", 50000), headers_raw, body_str, "application/json"),
+    }
+
+
+def measure(func, repeat):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run(items, repeat, name_filter=None):
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        cwd = os.getcwd()
+        os.chdir(root)
+        try:
+            prepare_tree(root)
+            with contextlib.redirect_stdout(io.StringIO()):
+                benchmarks = build_benchmarks(items)
+                for name, func in benchmarks.items():
+                    if name_filter and name_filter not in name:
+                        continue
+                    results[name] = measure(func, repeat)
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def format_time(seconds):
+    if seconds < 1e-6:
+        return f"{seconds * 1e9:8.1f} ns"
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:8.2f} us"
+    return f"{seconds * 1e3:8.2f} ms"
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"{'benchmark':<44}{'current':>12}{'baseline':>12}{'change':>9}")
+    for name, value in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<44}{format_time(value):>12}{'-':>12}{'':>9}")
+            continue
+        change = value / base - 1
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<44}{format_time(value):>12}{format_time(base):>12}{change * 100:>+8.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the per-request hot paths")
+    parser.add_argument("--items", type=int, default=100000, help="size of the synthetic category for lookups")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.20, help="allowed slowdown before failing (0.20 = 20%%)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this text")
+    args = parser.parse_args()
+
+    results = run(args.items, args.repeat, args.filter)
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=4)
+        for name, value in results.items():
+            print(f"{name:<44}{format_time(value):>12}")
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    else:
+        print(f"No baseline found at {args.baseline}; run with --save-baseline to create one.\n")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed more than {args.tolerance * 100:.0f}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
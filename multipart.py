@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Parser incremental de cuerpos multipart/form-data (RFC 7578). Recibe
+    los bytes según llegan del socket con feed() y entrega cada parte a
+    medida que se lee: los campos de texto se guardan en memoria (con un
+    límite de tamaño) y los ficheros se escriben en el destino que decida
+    quien lo usa, sin tener nunca el cuerpo entero en memoria.
+"""
+import hashlib
+from email.message import Message
+
+MAX_PART_HEADER_BYTES = 16 * 1024
+MAX_FIELD_BYTES = 64 * 1024  # form fields (parts without a filename) are kept in memory
+MAX_PARTS = 1000
+
+
+class MultipartError(ValueError):
+    """The body is not valid multipart/form-data (or exceeds one of the limits)."""
+
+
+def parse_boundary(content_type):
+    """The boundary of a multipart/form-data Content-Type, or None for any other type."""
+    if not content_type:
+        return None
+    message = Message()
+    message["Content-Type"] = content_type
+    if message.get_content_type() != "multipart/form-data":
+        return None
+    boundary = message.get_param("boundary")
+    if not boundary or len(boundary) > 70:
+        return None
+    return boundary
+
+
+class Part:
+    """Headers of one part: the form field name, the filename (None for plain fields) and the content type."""
+
+    def __init__(self, headers):
+        message = Message()
+        for name, value in headers:
+            message[name] = value
+        if message.get_content_disposition() != "form-data":
+            raise MultipartError("Part without Content-Disposition: form-data")
+        self.name = message.get_param("name", header="content-disposition")
+        self.filename = message.get_filename()
+        self.content_type = message.get_content_type() if "Content-Type" in message else "application/octet-stream"
+
+
+class MultipartParser:
+    """Splits a multipart body into parts while it is being received.
+
+    For every part, open_part(part) is called with its Part and must return
+    an object with write(bytes) and close(); write() receives the content
+    in pieces and close() is called once the part ends. finish() checks
+    that the closing boundary was seen.
+    """
+
+    PREAMBLE, HEADERS, BODY, DONE = range(4)
+
+    def __init__(self, boundary, open_part):
+        self.delimiter = b"\r\n--" + boundary.encode("latin-1")
+        self.open_part = open_part
+        # The first boundary may start the body, without the CRLF in front of it.
+        self.buffer = bytearray(b"\r\n")
+        self.state = self.PREAMBLE
+        self.sink = None
+        self.parts = 0
+
+    def feed(self, data):
+        self.buffer += data
+        while self.state != self.DONE:
+            if self.state == self.HEADERS:
+                end = self.buffer.find(b"\r\n\r\n")
+                if end == -1:
+                    if len(self.buffer) > MAX_PART_HEADER_BYTES:
+                        raise MultipartError("Part headers too large")
+                    return
+                head = bytes(self.buffer[:end]).decode("utf-8", errors="replace")
+                del self.buffer[:end + 4]
+                self.parts += 1
+                if self.parts > MAX_PARTS:
+                    raise MultipartError("Too many parts")
+                headers = [(name.strip(), value.strip()) for name, sep, value in
+                           (line.partition(":") for line in head.split("\r\n")) if sep]
+                self.sink = self.open_part(Part(headers))
+                self.state = self.BODY
+                continue
+            found = self.buffer.find(self.delimiter)
+            if found == -1:
+                # Keep what could be the beginning of a delimiter split across two reads.
+                safe = len(self.buffer) - len(self.delimiter) + 1
+                if safe > 0:
+                    if self.sink is not None:
+                        self.sink.write(bytes(self.buffer[:safe]))
+                    del self.buffer[:safe]
+                return
+            if found:
+                if self.sink is not None:
+                    self.sink.write(bytes(self.buffer[:found]))
+                del self.buffer[:found]
+            # The two bytes after the delimiter tell whether another part follows (CRLF) or the body ends ("--").
+            end = len(self.delimiter) + 2
+            if len(self.buffer) < end:
+                return
+            marker = bytes(self.buffer[len(self.delimiter):end])
+            del self.buffer[:end]
+            if self.sink is not None:
+                self.sink.close()
+                self.sink = None
+            if marker == b"--":
+                self.state = self.DONE
+            elif marker == b"\r\n":
+                self.state = self.HEADERS
+            else:
+                raise MultipartError("Malformed boundary line")
+        self.buffer.clear()
+
+    def finish(self):
+        if self.state != self.DONE:
+            raise MultipartError("Body ended before the closing boundary")
+
+
+class FieldPart:
+    """A plain form field, collected in memory."""
+
+    def __init__(self, fields, name):
+        self.fields = fields
+        self.name = name
+        self.data = bytearray()
+
+    def write(self, data):
+        if len(self.data) + len(data) > MAX_FIELD_BYTES:
+            raise MultipartError(f"Form field {self.name!r} too large")
+        self.data += data
+
+    def close(self):
+        self.fields[self.name] = self.data.decode("utf-8", errors="replace")
+
+
+class FilePart:
+    """A file part: where it goes (target), the pending file it is written to, its size and optionally its sha256."""
+
+    def __init__(self, part, target, pending, hasher=None):
+        self.part = part
+        self.target = target
+        self.pending = pending
+        self.hasher = hasher
+        self.size = 0
+
+    def write(self, data):
+        self.pending.write(data)
+        if self.hasher is not None:
+            self.hasher.update(data)
+        self.size += len(data)
+
+    def close(self):
+        pass
+
+
+class Discard:
+    def write(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+class FormUpload:
+    """Consumer for a multipart/form-data body received in pieces (e.g. via RequestParser.stream_body).
+
+    Fields are kept in self.fields. For each file part, open_file(upload,
+    part) returns (target, pending), where pending is an object with
+    write() and discard() such as storage.AtomicFile; the caller commits
+    self.files once the body is complete. Errors (MultipartError, or an
+    OSError such as the PermissionError open_file raises for a forbidden
+    name) are kept in self.error instead of being raised, so the rest of
+    the body is still read and the client gets a proper answer.
+    """
+
+    def __init__(self, boundary, open_file, hash_files=False):
+        self.parser = MultipartParser(boundary, self.open_part)
+        self.open_file = open_file
+        self.hash_files = hash_files
+        self.fields = {}
+        self.files = []
+        self.error = None
+
+    def open_part(self, part):
+        if part.filename is None:
+            return FieldPart(self.fields, part.name)
+        if not part.filename:
+            return Discard()  # a file input left empty
+        target, pending = self.open_file(self, part)
+        file = FilePart(part, target, pending, hashlib.sha256() if self.hash_files else None)
+        self.files.append(file)
+        return file
+
+    def feed(self, data):
+        if self.error is not None:
+            return
+        try:
+            self.parser.feed(data)
+        except (MultipartError, OSError) as e:
+            self.error = e
+            self.discard()
+
+    def finish(self):
+        """Call once the whole body was fed. Returns the error, if any."""
+        if self.error is None:
+            try:
+                self.parser.finish()
+            except MultipartError as e:
+                self.error = e
+                self.discard()
+        return self.error
+
+    def discard(self):
+        """Remove every file not committed yet."""
+        for file in self.files:
+            file.pending.discard()
+
+    def close(self):
+        """Called when the request is over, whatever happened: drop the files that were not committed."""
+        self.discard()
@@ -16,6 +16,18 @@ How to execute:
     4. Ejecuta el script con:
            python3 nClient.py
     Se le solicitará al usuario el puerto para iniciar el servidor.
+    Un PUT de un fichero grande desde disco se sube por trozos y, si la
+    conexión falla, continúa desde lo que el servidor ya tiene. También sin
+    menús:
+           python3 nClient.py upload FICHERO http://localhost:8080/destino
+    Para mantener una carpeta igual que Server/ (push sube lo que cambió,
+    pull descarga; --delete borra lo que sobra en el otro lado):
+           python3 nClient.py sync push CARPETA http://localhost:8080 [--delete] [--dry-run] [-j 8]
+    Con --cache los GET se guardan en .nclient_cache/ con su ETag y
+    Last-Modified; al repetirlos se piden de forma condicional y, si el
+    servidor responde 304, el cuerpo sale de la caché (--cache-size MB fija
+    el tamaño máximo; se descartan los menos usados):
+           python3 nClient.py --cache --cache-size 512
 
 Creation Date:
     19/3/2025
@@ -23,21 +35,44 @@ Creation Date:
 Last Modified:
     19/3/2025
 """
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import queue
+import secrets
 import socket
-from datetime import datetime
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+UPLOADS_PATH = "/_uploads"
+UPLOAD_CHUNK = 4 * 1024 * 1024
+RESUMABLE_THRESHOLD = 8 * 1024 * 1024  # PUTs of files this large use a resumable upload
+UPLOAD_RETRIES = 5                     # failures in a row before giving up (a later run resumes)
+UPLOAD_STATE = ".nclient_uploads.json"  # upload ids of unfinished uploads, to resume them in a later run
+CACHE_DIR = ".nclient_cache"
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+MANIFEST_PATH = "/_manifest"
+SYNC_WORKERS = 4
+SYNC_TIMEOUT = 30
 
 class HttpClient:
-    def __init__(self, host="localhost", port=80, timeout=8):
+    def __init__(self, host="localhost", port=80, timeout=8, verbose=True):
         self.host = host
         self.port = port
         self.timeout = timeout
+        self.verbose = verbose
         self.sock = None
 
     def connect(self):
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.settimeout(self.timeout)
         self.sock.connect((self.host, self.port))
-        print(f"Connected (plain) to {self.host}:{self.port}")
+        if self.verbose:
+            print(f"Connected (plain) to {self.host}:{self.port}")
 
     def send_request(self, message, is_binary=False):
         try:
@@ -63,6 +98,114 @@ class HttpClient:
             self.sock.close()
             self.sock = None
 
+class HttpCache:
+    """On-disk cache of GET responses keyed by URL, revalidated with If-None-Match / If-Modified-Since.
+
+    Each body is stored in its own file (named after the sha256 of the
+    URL) and index.json keeps its validators, content type, size and last
+    use. When the bodies add up to more than max_bytes, the least recently
+    used ones are removed.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, "index.json")
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+        if self.size > max_bytes:  # started with a smaller --cache-size than last time
+            self.evict()
+            self.save()
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def body_path(self, key):
+        return os.path.join(self.directory, key)
+
+    @property
+    def size(self):
+        return sum(entry["size"] for entry in self.entries.values())
+
+    def conditional_headers(self, url):
+        """Headers that let the server answer 304 if our copy of url is still current."""
+        entry = self.entries.get(self.key(url))
+        if entry is None or not os.path.exists(self.body_path(self.key(url))):
+            return []
+        headers = []
+        if entry.get("etag"):
+            headers.append(f"If-None-Match: {entry['etag']}")
+        if entry.get("last_modified"):
+            headers.append(f"If-Modified-Since: {entry['last_modified']}")
+        return headers
+
+    def load(self, url, headers=""):
+        """(content type, body) of the cached copy after a 304, taking any new validators from its headers."""
+        key = self.key(url)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        try:
+            with open(self.body_path(key), "rb") as f:
+                content = f.read()
+        except OSError:
+            self.invalidate(url)
+            return None
+        entry["etag"] = HttpResponseUtils.get_header(headers, "ETag") or entry.get("etag")
+        entry["last_modified"] = HttpResponseUtils.get_header(headers, "Last-Modified") or entry.get("last_modified")
+        entry["used"] = time.time()
+        self.save()
+        return entry["content_type"], content
+
+    def store(self, url, headers, content_type, content):
+        """Keep a 200 response if it has a validator to revalidate it with and fits in the cache."""
+        etag = HttpResponseUtils.get_header(headers, "ETag")
+        last_modified = HttpResponseUtils.get_header(headers, "Last-Modified")
+        cache_control = (HttpResponseUtils.get_header(headers, "Cache-Control") or "").lower()
+        if not (etag or last_modified) or "no-store" in cache_control or len(content) > self.max_bytes:
+            self.invalidate(url)
+            return False
+        key = self.key(url)
+        tmp_path = self.body_path(key) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, self.body_path(key))
+        self.entries[key] = {"url": url, "etag": etag, "last_modified": last_modified, "content_type": content_type,
+                             "size": len(content), "used": time.time()}
+        self.evict()
+        self.save()
+        return True
+
+    def invalidate(self, url):
+        """Forget url (it was written or deleted, or answered without validators)."""
+        key = self.key(url)
+        if self.entries.pop(key, None) is not None:
+            self.save()
+        if os.path.exists(self.body_path(key)):
+            os.remove(self.body_path(key))
+
+    def evict(self):
+        """Remove the least recently used bodies until the cache is back under max_bytes."""
+        total = self.size
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1]["used"]):
+            if total <= self.max_bytes:
+                break
+            total -= entry["size"]
+            del self.entries[key]
+            if os.path.exists(self.body_path(key)):
+                os.remove(self.body_path(key))
+
+    def save(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=4)
+        os.replace(tmp_path, self.index_path)
+
 class HttpResponseUtils:
     @staticmethod
     def parse_response(response, is_binary=False):
@@ -91,6 +234,21 @@ class HttpResponseUtils:
             print(f"Error parsing response: {e}")
             return None, None, None
 
+    @staticmethod
+    def get_status(headers):
+        try:
+            return int(headers.split(" ", 2)[1])
+        except (AttributeError, IndexError, ValueError):
+            return None
+
+    @staticmethod
+    def get_header(headers, name):
+        for line in headers.split('\r\n')[1:]:
+            key, sep, value = line.partition(':')
+            if sep and key.strip().lower() == name.lower():
+                return value.strip()
+        return None
+
     @staticmethod
     def save_content(content, filename, is_binary=False):
         try:
@@ -194,22 +352,341 @@ def get_body_for_post_put(path, method):
         skip_file = True
     return path, body, content_type, boundary, skip_file
 
-def get_body_from_file():
-    filename = input("Enter local filename (relative path): ").strip()
+def get_file_type(filename):
+    """(content type, is binary) guessed from the extension."""
     ext = filename.lower().split('.')[-1]
+    if ext in ['txt','html','css','json']:
+        return 'text/plain', False
     is_binary = ext in ['png','jpg','jpeg','gif','mp3','wav','mp4','avi']
     content_type = {
         'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif',
         'mp3': 'audio/mpeg', 'wav': 'audio/wav'
     }.get(ext, 'application/octet-stream')
-    if ext in ['txt','html','css','json']:
-        content_type = 'text/plain'
-        is_binary = False
-    mode = 'rb' if is_binary else 'r'
-    with open(filename, mode) as f:
-        body = f.read()
-    boundary = "----WebKitFormBoundary" + datetime.now().strftime("%Y%m%d%H%M%S") if is_binary else None
-    return body, content_type, is_binary, boundary
+    return content_type, is_binary
+
+def encode_multipart(boundary, files):
+    """multipart/form-data body with one part per (field, filename, content_type, data)."""
+    parts = []
+    for field, filename, content_type, data in files:
+        filename = filename.replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+        head = (f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+                f"Content-Type: {content_type}\r\n\r\n")
+        parts.append(head.encode('utf-8') + (data.encode('utf-8') if isinstance(data, str) else data) + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode('utf-8'))
+    return b"".join(parts)
+
+def get_filenames():
+    raw = input("Enter local filename(s) (relative path; several separated by commas, path ending in /): ")
+    return [name.strip() for name in raw.split(",") if name.strip()]
+
+def get_body_from_file(filenames):
+    """Read the file(s) to upload: one text file goes as it is, binaries and several files as multipart/form-data."""
+    content_type, is_binary = get_file_type(filenames[0])
+    if len(filenames) == 1 and not is_binary:
+        with open(filenames[0], 'r') as f:
+            return f.read(), content_type, False, None
+    boundary = "----WebKitFormBoundary" + secrets.token_hex(8)
+    files = []
+    for name in filenames:
+        with open(name, 'rb') as f:
+            files.append(("file", os.path.basename(name), get_file_type(name)[0], f.read()))
+    return encode_multipart(boundary, files), "multipart/form-data", True, boundary
+
+def send_once(host, port, method, path, body=None, custom_headers=None, timeout=30):
+    """One request on a new connection. Returns (status, headers, content); status is None if it failed."""
+    client = HttpClient(host, port, timeout, verbose=False)
+    try:
+        client.connect()
+    except OSError as e:
+        print(f"Error connecting to {host}:{port}: {e}")
+        return None, "", b""
+    try:
+        request = build_request(method, path, host, custom_headers, body)
+        response = client.send_request(request, is_binary=True)
+    finally:
+        client.close()
+    headers, _, content = HttpResponseUtils.parse_response(response or b"", True)
+    return HttpResponseUtils.get_status(headers), headers or "", content or b""
+
+def load_upload_state():
+    try:
+        with open(UPLOAD_STATE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_upload_state(state):
+    if state:
+        with open(UPLOAD_STATE, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=4)
+    elif os.path.exists(UPLOAD_STATE):
+        os.remove(UPLOAD_STATE)
+
+def upload_offset(host, port, location):
+    """Bytes the server already has for an upload, or None if it does not know it (any more)."""
+    status, headers, _ = send_once(host, port, "HEAD", location)
+    if status != 200:
+        return None
+    return int(HttpResponseUtils.get_header(headers, "Upload-Offset") or 0)
+
+def resumable_upload(host, port, filename, target, chunk_size=UPLOAD_CHUNK):
+    """PUT filename to target in chunks through /_uploads, resuming from the server's offset after any failure.
+
+    The upload id is kept in UPLOAD_STATE until it finishes, so running
+    the same upload again after giving up (or after a crash) carries on
+    where it stopped instead of starting over.
+    """
+    if not target.startswith("/"):
+        target = "/" + target
+    size = os.path.getsize(filename)
+    key = f"{host}:{port}{target} {os.path.abspath(filename)} {size} {os.path.getmtime(filename)}"
+    state = load_upload_state()
+    location = state.get(key)
+    offset = upload_offset(host, port, location) if location else None
+    if offset is None:
+        body = json.dumps({"target": target, "size": size})
+        status, headers, content = send_once(host, port, "POST", UPLOADS_PATH, body, ["Content-Type: application/json"])
+        if status != 201:
+            print(f"Could not start the upload ({status}): {content.decode('utf-8', errors='replace').strip()}")
+            return False
+        location = HttpResponseUtils.get_header(headers, "Location")
+        offset = 0
+        state[key] = location
+        save_upload_state(state)
+    else:
+        print(f"Resuming upload of {filename} at byte {offset} of {size}")
+    failures = 0
+    with open(filename, "rb") as f:
+        while True:
+            f.seek(offset)
+            data = f.read(chunk_size)
+            content_range = f"Content-Range: bytes {offset}-{offset + len(data) - 1}/{size}"
+            status, headers, content = send_once(host, port, "PUT", location, data, [content_range])
+            if status in (200, 201):
+                print(f"Uploaded {filename} to {target} ({size} bytes)")
+                state = load_upload_state()
+                state.pop(key, None)
+                save_upload_state(state)
+                return True
+            if status == 204:
+                offset = int(HttpResponseUtils.get_header(headers, "Upload-Offset"))
+                failures = 0
+                print(f"  {offset}/{size} bytes ({offset * 100 // size}%)")
+                continue
+            failures += 1
+            if status is not None and status not in (408, 409) and status < 500:
+                print(f"Upload rejected ({status}): {content.decode('utf-8', errors='replace').strip()}")
+                return False
+            if failures > UPLOAD_RETRIES:
+                print(f"Giving up after {UPLOAD_RETRIES} failed attempts; run it again to resume")
+                return False
+            delay = min(0.5 * 2 ** failures, 30)
+            print(f"Chunk failed ({status or 'connection error'}), retrying in {delay:g}s")
+            time.sleep(delay)
+            # Part of the chunk may have arrived before the failure: ask where to carry on.
+            new_offset = upload_offset(host, port, location)
+            if new_offset is not None:
+                offset = new_offset
+
+def upload_command(argv):
+    """python3 nClient.py upload FILE http://HOST:PORT/TARGET"""
+    if len(argv) != 2:
+        print("Usage: python3 nClient.py upload FILE http://HOST:PORT/TARGET")
+        return 2
+    filename, url = argv
+    parts = urlsplit(url if "://" in url else "http://" + url)
+    target = parts.path if parts.path not in ("", "/") else "/" + os.path.basename(filename)
+    return 0 if resumable_upload(parts.hostname or "localhost", parts.port or 80, filename, target) else 1
+
+class ConnectionPool:
+    """Keep-alive connections to one server, shared by the threads of a sync."""
+
+    def __init__(self, host, port, timeout=SYNC_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+
+    def request(self, method, path, body=None, headers=None, sink=None):
+        """Send a request and return (status, response, content).
+
+        With sink, a 200 body is written to sink.write() as it arrives
+        instead of being returned. A pooled connection the server closed
+        while idle is replaced once.
+        """
+        for attempt in (1, 2):
+            try:
+                conn, reused = self.idle.get_nowait(), True
+            except queue.Empty:
+                conn, reused = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout), False
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                if sink is not None and response.status == 200:
+                    for data in iter(lambda: response.read(65536), b""):
+                        sink.write(data)
+                    content = b""
+                else:
+                    content = response.read()
+            except (ConnectionError, http.client.RemoteDisconnected, http.client.BadStatusLine):
+                conn.close()
+                if reused and attempt == 1 and sink is None:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self.idle.put(conn)
+            return response.status, response, content
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+class HashingWriter:
+    """Writes to a file and hashes what it writes."""
+
+    def __init__(self, file):
+        self.file = file
+        self.hasher = hashlib.sha256()
+
+    def write(self, data):
+        self.file.write(data)
+        self.hasher.update(data)
+
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+def local_files(directory):
+    """{relative path with "/": full path} of the files under directory, minus nClient's own state files."""
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in filenames:
+            if name == UPLOAD_STATE or (name.startswith(".") and name.endswith(".tmp")):
+                continue
+            full_path = os.path.join(dirpath, name)
+            files[os.path.relpath(full_path, directory).replace(os.sep, "/")] = full_path
+    return files
+
+def plan_sync(direction, local, remote, delete=False):
+    """[(action, path)] that make the destination side equal to the source side.
+
+    Files present on both sides are compared by size first and by sha256
+    only when the sizes match, so unchanged files are never transferred.
+    """
+    source, destination = (local, remote) if direction == "push" else (remote, local)
+    actions = []
+    for path in sorted(source):
+        if direction == "push" and "/" in path:
+            # The server stores uploads by file name, so subdirectories cannot be pushed.
+            actions.append(("skip", path))
+            continue
+        if path in destination:
+            entry = remote[path]
+            if os.path.getsize(local[path]) == entry["size"] and file_sha256(local[path]) == entry["sha256"]:
+                continue
+        actions.append(("upload" if direction == "push" else "download", path))
+    if delete:
+        actions += [("delete", path) for path in sorted(set(destination) - set(source))]
+    return actions
+
+def sync_action(pool, direction, directory, remote, action, path):
+    """Carry out one planned action. Returns an error message, or None if it went well."""
+    url_path = "/" + path
+    if action == "upload":
+        full_path = os.path.join(directory, path)
+        if os.path.getsize(full_path) >= RESUMABLE_THRESHOLD:
+            return None if resumable_upload(pool.host, pool.port, full_path, url_path) else "upload failed"
+        with open(full_path, "rb") as f:
+            data = f.read()
+        status, _, content = pool.request("PUT", url_path, data, {"Content-Type": "application/octet-stream"})
+        return None if status in (200, 201) else f"{status} {content.decode('utf-8', errors='replace').strip()}"
+    if action == "download":
+        full_path = os.path.join(directory, *path.split("/"))
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        tmp_path = os.path.join(os.path.dirname(full_path), f".{os.path.basename(full_path)}.{secrets.token_hex(6)}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                sink = HashingWriter(f)
+                status, _, _ = pool.request("GET", url_path, sink=sink)
+            if status != 200:
+                return f"{status}"
+            if sink.hasher.hexdigest() != remote[path]["sha256"]:
+                return "changed on the server while it was downloaded, sync again"
+            os.replace(tmp_path, full_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return None
+    if action == "delete":
+        if direction == "pull":
+            os.remove(os.path.join(directory, *path.split("/")))
+            return None
+        status, _, content = pool.request("DELETE", url_path)
+        return None if status in (200, 404) else f"{status} {content.decode('utf-8', errors='replace').strip()}"
+    return None
+
+def sync(direction, directory, host, port, delete=False, dry_run=False, workers=SYNC_WORKERS):
+    """Mirror directory to the server (push) or the server to directory (pull). Returns the number of failures."""
+    pool = ConnectionPool(host, port)
+    try:
+        status, _, content = pool.request("GET", MANIFEST_PATH)
+        if status != 200:
+            print(f"Could not read {MANIFEST_PATH}: {status}")
+            return 1
+        remote = {entry["path"]: entry for entry in json.loads(content)}
+        os.makedirs(directory, exist_ok=True)
+        actions = plan_sync(direction, local_files(directory), remote, delete)
+        for action, path in actions:
+            if action == "skip":
+                print(f"skip      {path} (subdirectories are not pushed)")
+        actions = [(action, path) for action, path in actions if action != "skip"]
+        if not actions:
+            print("Already in sync")
+            return 0
+        if dry_run:
+            for action, path in actions:
+                print(f"{action:<9} {path}")
+            return 0
+
+        def run(item):
+            action, path = item
+            try:
+                error = sync_action(pool, direction, directory, remote, action, path)
+            except (OSError, http.client.HTTPException) as e:
+                error = str(e)
+            print(f"{action:<9} {path}" + (f"  FAILED: {error}" if error else ""))
+            return error is None
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            failures = sum(not ok for ok in executor.map(run, actions))
+        print(f"{len(actions) - failures} of {len(actions)} changes applied")
+        return failures
+    finally:
+        pool.close()
+
+def sync_command(argv):
+    parser = argparse.ArgumentParser(prog="nClient.py sync", description="Mirror a local folder and the server's files.")
+    parser.add_argument("direction", choices=("push", "pull"), help="push: the folder is copied to the server; pull: the other way round")
+    parser.add_argument("directory")
+    parser.add_argument("url", help="http://HOST:PORT")
+    parser.add_argument("--delete", action="store_true", help="also delete what the other side does not have")
+    parser.add_argument("--dry-run", action="store_true", help="only print what would change")
+    parser.add_argument("-j", "--jobs", type=int, default=SYNC_WORKERS, help="transfers in parallel")
+    args = parser.parse_args(argv)
+    parts = urlsplit(args.url if "://" in args.url else "http://" + args.url)
+    failures = sync(args.direction, args.directory, parts.hostname or "localhost", parts.port or 80,
+                    args.delete, args.dry_run, args.jobs)
+    return 1 if failures else 0
 
 def save_and_preview(content_type, content):
     is_binary_content = content_type and any(t in content_type.lower() for t in ['image/', 'audio/', 'video/', 'application/octet-stream'])
@@ -225,7 +702,21 @@ def save_and_preview(content_type, content):
         except:
             print("(Binary content)")
 
-def main():
+def use_cache(cache, method, url, headers, content_type, content):
+    """Serve a 304 from the cache and keep fresh 200s; writes drop the cached copy. Returns (content type, body)."""
+    status = HttpResponseUtils.get_status(headers)
+    if method == "GET" and status == 304:
+        cached = cache.load(url, headers)
+        if cached is not None:
+            print(f"\n(Not modified: {len(cached[1])} bytes served from {cache.directory})")
+            return cached
+    elif method == "GET" and status == 200:
+        cache.store(url, headers, content_type, content if isinstance(content, bytes) else content.encode("utf-8"))
+    elif method in ("PUT", "POST", "DELETE") and status is not None and status < 400:
+        cache.invalidate(url)
+    return content_type, content
+
+def main(cache=None):
     raw_host, port, base_path = get_user_input()
     while True:
         try:
@@ -249,13 +740,23 @@ def main():
                 if not skip_file:
                     if input("Send from local file? (y/N): ").strip().lower() == 'y':
                         try:
-                            body, content_type, is_binary, boundary = get_body_from_file()
+                            filenames = get_filenames()
+                            if method == "PUT" and len(filenames) == 1 \
+                                    and os.path.getsize(filenames[0]) >= RESUMABLE_THRESHOLD:
+                                resumable_upload(raw_host, port, filenames[0], path)
+                                continue
+                            body, content_type, is_binary, boundary = get_body_from_file(filenames)
                         except Exception as e:
                             print(f"Error reading file: {e}")
                             continue
                     else:
                         body = get_body_from_input()
                         content_type = "application/json"
+            url = f"http://{raw_host}:{port}{path if path.startswith('/') else '/' + path}"
+            # Revalidate our copy unless the user already asked for a conditional request themselves.
+            if cache is not None and method == "GET" and \
+                    not any(h.lower().startswith(("if-none-match:", "if-modified-since:")) for h in custom_headers):
+                custom_headers = custom_headers + cache.conditional_headers(url)
             request = build_request(
                 method=method,
                 path=path,
@@ -275,9 +776,19 @@ def main():
                 if headers:
                     print("\n=== Response Headers ===\n")
                     print(headers)
+                    if cache is not None:
+                        content_type, content = use_cache(cache, method, url, headers, content_type, content)
                     save_and_preview(content_type, content)
         except Exception as e:
             print(f"Error: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == "upload":
+        sys.exit(upload_command(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "sync":
+        sys.exit(sync_command(sys.argv[2:]))
+    parser = argparse.ArgumentParser(description="Interactive HTTP client.")
+    parser.add_argument("--cache", action="store_true", help=f"cache GET responses in {CACHE_DIR} and revalidate them")
+    parser.add_argument("--cache-size", type=int, default=CACHE_MAX_BYTES // (1024 * 1024), help="cache size in MB")
+    args = parser.parse_args()
+    main(HttpCache(CACHE_DIR, args.cache_size * 1024 * 1024) if args.cache else None)
\ No newline at end of file
@@ -16,6 +16,43 @@ How to execute:
     4. Ejecuta el script con:
            python3 nServer.py
     Se le solicitará al usuario el puerto para iniciar el servidor.
+    Opciones:
+        --port PUERTO   usa ese puerto sin preguntar.
+        --dedup         guarda cada contenido subido una sola vez (Server/private/blobs).
+        --store         json|sqlite: guarda /resources en resources.json o en
+                        Server/private/resources.db (se importa desde el JSON la primera vez).
+        --cache-ttl N   segundos que se cachean las respuestas GET de /resources (0 la desactiva).
+        --rate-limit    CLASE=RATIO[/RÁFAGA] límite por IP para lecturas (read) o
+                        escrituras (write), p. ej. --rate-limit write=5/20 (429 al superarlo).
+        --max-in-flight N   peticiones atendidas a la vez antes de responder 503 (las
+                        conexiones keep-alive inactivas y los streams no cuentan).
+        --max-subscribers N streams de cambios (/resources/.../_changes) abiertos a la vez.
+        --max-streamed-body N   bytes como máximo de una subida que se escribe a disco
+                        según llega (multipart o trozo reanudable); el resto de
+                        cuerpos se leen en memoria y no pueden pasar de 64 MiB.
+        --header-timeout, --body-min-rate, --send-timeout
+                        plazos para clientes lentos (cabeceras, velocidad mínima de
+                        subida y envío de la respuesta); 0 desactiva cada uno.
+        --drain-timeout N   segundos para terminar las peticiones en curso al parar.
+        --keepalive-timeout N   segundos que una conexión persistente puede estar
+                        inactiva (0 cierra tras cada respuesta).
+        --durability    none|file|full: cuándo se hace fsync al guardar ficheros.
+        --replica-of URL    arranca como réplica de lectura del servidor URL
+                        (p. ej. http://localhost:8080): copia /resources en memoria
+                        siguiendo /resources/_changes y atiende las lecturas; el
+                        estado y el retraso se ven en /_replication.
+        --replica-writes    redirect|proxy: las escrituras en /resources de una réplica
+                        se redirigen al primario (307) o se le reenvían.
+        --backend HOST:PUERTO   (repetible) no sirve Server/: actúa como proxy inverso
+                        y balanceador delante de esos nServer (estado en /_balancer).
+        --balance       round-robin|least-conn|hash: cómo se elige el backend
+                        (hash: hash consistente de la ruta).
+        --profile       guarda tiempos por fase en Server/private/timings.log y
+                        permite capturas de cProfile (SIGUSR2 o POST/DELETE /_profile).
+
+    Señales: SIGTERM deja de aceptar conexiones, espera a las peticiones en
+    curso y termina; SIGHUP arranca un proceso nuevo que hereda el socket
+    de escucha (sin perder conexiones) y después drena el actual.
 
 Creation Date:
     19/3/2025
@@ -23,17 +60,176 @@ Creation Date:
 Last Modified:
     19/3/2025
 """
+import argparse
+import hashlib
+import math
+import select
 import socket
+import subprocess
+import sys
 import json
+import mmap
 import threading
 import os
+import signal
+import stat
+import time
+from collections import namedtuple
 from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import parse_qs, urlsplit
+from admission import InFlightSlot, RateLimiter, parse_limit
+from archive import ARCHIVE_CONTENT_TYPE, ARCHIVE_MAX_FILES, ARCHIVE_PATH, select_paths, tar_stream
+from balancer import (BALANCE_STRATEGIES, PROXY_BUFFER_MAX, Balancer, UpstreamConnectError, parse_backend,
+                      read_chunks, response_headers)
+from dirindex import DirectoryIndex, FileInfo
+from manifest import HashCache, build_manifest
+from metrics import Metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from multipart import FormUpload, MultipartError, parse_boundary
+from http_parser import (MAX_STREAMED_BODY_BYTES, RequestParser, HTTPParseError, ClientTimeout, lingering_close,
+                         recv_before)
+from profiling import PhaseTimer, PhaseLog, ProfileCapture, NULL_TIMER
+from changefeed import ChangeFeed, format_event
+from response import Response, StreamingResponse, SEND_CHUNK, content_type_header
+from response_cache import ResponseCache, DEFAULT_TTL as RESOURCE_CACHE_TTL
+from replication import Replicator, parse_primary
+from resource_store import STORE_BACKENDS, MemoryResourceStore, find_by_id, next_id, open_store
+from uploads import UPLOADS_PATH, Chunk, RejectedChunk, UploadError, UploadStore
+from storage import DURABILITY_FILE, DURABILITY_POLICIES, AtomicFile, BlobStore, PathLocks, atomic_write, is_temp_name
+
+KNOWN_METHODS = ("GET", "HEAD", "POST", "PUT", "DELETE")
+ADMIN_PATHS = ("/_metrics", "/_profile", "/_replication", "/_health", "/_balancer")
+SPECIAL_ROUTES = ADMIN_PATHS + ("/_files", "/_manifest", ARCHIVE_PATH, UPLOADS_PATH)
+PATH_CACHE_SIZE = 4096
+PATH_CACHE_TTL = 1.0
+MMAP_THRESHOLD = 1024 * 1024
+ROUTE_CLASSES = ("read", "write")
+MAX_IN_FLIGHT = 128
+REJECT_TIMEOUT = 0.1   # seconds a client refused with 503 gets to take the response
+MAX_SUBSCRIBERS = 1024  # open change streams (they do not count against MAX_IN_FLIGHT)
+HEADER_TIMEOUT = 10.0  # seconds to receive the whole header block
+BODY_MIN_RATE = 1024   # bytes/s the body must keep up once BODY_GRACE has passed
+BODY_GRACE = 10.0
+SEND_TIMEOUT = 30.0    # seconds the client gets to accept each SEND_CHUNK of the response
+DRAIN_TIMEOUT = 30.0   # seconds in-flight requests get to finish after SIGTERM/SIGHUP
+RESTART_TIMEOUT = 10.0  # seconds the new process gets to report it is serving
+ACCEPT_POLL = 0.5
+KEEPALIVE_TIMEOUT = 5.0      # seconds an idle persistent connection is kept open
+MAX_KEEPALIVE_REQUESTS = 100  # requests served on one connection before closing it
+MAX_PIPELINED = 16           # requests answered back-to-back from the buffer before closing
+CHANGES_SEGMENT = "_changes"  # /resources/{category}/_changes streams the category's changes, /resources/_changes all of them
+SSE_HEARTBEAT = 15.0          # seconds between heartbeat events on an idle change stream
+REPLICATION_HEARTBEAT = 1.0   # same for /resources/_changes, which replicas use to measure their lag
+REPLICA_WRITE_MODES = ("redirect", "proxy")
+SSE_RETRY_MS = 3000
+LISTEN_FD_ENV = "NSERVER_LISTEN_FD"  # listening socket handed over on SIGHUP
+READY_FD_ENV = "NSERVER_READY_FD"    # pipe the new process writes to once it is serving
+
+ResolvedPath = namedtuple("ResolvedPath", "allowed full_path rel_path content_type info checked")
+
 class SimpleHTTPServer:
-    def __init__(self, host='localhost', port=8080):
+    def __init__(self, host='localhost', port=8080, profiling=False, mmap_threshold=MMAP_THRESHOLD,
+                 durability=DURABILITY_FILE, dedup=False, store="json", resource_cache_ttl=RESOURCE_CACHE_TTL,
+                 rate_limits=None, max_in_flight=MAX_IN_FLIGHT, max_subscribers=MAX_SUBSCRIBERS,
+                 max_streamed_body=MAX_STREAMED_BODY_BYTES, header_timeout=HEADER_TIMEOUT,
+                 body_min_rate=BODY_MIN_RATE, send_timeout=SEND_TIMEOUT, drain_timeout=DRAIN_TIMEOUT,
+                 keepalive_timeout=KEEPALIVE_TIMEOUT, replica_of=None, replica_writes="redirect",
+                 backends=None, balance="round-robin"):
         self.host = host
         self.port = port
         self.server_dir = 'Server'
         os.makedirs(self.server_dir, exist_ok=True)
+        self.metrics = Metrics()
+        self.describe_metrics()
+        self.durability = durability
+        self.write_locks = PathLocks()
+        if replica_of:
+            # A replica keeps /resources in memory and rebuilds it from the primary's change log.
+            self.resources = MemoryResourceStore()
+            self.replicator = Replicator(replica_of, self.resources, self.record_change,
+                                         lambda category: self.write_locks.hold(f"resources/{category}"))
+        else:
+            self.resources = open_store(store, os.path.join(self.server_dir, "private"), durability)
+            self.replicator = None
+        self.replica_writes = replica_writes
+        # With backends the server is only a front door: every other request is forwarded to one of them.
+        self.balancer = Balancer(backends, balance) if backends else None
+        self.resource_cache = ResponseCache(resource_cache_ttl) if resource_cache_ttl > 0 else None
+        self.feed = ChangeFeed()
+        self.change_subscribers = 0
+        self.change_subscribers_lock = threading.Lock()
+        self.blobs = BlobStore(os.path.join(self.server_dir, "private", "blobs"), durability) if dedup else None
+        self.uploads = UploadStore(os.path.join(self.server_dir, "private", "uploads"), durability)
+        self.path_cache = {}
+        self.path_cache_generation = 0  # bumped on every invalidation, so a lookup racing one is not cached
+        self.path_cache_lock = threading.Lock()
+        self.index = DirectoryIndex(self.server_dir, exclude=("private",), content_type=self.get_content_type,
+                                    ignore=is_temp_name)
+        self.index.add_listener(lambda rel_path: self.invalidate_path_cache())
+        self.hashes = HashCache(self.server_dir, os.path.join(self.server_dir, "private", "hashes.json"))
+        self.index.add_listener(self.hashes.forget)
+        self.mmap_threshold = mmap_threshold
+        self.mmap_cache = {}
+        self.mmap_lock = threading.Lock()
+        self.index.add_listener(self.drop_mapping)
+        # rate_limits: {route class: (requests per second, burst)}, applied per client IP.
+        self.rate_limiters = {cls: RateLimiter(rate, burst) for cls, (rate, burst) in (rate_limits or {}).items()}
+        self.slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self.max_subscribers = max_subscribers
+        self.max_streamed_body = max_streamed_body
+        # Slow-client deadlines; 0 disables each of them.
+        self.header_timeout = header_timeout
+        self.body_min_rate = body_min_rate
+        self.send_timeout = send_timeout
+        self.drain_timeout = drain_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.stopping = threading.Event()
+        self.restart_requested = False
+        self.handed_off = False
+        self.connections = 0
+        self.connections_done = threading.Condition()
+        self.profiling = profiling
+        if profiling:
+            private_dir = os.path.join(self.server_dir, "private")
+            self.phase_log = PhaseLog(os.path.join(private_dir, "timings.log"))
+            self.profile = ProfileCapture(private_dir)
+
+    def describe_metrics(self):
+        m = self.metrics
+        m.describe("http_requests_total", "counter", "HTTP requests handled, by method, route and status.")
+        m.describe("http_request_duration_seconds", "histogram", "Time from reading the request to sending the response.")
+        m.describe("http_requests_in_flight", "gauge", "Requests currently being processed.")
+        m.describe("http_open_connections", "gauge", "Client connections currently open.")
+        m.describe("http_parse_errors_total", "counter", "Requests rejected by the parser, by status.")
+        m.describe("http_rejected_total", "counter", "Requests refused by admission control, by reason and route class.")
+        m.describe("http_slow_clients_total", "counter", "Connections closed for missing a deadline, by phase.")
+        m.describe("http_pipelined_requests_total", "counter", "Requests that were already buffered behind the previous one.")
+        m.describe("http_received_bytes_total", "counter", "Bytes read from clients.")
+        m.describe("http_sent_bytes_total", "counter", "Bytes written to clients.")
+        m.describe("http_cache_requests_total", "counter", "Cache lookups, by cache and result (hit/miss).")
+        m.describe("proxy_requests_total", "counter", "Requests forwarded to a backend, by backend and status.")
+        m.describe("proxy_errors_total", "counter", "Requests no backend answered, by reason.")
+        m.gauge_callback("mmap_cached_files", "Large files currently memory-mapped for serving.",
+                         lambda: len(self.mmap_cache))
+        m.gauge_callback("resource_cache_entries", "Responses held by the /resources cache.",
+                         lambda: len(self.resource_cache) if self.resource_cache else 0)
+        m.gauge_callback("resource_cache_bytes", "Bytes held by the /resources cache.",
+                         lambda: self.resource_cache.size if self.resource_cache else 0)
+        m.gauge_callback("resource_change_subscribers", "Clients connected to a /resources/{category}/_changes stream.",
+                         lambda: self.change_subscribers)
+        m.gauge_callback("replication_applied_seq", "Last change of the primary applied by this replica.",
+                         lambda: self.replicator.applied_seq if self.replicator else 0)
+        m.gauge_callback("replication_lag_seconds", "Seconds since this replica was last known to be up to date.",
+                         lambda: (self.replicator.lag() or 0) if self.replicator else 0)
+        m.gauge_callback("replication_connected", "1 while this replica is following the primary's change stream.",
+                         lambda: int(self.replicator.connected) if self.replicator else 0)
+        m.gauge_callback("manifest_hashes_cached", "Public files whose sha256 is cached for /_manifest.",
+                         lambda: len(self.hashes))
+        m.gauge_callback("dirindex_files", "Public files tracked by the directory index.",
+                         lambda: len(self.index.entries))
+        m.describe("http_request_phase_seconds", "histogram", "Per-phase request time (only with profiling enabled).")
+        m.gauge_callback("process_uptime_seconds", "Seconds since the server object was created.",
+                         lambda: time.time() - m.started)
 
     def is_private(self, file_path):
         normalized_path = os.path.normpath(file_path)
@@ -46,20 +242,241 @@ class SimpleHTTPServer:
     def check_file_access(self, file_path):
         return not self.is_private(file_path) and not self.is_path_traversal(file_path)
 
-    def start(self):
+    def resolve_static(self, file_path):
+        """Map a request path to its access decision, location, content type and file info.
+
+        Results are cached. While the directory index is running, file info
+        comes from it and its change events clear the cache; otherwise the
+        file is re-stat'ed after PATH_CACHE_TTL seconds.
+        """
+        entry = self.path_cache.get(file_path)
+        now = time.monotonic()
+        if entry is not None and (not entry.allowed or self.index.active or now - entry.checked < PATH_CACHE_TTL):
+            self.metrics.inc("http_cache_requests_total", (("cache", "path"), ("result", "hit")))
+            return entry
+        self.metrics.inc("http_cache_requests_total", (("cache", "path"), ("result", "miss")))
+        generation = self.path_cache_generation
+        if not self.check_file_access(file_path):
+            entry = ResolvedPath(False, None, None, None, None, now)
+        else:
+            rel_path = os.path.normpath(file_path)
+            full_path = os.path.join(self.server_dir, rel_path)
+            content_type = self.get_content_type(full_path)
+            if self.index.active:
+                info = self.index.get(rel_path)
+            else:
+                try:
+                    st = os.stat(full_path)
+                    info = FileInfo(st.st_size, st.st_mtime, content_type) if stat.S_ISREG(st.st_mode) else None
+                except OSError:
+                    info = None
+            entry = ResolvedPath(True, full_path, rel_path, content_type, info, now)
+        with self.path_cache_lock:
+            if self.path_cache_generation != generation:
+                return entry  # the files changed while this was computed: it may already be stale
+            if file_path not in self.path_cache and len(self.path_cache) >= PATH_CACHE_SIZE:
+                del self.path_cache[next(iter(self.path_cache))]
+            self.path_cache[file_path] = entry
+        return entry
+
+    def file_changed(self, rel_path):
+        """Called after the server itself writes or deletes a file under server_dir."""
+        if self.index.active:
+            self.index.refresh(rel_path)
+        self.invalidate_path_cache()
+        self.drop_mapping(rel_path)
+        self.hashes.forget(rel_path)
+
+    def invalidate_path_cache(self):
+        with self.path_cache_lock:
+            self.path_cache_generation += 1
+            self.path_cache.clear()
+
+    def open_listener(self):
+        """Listening socket: the one handed over by the previous process on SIGHUP, or a new one."""
+        fd = os.environ.pop(LISTEN_FD_ENV, None)
+        if fd is not None:
+            server_socket = socket.socket(fileno=int(fd))
+            self.host, self.port = server_socket.getsockname()[:2]
+            print("Inherited the listening socket from the previous process")
+            return server_socket
         server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         try:
             server_socket.bind((self.host, self.port))
         except Exception as e:
             print(f"Error al enlazar el servidor en {self.host}:{self.port} -> {e}")
-            return
+            return None
         server_socket.listen(5)
+        self.port = server_socket.getsockname()[1]  # the one the OS picked if port was 0
+        return server_socket
+
+    def start(self):
+        server_socket = self.open_listener()
+        if server_socket is None:
+            return
         print(f"HTTP Server listening on {self.host}:{self.port}")
+        if self.balancer is not None:
+            self.balancer.start()
+            names = ", ".join(backend.name for backend in self.balancer.backends)
+            print(f"Reverse proxy for {names} ({self.balancer.strategy})")
+        else:
+            self.index.start()
+            print(f"Directory index of {self.server_dir}/ ready ({len(self.index.entries)} files, {self.index.backend})")
+        if self.replicator is not None:
+            self.replicator.start()
+            print(f"Read replica of {self.replicator.primary_url} (writes: {self.replica_writes})")
+        if threading.current_thread() is threading.main_thread():
+            if self.profiling and hasattr(signal, "SIGUSR2"):
+                signal.signal(signal.SIGUSR2, lambda signum, frame: self.profile.toggle())
+                print(f"Profiling enabled: send SIGUSR2 to pid {os.getpid()} or POST/DELETE /_profile to start/stop a capture")
+            signal.signal(signal.SIGTERM, lambda signum, frame: self.shutdown())
+            if hasattr(signal, "SIGHUP"):
+                signal.signal(signal.SIGHUP, lambda signum, frame: self.request_restart())
+            print(f"PID {os.getpid()}: SIGTERM drains and stops the server, SIGHUP restarts it without dropping connections")
+        self.notify_ready()
+        server_socket.settimeout(ACCEPT_POLL)
+        while not self.stopping.is_set():
+            if self.restart_requested:
+                self.restart_requested = False
+                self.spawn_successor(server_socket)
+                continue
+            try:
+                client_socket, addr = server_socket.accept()
+            except socket.timeout:
+                continue
+            self.accept_connection(client_socket, addr)
+        if not self.handed_off:
+            self.accept_backlog(server_socket)
+        server_socket.close()
+        self.drain()
+
+    def shutdown(self):
+        """Stop accepting connections; start() then waits for the in-flight ones and returns."""
+        print("Shutting down: no new connections, waiting for in-flight requests")
+        self.stopping.set()
+
+    def request_restart(self):
+        self.restart_requested = True
+
+    def accept_connection(self, client_socket, addr):
+        print(f"Conexión entrante de {addr}")
+        if self.slots is not None and not self.slots.acquire(blocking=False):
+            self.reject_overloaded(client_socket)
+            return
+        with self.connections_done:
+            self.connections += 1
+        # Daemon threads, so a drain that runs out of time does not keep the process alive.
+        accepted_at = time.perf_counter() if self.profiling else None
+        threading.Thread(target=self.dispatch, args=(client_socket, accepted_at), daemon=True).start()
+
+    def accept_backlog(self, server_socket):
+        """Take the connections already queued by the kernel so they are served rather than reset."""
+        server_socket.setblocking(False)
         while True:
-            client_socket, addr = server_socket.accept()
-            print(f"Conexión entrante de {addr}")
-            threading.Thread(target=self.handle_request, args=(client_socket,)).start()
+            try:
+                client_socket, addr = server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            self.accept_connection(client_socket, addr)
+
+    def drain(self):
+        deadline = time.monotonic() + self.drain_timeout
+        with self.connections_done:
+            while self.connections:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print(f"Drain timeout: closing {self.connections} unfinished connection(s)")
+                    break
+                self.connections_done.wait(remaining)
+        self.index.stop()
+        if self.balancer is not None:
+            self.balancer.stop()
+        if self.replicator is not None:
+            self.replicator.stop()
+        self.resources.close()
+        if self.profiling and self.profile.active:
+            print(f"Profile written to {self.profile.stop()}")
+        self.metrics.flush()
+        print("Server stopped")
+
+    def spawn_successor(self, server_socket):
+        """Start a new copy of this process on the same listening socket and drain once it is serving.
+
+        The kernel keeps queueing connections on the shared socket while the
+        new process starts, so none are refused. If it does not report
+        that it is ready within RESTART_TIMEOUT it is killed and this
+        process carries on.
+        """
+        fd = server_socket.fileno()
+        ready_r, ready_w = os.pipe()
+        env = dict(os.environ, **{LISTEN_FD_ENV: str(fd), READY_FD_ENV: str(ready_w)})
+        print("Restarting: starting a new server process on the same socket")
+        try:
+            child = subprocess.Popen([sys.executable] + sys.orig_argv[1:], env=env, pass_fds=(fd, ready_w))
+        except OSError as e:
+            print(f"Restart failed: {e}")
+            os.close(ready_r)
+            return
+        finally:
+            os.close(ready_w)
+        try:
+            ready, _, _ = select.select([ready_r], [], [], RESTART_TIMEOUT)
+            ok = bool(ready) and os.read(ready_r, 1) == b"1"
+        finally:
+            os.close(ready_r)
+        if not ok:
+            print(f"Restart failed: new process (pid {child.pid}) did not start serving, keeping this one")
+            child.kill()
+            return
+        print(f"New server process (pid {child.pid}) is serving; draining this one")
+        self.handed_off = True
+        self.stopping.set()
+
+    def notify_ready(self):
+        """Tell the process that spawned us on SIGHUP that we are accepting connections."""
+        fd = os.environ.pop(READY_FD_ENV, None)
+        if fd is not None:
+            os.write(int(fd), b"1")
+            os.close(int(fd))
+
+    def dispatch(self, client_socket, accepted_at=None):
+        """Handle one accepted connection and give its in-flight slot back."""
+        slot = InFlightSlot(self.slots) if self.slots is not None else None
+        try:
+            self.handle_request(client_socket, accepted_at, slot)
+        finally:
+            if slot is not None:
+                slot.release()
+            with self.connections_done:
+                self.connections -= 1
+                self.connections_done.notify_all()
+
+    def reject_overloaded(self, client_socket):
+        """Answer 503 right away, from the calling thread (the accept loop when the server is full).
+
+        No thread is started and nothing waits on the client beyond
+        REJECT_TIMEOUT, so a flood of connections costs neither threads
+        nor accept-loop time. Only the input already received is drained
+        before closing, so the kernel does not reset the connection under
+        the response.
+        """
+        self.metrics.inc("http_rejected_total", (("reason", "overload"), ("route_class", "any")))
+        self.metrics.flush()
+        try:
+            self.build_response("503 Service Unavailable", "Server busy, try again later",
+                                extra_headers={"Retry-After": "1"}).send(client_socket, REJECT_TIMEOUT)
+            client_socket.shutdown(socket.SHUT_WR)
+            client_socket.setblocking(False)
+            for _ in range(16):
+                if not client_socket.recv(65536):
+                    break
+        except OSError:  # includes BlockingIOError once nothing more is buffered
+            pass
+        finally:
+            client_socket.close()
 
     def log_full_request(self, addr, headers_raw, body, content_type):
         timestamp = datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
@@ -80,63 +497,352 @@ class SimpleHTTPServer:
                 f.write(body + "\n")
             f.write("=" * 60 + "\n")
 
-    def handle_request(self, client_socket):
+    def route_label(self, path):
+        if path in SPECIAL_ROUTES:
+            return path
+        if path.startswith(ARCHIVE_PATH + "?"):
+            return ARCHIVE_PATH
+        if path.startswith(UPLOADS_PATH + "/"):
+            return UPLOADS_PATH + "/{id}"
+        if path.startswith("/resources"):
+            depth = len([s for s in path.strip("/").split("/") if s])
+            return {1: "/resources", 2: "/resources/{category}", 3: "/resources/{category}/{id}"}.get(depth, "/resources/other")
+        return "static"
+
+    def route_class(self, method):
+        """Class used to pick the rate limit: uploads and /resources changes are writes, the rest reads."""
+        return "write" if method in ("POST", "PUT", "DELETE") else "read"
+
+    def check_rate_limit(self, addr, method, path):
+        """Seconds the client has to wait before this request is allowed (0 if it is allowed now)."""
+        limiter = self.rate_limiters.get(self.route_class(method))
+        return limiter.acquire(addr[0]) if limiter else 0
+
+    def handle_request(self, client_socket, accepted_at=None, slot=None):
+        """Serve the requests sent on one connection, several if the client keeps it open.
+
+        slot (the connection's InFlightSlot) is given back while the
+        connection waits for its next request and taken again before
+        serving it.
+        """
+        metrics = self.metrics
+        metrics.inc("http_open_connections")
         try:
             addr = client_socket.getpeername()
             print(f"Incoming connection of {addr}")
-            request_data = b''
-            while b'\r\n\r\n' not in request_data:
-                chunk = client_socket.recv(4096)
+            pending = b''
+            served = pipelined = 0
+            while True:
+                if not pending and served:
+                    if slot is not None:
+                        slot.release()
+                    if not self.wait_for_request(client_socket):
+                        break
+                    if slot is not None and not slot.reacquire():
+                        self.reject_overloaded(client_socket)
+                        break
+                # Requests already buffered behind the previous one were pipelined by the client.
+                pipelined = pipelined + 1 if pending else 0
+                args = (client_socket, addr, pending, accepted_at if not served else None, served, pipelined, slot)
+                # Profiled per request, so a long-lived connection does not keep the (single) profiler to itself.
+                keep_alive, pending = self.profile.run(self.serve_request, *args) if self.profiling \
+                    else self.serve_request(*args)
+                served += 1
+                if not keep_alive:
+                    break
+        except OSError as e:
+            print(f"Connection error: {e}")
+        finally:
+            metrics.dec("http_open_connections")
+            metrics.flush()
+            try:
+                client_socket.close()
+            except:
+                pass
+
+    def wait_for_request(self, client_socket):
+        """Wait on an idle kept-alive connection; False once keepalive_timeout passes or the server is stopping."""
+        deadline = time.monotonic() + self.keepalive_timeout
+        while not self.stopping.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([client_socket], [], [], min(ACCEPT_POLL, remaining))
+            if readable:
+                return True
+        return False
+
+    def keep_alive(self, parser, served, pipelined):
+        if not self.keepalive_timeout or self.stopping.is_set() or not parser.complete:
+            return False
+        if served + 1 >= MAX_KEEPALIVE_REQUESTS or pipelined >= MAX_PIPELINED:
+            return False
+        tokens = {t.strip().lower() for t in parser.headers.get("Connection", "").split(",")}
+        if "close" in tokens:
+            return False
+        return parser.version == "HTTP/1.1" or "keep-alive" in tokens
+
+    def serve_request(self, client_socket, addr, pending, accepted_at, served, pipelined, slot=None):
+        """Read, route and answer one request. Returns (keep the connection open, bytes of the next request)."""
+        metrics = self.metrics
+        timer = PhaseTimer(accepted_at) if self.profiling else NULL_TIMER
+        timer.mark("accept_wait")
+        method = path = None
+        response = None
+        start = None
+        upload = None
+        try:
+            parser = RequestParser(max_streamed_body=self.max_streamed_body)
+            received = 0
+            header_deadline = time.monotonic() + self.header_timeout if self.header_timeout else None
+            if pending:
+                parser.feed(pending)
+            while not parser.headers_complete:
+                chunk = recv_before(client_socket, 4096, header_deadline, "headers")
                 if not chunk:
-                    return
-                request_data += chunk
-            header_end = request_data.find(b'\r\n\r\n')
-            headers_raw = request_data[:header_end].decode('utf-8', errors='ignore')
-            request_lines = headers_raw.split('\r\n')
-            method, path, _ = request_lines[0].split()
+                    return False, b''
+                received += len(chunk)
+                parser.feed(chunk)
+            start = time.perf_counter()
+            method, path, headers = parser.method, parser.path, parser.headers
+            metrics.inc("http_requests_in_flight")
+            if pipelined:
+                metrics.inc("http_pipelined_requests_total")
             print(f"Recibida petición: {method} {path}")  # <-- Feedback en consola
-            headers = {k.strip(): v.strip() for line in request_lines[1:] if ':' in line for k, v in [line.split(':', 1)]}
-            body = b''
-            if 'Content-Length' in headers:
-                content_length = int(headers['Content-Length'])
-                body = request_data[header_end + 4:]
-                while len(body) < content_length:
-                    chunk = client_socket.recv(min(4096, content_length - len(body)))
-                    if not chunk:
-                        break
-                    body += chunk
-            bina = method in ("POST", "PUT") and path.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.mp3', '.wav', '.mp4', '.avi'))
-            body_str = body.decode('utf-8', errors='replace') if (method in ("POST", "PUT") and not bina) else ""
-            self.log_full_request(client_socket.getpeername(), headers_raw, body_str, headers.get("Content-Type", ""))
-            if path.startswith("/resources"):
-                response = self.handle_resources(method, path, body, headers)
+            wait = self.check_rate_limit(addr, method, path)
+            if wait:
+                print(f"Rate limit exceeded by {addr[0]}, retry in {wait:.2f}s")
+                metrics.inc("http_rejected_total", (("reason", "rate_limit"), ("route_class", self.route_class(method))))
+                response = self.build_response("429 Too Many Requests", "Too many requests",
+                                               extra_headers={"Retry-After": str(max(1, math.ceil(wait)))})
+                self.send_response(client_socket, response)
+                lingering_close(client_socket)
+                return False, b''
+            timer.mark("read_headers")
+            upload = self.start_upload(method, path, headers)
+            if upload is not None:
+                # Multipart uploads and resumable chunks go to their files as they arrive instead of being buffered.
+                parser.stream_body(upload.feed)
             else:
-                file_name = path[1:] if path.startswith('/') else path
-                if not self.check_file_access(file_name):
-                    response = self.build_response("403 Forbidden")
-                elif method == "GET":
-                    response = self.serve_static(file_name, headers)
-                elif method in ("PUT", "POST"):
-                    response = self.handle_put(file_name, headers, body)
-                elif method == "DELETE":
-                    response = self.delete_file(file_name)
-                elif method == "HEAD":
-                    response = self.serve_static(file_name, headers)
-                    response = response.split(b'\r\n\r\n')[0] + b'\r\n\r\n' if isinstance(response, bytes) else response.split('\r\n\r\n')[0] + '\r\n\r\n'
-                else:
-                    response = self.build_response("404 Not Found")
-            client_socket.sendall(response.encode() if isinstance(response, str) else response)
+                parser.buffer_body()
+                if self.blobs and method in ("PUT", "POST") and not path.startswith(("/resources", UPLOADS_PATH)) \
+                        and path not in SPECIAL_ROUTES:
+                    parser.hash_body(hashlib.sha256())
+            body_start, head_received = time.monotonic(), received
+            while not parser.complete:
+                body_deadline = body_start + BODY_GRACE + (received - head_received) / self.body_min_rate \
+                    if self.body_min_rate else None
+                chunk = recv_before(client_socket, min(65536, parser.remaining), body_deadline, "body")
+                if not chunk:
+                    break
+                received += len(chunk)
+                parser.feed(chunk)
+            body = parser.body
+            metrics.inc("http_received_bytes_total", value=received)
+            # A body cut short must not be acted on (a PUT would commit half a file); only a resumable
+            # chunk keeps what arrived, since the client carries on from there.
+            if not parser.complete and not isinstance(upload, Chunk):
+                print(f"Client {addr} closed the connection before sending the whole body")
+                response = self.build_response("400 Bad Request", "Request body ended before Content-Length")
+                try:
+                    response.send(client_socket, self.send_timeout or None)
+                except OSError:
+                    pass
+                return False, b''
+            timer.mark("read_body")
+            if path not in ADMIN_PATHS:
+                bina = method in ("POST", "PUT") and path.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.mp3', '.wav', '.mp4', '.avi'))
+                body_str = body.decode('utf-8', errors='replace') if (method in ("POST", "PUT") and not bina) else ""
+                self.log_full_request(addr, parser.headers_raw, body_str, headers.get("Content-Type", ""))
+                timer.mark("log")
+            digest = parser.body_hasher.hexdigest() if parser.body_hasher else None
+            handler = self.route(method, path, headers, body, addr, digest, upload)
+            timer.mark("route")
+            response = handler()
+            timer.mark("handler")
+            response.keep_alive = self.keep_alive(parser, served, pipelined)
+            if response.long_lived and slot is not None:
+                slot.release()  # an event stream is limited by max_subscribers instead
+            self.send_response(client_socket, response)
+            timer.mark("send")
+            return response.keep_alive, parser.leftover
+        except ClientTimeout as e:
+            print(f"Closing slow client {addr}: {e}")
+            metrics.inc("http_slow_clients_total", (("phase", e.phase),))
+            if e.phase != "send":
+                response = self.build_response(e.status_line, str(e))
+                try:
+                    response.send(client_socket, self.send_timeout or None)
+                except OSError:
+                    pass
+                lingering_close(client_socket)
+        except HTTPParseError as e:
+            print(f"Rejected request: {e}")
+            metrics.inc("http_parse_errors_total", (("status", str(e.status.value)),))
+            response = self.build_response(e.status_line, str(e))
+            try:
+                response.send(client_socket, self.send_timeout or None)
+            except OSError:
+                pass
+            lingering_close(client_socket)
         except Exception as e:
             print(f"Error handling request: {e}")
+            response = self.build_response("500 Internal Server Error")
             try:
-                client_socket.sendall(self.build_response("500 Internal Server Error"))
+                response.send(client_socket, self.send_timeout or None)
             except:
                 pass
         finally:
-            try:
-                client_socket.close()
-            except:
-                pass
+            if upload is not None:
+                upload.close()
+            if method is not None:
+                self.record_request(method, path, response, start, timer.phases)
+        return False, b''
+
+    def send_response(self, client_socket, response):
+        """Send a Response; the client must accept each SEND_CHUNK within send_timeout."""
+        try:
+            response.send(client_socket, self.send_timeout or None, SEND_CHUNK)
+        except socket.timeout:
+            raise ClientTimeout("send") from None
+
+    def route(self, method, path, headers, body, addr, body_digest=None, upload=None):
+        """Return a zero-argument callable that builds the response for this request."""
+        if path == "/_metrics":
+            return lambda: self.handle_metrics(method)
+        if path == "/_profile":
+            return lambda: self.handle_profile(method, addr)
+        if path == "/_health":
+            return lambda: self.handle_health(method)
+        if path == "/_balancer":
+            return lambda: self.handle_balancer(method)
+        if self.balancer is not None:
+            return lambda: self.proxy_request(method, path, headers, body, addr)
+        if path == "/_files":
+            return lambda: self.handle_file_listing(method)
+        if path == "/_manifest":
+            return lambda: self.handle_manifest(method)
+        if path == ARCHIVE_PATH or path.startswith(ARCHIVE_PATH + "?"):
+            return lambda: self.handle_archive(method, path, body)
+        if path == UPLOADS_PATH or path.startswith(UPLOADS_PATH + "/"):
+            return lambda: self.handle_uploads(method, path, body, upload)
+        if path == "/_replication":
+            return lambda: self.handle_replication(method)
+        if path.startswith("/resources"):
+            return lambda: self.handle_resources(method, path, body, headers)
+        file_name = path[1:] if path.startswith('/') else path
+        if not self.resolve_static(file_name).allowed:
+            return lambda: self.build_response("403 Forbidden")
+        elif method == "GET":
+            return lambda: self.serve_static(file_name, headers)
+        elif method in ("PUT", "POST"):
+            if upload is not None:
+                return lambda: self.finish_upload(upload)
+            return lambda: self.handle_put(file_name, headers, body, body_digest)
+        elif method == "DELETE":
+            return lambda: self.delete_file(file_name)
+        elif method == "HEAD":
+            return lambda: self.head_only(self.serve_static(file_name, headers))
+        else:
+            return lambda: self.build_response("404 Not Found")
+
+    def head_only(self, response):
+        return response.without_body()
+
+    def record_request(self, method, path, response, start, phases):
+        metrics = self.metrics
+        labels = (
+            ("method", method if method in KNOWN_METHODS else "OTHER"),
+            ("route", self.route_label(path)),
+            ("status", response.status[:3]),
+        )
+        metrics.dec("http_requests_in_flight")
+        metrics.inc("http_requests_total", labels)
+        metrics.inc("http_sent_bytes_total", value=len(response))
+        metrics.observe("http_request_duration_seconds", labels[:2], time.perf_counter() - start)
+        if phases:
+            for phase, seconds in phases.items():
+                metrics.observe("http_request_phase_seconds", (("phase", phase),), seconds)
+            self.phase_log.write(labels[0][1], labels[1][1], labels[2][1], phases)
+
+    def handle_metrics(self, method):
+        if method not in ("GET", "HEAD"):
+            return self.build_response("405 Method Not Allowed")
+        response = self.build_response("200 OK", self.metrics.render(), content_type=METRICS_CONTENT_TYPE)
+        return self.head_only(response) if method == "HEAD" else response
+
+    def handle_profile(self, method, addr):
+        if not self.profiling:
+            return self.build_response("404 Not Found")
+        if addr[0] not in ("127.0.0.1", "::1"):
+            return self.build_response("403 Forbidden")
+        if method == "GET":
+            return self.respond_json(self.profile.status())
+        elif method == "POST":
+            return self.respond_json(self.profile.start())
+        elif method == "DELETE":
+            path = self.profile.stop()
+            return self.respond_json({"active": False, "profile": path})
+        return self.build_response("405 Method Not Allowed")
+
+    def handle_health(self, method):
+        """200 while accepting requests, 503 once draining, so a balancer in front stops sending more."""
+        if method not in ("GET", "HEAD"):
+            return self.build_response("405 Method Not Allowed")
+        if self.stopping.is_set():
+            response = self.build_response("503 Service Unavailable", "Draining\n")
+        else:
+            response = self.build_response("200 OK", "OK\n")
+        return self.head_only(response) if method == "HEAD" else response
+
+    def handle_balancer(self, method):
+        if self.balancer is None:
+            return self.build_response("404 Not Found")
+        if method not in ("GET", "HEAD"):
+            return self.build_response("405 Method Not Allowed")
+        return self.respond_json(self.balancer.status(), head_only=method == "HEAD")
+
+    def proxy_request(self, method, path, headers, body, addr):
+        """Forward the request to a backend and relay its answer (streamed if it is large or unsized)."""
+        try:
+            backend, upstream = self.balancer.forward(method, path, headers, body, addr[0])
+        except UpstreamConnectError as e:
+            print(f"No backend could take {method} {path}: {e}")
+            self.metrics.inc("proxy_errors_total", (("reason", "connect"),))
+            return self.build_response("502 Bad Gateway", "No backend available\n")
+        except socket.timeout:
+            self.metrics.inc("proxy_errors_total", (("reason", "timeout"),))
+            return self.build_response("504 Gateway Timeout")
+        except Exception as e:
+            print(f"Error forwarding {method} {path}: {e}")
+            self.metrics.inc("proxy_errors_total", (("reason", "upstream"),))
+            return self.build_response("502 Bad Gateway")
+        self.metrics.inc("proxy_requests_total", (("backend", backend.name), ("status", str(upstream.status))))
+        status = f"{upstream.status} {upstream.reason}"
+        header_block = "".join(f"{name}: {value}\r\n" for name, value in response_headers(upstream)).encode("latin-1")
+        length = upstream.getheader("Content-Length")
+        if method != "HEAD" and upstream.status not in (204, 304) and (length is None or int(length) > PROXY_BUFFER_MAX):
+            long_lived = (upstream.getheader("Content-Type") or "").startswith("text/event-stream")
+            return StreamingResponse(status, header_block, read_chunks(upstream, backend), long_lived=long_lived)
+        try:
+            content = upstream.read()
+        except Exception as e:
+            backend.release(upstream.upstream_conn)
+            print(f"Error reading the answer of {backend.name}: {e}")
+            self.metrics.inc("proxy_errors_total", (("reason", "upstream"),))
+            return self.build_response("502 Bad Gateway")
+        backend.release(upstream.upstream_conn, reusable=not upstream.will_close)
+        return Response(status, header_block, (content,) if content else (), method == "HEAD")
+
+    def handle_replication(self, method):
+        if method not in ("GET", "HEAD"):
+            return self.build_response("405 Method Not Allowed")
+        if self.replicator is not None:
+            status = self.replicator.status()
+        else:
+            status = {"role": "primary", "epoch": self.feed.epoch, "seq": self.feed.current(None),
+                      "change_subscribers": self.change_subscribers}
+        return self.respond_json(status, head_only=method == "HEAD")
 
     def get_content_type(self, file_path):
         extension = file_path.split('.')[-1].lower()
@@ -148,101 +854,341 @@ class SimpleHTTPServer:
             'ogg': 'audio/ogg', 'mp4': 'video/mp4', 'avi': 'video/x-msvideo'
         }.get(extension, 'application/octet-stream')
 
+    def handle_file_listing(self, method):
+        if method not in ("GET", "HEAD"):
+            return self.build_response("405 Method Not Allowed")
+        if not self.index.active:
+            self.index.rescan()
+        return self.respond_json(self.index.listing(), head_only=method == "HEAD")
+
+    def handle_manifest(self, method):
+        """Every public file with its size, mtime and sha256, so clients can tell what changed without downloading."""
+        if method not in ("GET", "HEAD"):
+            return self.build_response("405 Method Not Allowed")
+        if not self.index.active:
+            self.index.rescan()
+        return self.respond_json(build_manifest(self.hashes, list(self.index.entries)), head_only=method == "HEAD")
+
+    def handle_archive(self, method, path, body):
+        """A tar of several files built while it is sent: GET /_archive?path=a&path=b or ?glob=*.txt,
+        or POST /_archive with {"paths": [...], "glob": "..."} when the list is too long for a URL."""
+        if method == "POST":
+            request = self.validate_json(body or b"{}")
+            if not isinstance(request, dict):
+                return self.build_response("400 Bad Request", "Expected a JSON object with paths and/or glob\n")
+            paths, pattern = request.get("paths", []), request.get("glob")
+            if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths) \
+                    or not isinstance(pattern, (str, type(None))):
+                return self.build_response("400 Bad Request", "paths must be a list of strings and glob a string\n")
+        elif method in ("GET", "HEAD"):
+            query = parse_qs(urlsplit(path).query)
+            paths, pattern = query.get("path", []), query.get("glob", [None])[0]
+        else:
+            return self.build_response("405 Method Not Allowed")
+        if not paths and not pattern:
+            return self.build_response("400 Bad Request", "Give the files with path=... and/or glob=...\n")
+        requested = []
+        for file_path in paths:
+            target = self.resolve_static(file_path.lstrip("/"))
+            if not target.allowed:
+                return self.build_response("403 Forbidden", f"{file_path}\n")
+            if target.info is None:
+                return self.build_response("404 Not Found", f"{file_path}\n")
+            requested.append(target.rel_path.replace(os.sep, "/"))
+        if pattern and not self.index.active:
+            self.index.rescan()
+        available = [rel_path.replace(os.sep, "/") for rel_path in list(self.index.entries)] if pattern else []
+        selected = [rel_path for rel_path in select_paths(available, requested, pattern)
+                    if self.check_file_access(rel_path)]
+        if not selected:
+            return self.build_response("404 Not Found", "No file matches\n")
+        if len(selected) > ARCHIVE_MAX_FILES:
+            return self.build_response("400 Bad Request", f"More than {ARCHIVE_MAX_FILES} files, narrow it down\n")
+        header_block = content_type_header(ARCHIVE_CONTENT_TYPE) + \
+            b'Content-Disposition: attachment; filename="archive.tar"\r\n'
+        response = StreamingResponse("200 OK", header_block, tar_stream(self.server_dir, selected))
+        return response.without_body() if method == "HEAD" else response
+
+    def parse_http_date(self, value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').timestamp()
+        except ValueError:
+            pass
+        try:
+            return parsedate_to_datetime(value).timestamp()
+        except (TypeError, ValueError):
+            return None
+
+    def file_etag(self, info):
+        return f'W/"{info.size:x}-{int(info.mtime * 1000000):x}"'
+
+    def is_not_modified(self, headers, info, etag):
+        if not headers:
+            return False
+        if 'If-None-Match' in headers:
+            candidates = [tag.strip().removeprefix('W/') for tag in headers['If-None-Match'].split(',')]
+            return '*' in candidates or etag.removeprefix('W/') in candidates
+        if 'If-Modified-Since' in headers:
+            client_time = self.parse_http_date(headers['If-Modified-Since'])
+            return client_time is not None and int(info.mtime) <= client_time
+        return False
+
+    def parse_range(self, value, size):
+        """Return (start, end) for a single 'bytes=' range, None to ignore it, or False if unsatisfiable."""
+        unit, _, spec = value.partition('=')
+        if unit.strip().lower() != 'bytes' or ',' in spec:
+            return None
+        first, sep, last = spec.strip().partition('-')
+        if not sep or not (first.isdigit() or last.isdigit()):
+            return None
+        if not first:
+            length = int(last)
+            return (max(0, size - length), size - 1) if length and size else False
+        start = int(first)
+        end = min(int(last), size - 1) if last.isdigit() else size - 1
+        return (start, end) if start < size and start <= end else False
+
+    def get_mapping(self, target):
+        """Shared read-only mapping of a large file, rebuilt when the file changes."""
+        cached = self.mmap_cache.get(target.rel_path)
+        if cached is not None and cached[0] == target.info:
+            self.metrics.inc("http_cache_requests_total", (("cache", "mmap"), ("result", "hit")))
+            return cached[1]
+        self.metrics.inc("http_cache_requests_total", (("cache", "mmap"), ("result", "miss")))
+        with open(target.full_path, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with self.mmap_lock:
+            self.mmap_cache[target.rel_path] = (target.info, mapping)
+        return mapping
+
+    def drop_mapping(self, rel_path):
+        # Not closed explicitly: requests still sending from it keep it alive
+        # through their memoryviews and it is unmapped once they finish.
+        with self.mmap_lock:
+            self.mmap_cache.pop(rel_path, None)
+
     def serve_static(self, file_path, headers=None):
         try:
-            if not self.check_file_access(file_path):
+            target = self.resolve_static(file_path)
+            if not target.allowed:
                 return self.build_response("403 Forbidden")
-            full_path = os.path.join(self.server_dir, os.path.normpath(file_path))
-            if not os.path.exists(full_path) or not os.path.isfile(full_path):
+            if target.info is None:
                 return self.build_response("404 Not Found")
-            if headers and 'If-Modified-Since' in headers:
-                file_mtime = datetime.fromtimestamp(os.path.getmtime(full_path))
-                try:
-                    client_time = datetime.strptime(headers['If-Modified-Since'], '%Y-%m-%d %H:%M:%S')
-                    if file_mtime <= client_time:
-                        return self.build_response("304 Not Modified", content="", content_length=0)
-                except ValueError:
-                    pass
-            with open(full_path, 'rb') as file:
-                content = file.read()
-            return self.build_response("200 OK", content, content_type=self.get_content_type(full_path))
+            digest = self.blobs.digest_for(target.rel_path, target.info.size, target.info.mtime) if self.blobs else None
+            etag = f'"{digest}"' if digest else self.file_etag(target.info)
+            validators = {"ETag": etag, "Last-Modified": formatdate(target.info.mtime, usegmt=True), "Accept-Ranges": "bytes"}
+            if self.is_not_modified(headers, target.info, etag):
+                return self.build_response("304 Not Modified", content="", content_length=0, extra_headers=validators)
+            size = target.info.size
+            byte_range = self.parse_range(headers['Range'], size) if headers and 'Range' in headers else None
+            if byte_range is False:
+                validators["Content-Range"] = f"bytes */{size}"
+                return self.build_response("416 Range Not Satisfiable", extra_headers=validators)
+            status = "200 OK"
+            start, end = 0, size - 1
+            if byte_range:
+                status = "206 Partial Content"
+                start, end = byte_range
+                validators["Content-Range"] = f"bytes {start}-{end}/{size}"
+            try:
+                if self.mmap_threshold is not None and size >= self.mmap_threshold:
+                    body = memoryview(self.get_mapping(target))[start:end + 1]
+                    return self.build_response(status, body, content_type=target.content_type, extra_headers=validators)
+                with open(target.full_path, 'rb') as file:
+                    file.seek(start)
+                    content = file.read(end - start + 1)
+            except FileNotFoundError:
+                self.file_changed(target.rel_path)
+                return self.build_response("404 Not Found")
+            return self.build_response(status, content, content_type=target.content_type, extra_headers=validators)
         except Exception as e:
             print(f"Error serving file: {e}")
             return self.build_response("500 Internal Server Error")
 
     def delete_file(self, file_path):
         try:
-            if not self.check_file_access(file_path):
+            if not self.resolve_static(file_path).allowed:
                 return self.build_response("403 Forbidden")
             full_path = os.path.join(self.server_dir, os.path.normpath(file_path))
-            if not os.path.exists(full_path):
-                return self.build_response("404 Not Found", "", content_type="text/plain")
-            os.remove(full_path)
+            with self.write_locks.hold(full_path):
+                if not os.path.exists(full_path):
+                    return self.build_response("404 Not Found", "", content_type="text/plain")
+                os.remove(full_path)
+                if self.blobs:
+                    self.blobs.forget(os.path.normpath(file_path))
+                self.file_changed(os.path.normpath(file_path))
             return self.build_response("200 OK", f"File {file_path} was successfully deleted", content_type="text/plain")
         except Exception as e:
             print(f"Error deleting file: {e}")
             return self.build_response("500 Internal Server Error")
 
-    def handle_put(self, file_path, headers, content):
+    def handle_put(self, file_path, headers, content, digest=None):
         try:
-            if not self.check_file_access(file_path):
+            if is_temp_name(os.path.basename(file_path)) or not self.resolve_static(file_path).allowed:
                 return self.build_response("403 Forbidden")
             full_path = os.path.join(self.server_dir, os.path.basename(file_path))
-            content_type = headers.get('Content-Type', '').lower()
-            ext = file_path.split('.')[-1].lower() if '.' in file_path else ''
-            is_binary = (
-                any(t in content_type for t in ['image/', 'audio/', 'video/', 'application/octet-stream']) or
-                ext in ['png', 'jpg', 'jpeg', 'gif', 'mp3', 'wav', 'mp4', 'avi']
-            )
-            mode = 'wb' if is_binary or isinstance(content, bytes) else 'w'
-            encoding = None if is_binary or isinstance(content, bytes) else 'utf-8'
-            with open(full_path, mode, encoding=encoding) as f:
-                if isinstance(content, bytes) or is_binary:
-                    f.write(content)
+            data = content if isinstance(content, bytes) else content.encode('utf-8')
+            with self.write_locks.hold(full_path):
+                was_existing = os.path.exists(full_path)
+                if self.blobs:
+                    self.blobs.store(full_path, os.path.basename(file_path), data, digest)
                 else:
-                    f.write(content.decode('utf-8'))
-            was_existing = os.path.exists(full_path)
+                    atomic_write(full_path, data, self.durability)
+                self.file_changed(os.path.basename(file_path))
             status = "200 OK" if was_existing else "201 Created"
             return self.build_response(status, f"File {file_path} was successfully {'updated' if was_existing else 'created'}", content_type="text/plain")
         except Exception as e:
             print(f"Error handling PUT request: {e}")
             return self.build_response("500 Internal Server Error")
 
-    def respond_json(self, data, head_only=False):
-        json_bytes = json.dumps(data, indent=4, ensure_ascii=False).encode("utf-8")
-        headers = (
-            "HTTP/1.1 200 OK\r\n"
-            "Content-Type: application/json; charset=utf-8\r\n"
-            f"Content-Length: {len(json_bytes)}\r\n"
-            "Connection: close\r\n\r\n"
-        )
-        return headers.encode() if head_only else headers.encode() + json_bytes
-
-    def build_response(self, status_code, content="", content_type="text/plain", content_length=None):
-        content_bytes = content.encode("utf-8") if isinstance(content, str) else content
-        actual_length = content_length if content_length is not None else len(content_bytes)
-        headers = (
-            f"HTTP/1.1 {status_code}\r\n"
-            f"Content-Type: {content_type}\r\n"
-            f"Content-Length: {actual_length}\r\n"
-            "Connection: close\r\n\r\n"
-        )
-        return headers.encode() + content_bytes
+    def start_upload(self, method, path, headers):
+        """Where a streamed request body goes: a chunk of a resumable upload, a FormUpload for a
+        multipart/form-data PUT/POST of files, or None if the body is read into memory as usual."""
+        if self.balancer is not None:
+            return None
+        if method == "PUT" and path.startswith(UPLOADS_PATH + "/"):
+            try:
+                return self.uploads.begin_chunk(path[len(UPLOADS_PATH) + 1:], headers.get("Content-Range"),
+                                                int(headers.get("Content-Length", 0)))
+            except UploadError as e:
+                return RejectedChunk(e)
+        if method not in ("PUT", "POST") or path in SPECIAL_ROUTES or path.startswith("/resources"):
+            return None
+        boundary = parse_boundary(headers.get("Content-Type"))
+        if boundary is None:
+            return None
+        return FormUpload(boundary, lambda upload, part: self.open_upload(path, upload, part),
+                          hash_files=self.blobs is not None)
 
-    def read_json_file(self, path):
+    def open_upload(self, path, upload, part):
+        """Where a file part is stored: under its own filename when path ends in "/", otherwise at path."""
+        if path.endswith("/"):
+            name = os.path.basename(part.filename.replace("\\", "/"))
+        elif upload.files:
+            raise MultipartError(f"{path} is a single file: send several files to a path ending in /")
+        else:
+            name = os.path.basename(path)
+        if not name or is_temp_name(name) or not self.resolve_static(name).allowed \
+                or not self.check_file_access(path.lstrip("/")):
+            raise PermissionError(f"Forbidden file name {name!r}")
+        return name, AtomicFile(os.path.join(self.server_dir, name), self.durability)
+
+    def finish_upload(self, upload):
+        """Put the files of a multipart upload in place, only once the whole body has arrived intact."""
+        error = upload.finish()
+        if isinstance(error, PermissionError):
+            return self.build_response("403 Forbidden", f"{error}\n")
+        if error is not None:
+            print(f"Rejected multipart upload: {error}")
+            return self.build_response("400 Bad Request", f"{error}\n")
+        if not upload.files:
+            return self.build_response("400 Bad Request", "No file in the form\n")
+        stored = []
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return {}
+            for file in upload.files:
+                full_path = os.path.join(self.server_dir, file.target)
+                with self.write_locks.hold(full_path):
+                    was_existing = os.path.exists(full_path)
+                    if self.blobs:
+                        self.blobs.store_file(full_path, file.target, file.pending, file.hasher.hexdigest())
+                    else:
+                        file.pending.commit()
+                    self.file_changed(file.target)
+                stored.append({"field": file.part.name, "file": file.target, "size": file.size,
+                               "status": "updated" if was_existing else "created"})
+        except Exception as e:
+            print(f"Error storing multipart upload: {e}")
+            return self.build_response("500 Internal Server Error")
+        created = any(item["status"] == "created" for item in stored)
+        return self.respond_json({"files": stored, "fields": upload.fields}, status="201 Created" if created else "200 OK")
 
-    def write_json_file(self, path, data):
+    def handle_uploads(self, method, path, body, chunk):
+        """POST /_uploads starts a resumable upload; PUT/HEAD/GET/DELETE /_uploads/{id} work on one."""
+        upload_id = path[len(UPLOADS_PATH) + 1:]
+        if not upload_id:
+            if method != "POST":
+                return self.build_response("405 Method Not Allowed")
+            return self.create_upload(body)
+        if method == "PUT":
+            return self.receive_chunk(chunk)
+        if method in ("GET", "HEAD"):
+            info = self.uploads.info(upload_id)
+            if info is None:
+                return self.build_response("404 Not Found")
+            response = self.respond_json(info, head_only=method == "HEAD")
+            return response.with_headers(self.upload_offset_headers(info["offset"], info["size"]))
+        if method == "DELETE":
+            try:
+                removed = self.uploads.remove(upload_id)
+            except UploadError as e:
+                return self.build_response(e.status, f"{e}\n")
+            if not removed:
+                return self.build_response("404 Not Found")
+            return self.build_response("200 OK", f"Upload {upload_id} cancelled")
+        return self.build_response("405 Method Not Allowed")
+
+    def upload_offset_headers(self, offset, size=None):
+        """Upload-Offset (bytes the server has), plus Upload-Length if known, as encoded header lines."""
+        lines = f"Upload-Offset: {offset}\r\n"
+        if size is not None:
+            lines += f"Upload-Length: {size}\r\n"
+        return lines.encode()
+
+    def create_upload(self, body):
+        request = self.validate_json(body)
+        if not isinstance(request, dict) or not isinstance(request.get("target"), str):
+            return self.build_response("400 Bad Request", 'Expected {"target": "/name", "size": bytes}\n')
+        size = request.get("size")
+        if size is not None and (not isinstance(size, int) or size < 0):
+            return self.build_response("400 Bad Request", "Invalid size\n")
+        if size == 0:
+            return self.build_response("400 Bad Request", "Nothing to resume in an empty file: use a plain PUT\n")
+        target = request["target"].lstrip("/")
+        name = os.path.basename(target)
+        if not name or is_temp_name(name) or not self.resolve_static(target).allowed:
+            return self.build_response("403 Forbidden")
+        info = self.uploads.create(name, size)
+        location = f"{UPLOADS_PATH}/{info['id']}"
+        return self.respond_json(dict(info, location=location), status="201 Created").with_headers(
+            f"Location: {location}\r\n".encode() + self.upload_offset_headers(0, size))
+
+    def receive_chunk(self, chunk):
+        if chunk.error is not None:
+            response = self.build_response(chunk.error.status, f"{chunk.error}\n")
+            if chunk.error.offset is not None:
+                response = response.with_headers(self.upload_offset_headers(chunk.error.offset))
+            return response
+        if not chunk.complete:
+            chunk.close()
+            return self.build_response("204 No Content").with_headers(self.upload_offset_headers(chunk.offset, chunk.meta["size"]))
+        name = chunk.meta["target"]
+        full_path = os.path.join(self.server_dir, name)
         try:
-            os.makedirs(os.path.dirname(path), exist_ok=True)
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
+            with self.write_locks.hold(full_path):
+                was_existing = os.path.exists(full_path)
+                if self.blobs:
+                    chunk.pending.sync()
+                    with open(chunk.pending.tmp_path, "rb") as f:
+                        digest = hashlib.file_digest(f, "sha256").hexdigest()
+                    self.blobs.store_file(full_path, name, chunk.pending, digest)
+                else:
+                    chunk.pending.commit(full_path)
+                self.file_changed(name)
+            chunk.committed()
         except Exception as e:
-            print("Error writing JSON:", e)
+            print(f"Error committing upload {chunk.upload_id}: {e}")
+            # The part file is kept, so the upload is still there to retry or cancel.
+            return self.build_response("500 Internal Server Error").with_headers(
+                self.upload_offset_headers(chunk.offset, chunk.meta["size"]))
+        result = {"file": name, "size": chunk.offset, "status": "updated" if was_existing else "created"}
+        return self.respond_json(result, status="200 OK" if was_existing else "201 Created")
+
+    def respond_json(self, data, head_only=False, status="200 OK"):
+        json_bytes = json.dumps(data, indent=4, ensure_ascii=False).encode("utf-8")
+        return Response.build(status, json_bytes, "application/json; charset=utf-8", head_only=head_only)
+
+    def build_response(self, status_code, content="", content_type="text/plain", content_length=None, extra_headers=None):
+        return Response.build(status_code, content, content_type, content_length, extra_headers)
 
     def validate_json(self, body):
         try:
@@ -251,108 +1197,275 @@ class SimpleHTTPServer:
             return None
 
     def find_by_id(self, items, resource_id):
-        return next((obj for obj in items if str(obj.get("id")) == str(resource_id)), None)
+        return find_by_id(items, resource_id)
 
     def handle_resources(self, method, path, body, headers):
-        res_file = os.path.join(self.server_dir, "private", "resources.json")
-        resources_data = self.read_json_file(res_file)
         segments = [s for s in path.strip("/").split("/") if s]
+        category = segments[1] if len(segments) > 1 else None
+        if self.replicator is not None:
+            if method in ("POST", "PUT", "DELETE"):
+                return self.forward_write(method, path, body, headers)
+            if not self.replicator.synced.is_set():
+                return self.build_response("503 Service Unavailable", "Replica not synchronised yet\n",
+                                           extra_headers={"Retry-After": "1"})
+        if len(segments) == 2 and category == CHANGES_SEGMENT:
+            return self.handle_changes(method, None, headers)
+        if len(segments) == 3 and segments[2] == CHANGES_SEGMENT:
+            return self.handle_changes(method, category, headers)
+        if method in ("POST", "PUT", "DELETE") and category is not None:
+            # One writer per category, so change events are numbered in the order the changes were applied.
+            with self.write_locks.hold(f"resources/{category}"):
+                return self.dispatch_resources(method, segments, body)
+        cache = self.resource_cache
+        if cache is None:
+            return self.dispatch_resources(method, segments, body)
+        if method in ("GET", "HEAD"):
+            response = cache.get(path)
+            self.metrics.inc("http_cache_requests_total", (("cache", "resources"), ("result", "miss" if response is None else "hit")))
+            if response is None:
+                generation = cache.generation(category)
+                response = self.dispatch_resources("GET", segments, body)
+                if response.status_code == 200:
+                    response = cache.put(path, category, response, generation)
+            return self.head_only(response) if method == "HEAD" else response
+        return self.dispatch_resources(method, segments, body)
+
+    def forward_write(self, method, path, body, headers):
+        """On a replica, hand a /resources write to the primary: redirect the client there or proxy it."""
+        if self.replica_writes == "redirect":
+            return self.build_response("307 Temporary Redirect",
+                                       extra_headers={"Location": self.replicator.primary_url + path})
+        try:
+            status, content_type, content = self.replicator.forward(
+                method, path, body, headers.get("Content-Type") if headers else None)
+        except Exception as e:
+            print(f"Error forwarding {method} {path} to {self.replicator.primary_url}: {e}")
+            return self.build_response("502 Bad Gateway")
+        return self.build_response(status, content, content_type)
+
+    def record_change(self, category, kind, resource_id=None, data=None):
+        """Called after a change is stored: drop the cached responses, then tell the change streams."""
+        if self.resource_cache is not None:
+            self.resource_cache.invalidate(category)
+        self.feed.publish(category, kind, resource_id, data)
+
+    def handle_changes(self, method, category, headers):
+        """Change stream of one category, or of all of them (the replication stream) if category is None."""
+        if method not in ("GET", "HEAD"):
+            return self.build_response("405 Method Not Allowed")
+        if category is not None and not self.resources.has_category(category):
+            return self.build_response("404 Not Found")
+        if method == "GET" and self.max_subscribers and self.change_subscribers >= self.max_subscribers:
+            return self.build_response("503 Service Unavailable", "Too many change streams open, try again later\n",
+                                       extra_headers={"Retry-After": str(SSE_RETRY_MS // 1000)})
+        last_seq = self.feed.parse_event_id(headers.get("Last-Event-ID")) if headers else None
+        header_block = content_type_header("text/event-stream; charset=utf-8") + b"Cache-Control: no-cache\r\n"
+        response = StreamingResponse("200 OK", header_block, self.change_stream(category, last_seq), long_lived=True)
+        return response.without_body() if method == "HEAD" else response
+
+    def change_snapshot(self, category):
+        """A reset event with the whole category, taken so no change can slip in between.
+
+        The snapshot of everything (category None) takes no lock: the
+        sequence number is read first, so changes made while dumping may
+        already be in the data and are replayed afterwards, which leaves
+        the same result.
+        """
+        if category is None:
+            seq = self.feed.current(None)
+            items = self.resources.dump()
+        else:
+            with self.write_locks.hold(f"resources/{category}"):
+                seq = self.feed.current(category)
+                items = self.resources.get_category(category)
+        return seq, format_event(self.feed.event_id(seq), "reset",
+                                 {"seq": seq, "category": category, "id": None, "data": items})
+
+    def change_stream(self, category, last_seq):
+        """Yield SSE messages for category: the changes after last_seq, or a snapshot first if they are not available."""
+        with self.change_subscribers_lock:
+            self.change_subscribers += 1
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n".encode()
+            if last_seq is None or self.feed.since(category, last_seq) is None:
+                last_seq, message = self.change_snapshot(category)
+                yield message
+            heartbeat = SSE_HEARTBEAT if category is not None else REPLICATION_HEARTBEAT
+            idle_since = time.monotonic()
+            while not self.stopping.is_set():
+                events = self.feed.wait(category, last_seq, ACCEPT_POLL)
+                if events is None:
+                    # The subscriber fell behind the ring buffer: start it over from a snapshot.
+                    last_seq, message = self.change_snapshot(category)
+                    yield message
+                elif events:
+                    for event in events:
+                        yield format_event(self.feed.event_id(event.seq), event.kind, event.to_dict())
+                    last_seq = events[-1].seq
+                elif time.monotonic() - idle_since < heartbeat:
+                    continue
+                else:
+                    yield format_event(None, "heartbeat", {"seq": last_seq})
+                idle_since = time.monotonic()
+        finally:
+            with self.change_subscribers_lock:
+                self.change_subscribers -= 1
+
+    def dispatch_resources(self, method, segments, body):
         if len(segments) == 1:
-            return self.handle_resources_root(method, resources_data, res_file, body)
+            return self.handle_resources_root(method)
         elif len(segments) == 2:
-            return self.handle_resources_category(method, resources_data, res_file, segments[1], body)
+            return self.handle_resources_category(method, segments[1], body)
         elif len(segments) == 3:
-            return self.handle_resources_item(method, resources_data, res_file, segments[1], segments[2], body)
+            return self.handle_resources_item(method, segments[1], segments[2], body)
         else:
             return self.build_response("400 Bad Request")
 
-    def handle_resources_root(self, method, resources_data, res_file, body):
+    def handle_resources_root(self, method):
         if method == "GET":
-            return self.respond_json(resources_data)
+            return self.respond_json(self.resources.dump())
         elif method == "HEAD":
-            return self.respond_json(resources_data, head_only=True)
+            return self.respond_json(self.resources.dump(), head_only=True)
         else:
             return self.build_response("405 Method Not Allowed")
 
-    def handle_resources_category(self, method, resources_data, res_file, category, body):
-        if category not in resources_data:
-            if method == "POST":
-                resources_data[category] = []
-            else:
+    def handle_resources_category(self, method, category, body):
+        if method in ("GET", "HEAD"):
+            category_data = self.resources.get_category(category)
+            if category_data is None:
                 return self.build_response("404 Not Found")
-        category_data = resources_data.get(category, [])
-        if method == "GET":
-            return self.respond_json(category_data)
-        elif method == "HEAD":
-            return self.respond_json(category_data, head_only=True)
+            return self.respond_json(category_data, head_only=method == "HEAD")
         elif method == "POST":
             new_obj = self.validate_json(body)
             if new_obj is None:
                 return self.build_response("400 Bad Request")
-            new_id = self.get_next_id(category_data)
-            ordered_obj = {"id": new_id}
-            ordered_obj.update(new_obj)
-            category_data.append(ordered_obj)
-            resources_data[category] = category_data
-            self.write_json_file(res_file, resources_data)
+            item = self.resources.add_item(category, new_obj, create=True)
+            self.record_change(category, "create", item.get("id"), item)
             return self.build_response("201 Created")
         elif method == "PUT":
+            if not self.resources.has_category(category):
+                return self.build_response("404 Not Found")
             new_data = self.validate_json(body)
             if new_data is None:
                 return self.build_response("400 Bad Request")
             if isinstance(new_data, list):
-                resources_data[category] = new_data
+                self.resources.replace_category(category, new_data)
+                self.record_change(category, "replace", None, new_data)
             else:
-                new_id = self.get_next_id(category_data)
-                ordered_obj = {"id": new_id}
-                ordered_obj.update(new_data)
-                category_data.append(ordered_obj)
-                resources_data[category] = category_data
-            self.write_json_file(res_file, resources_data)
+                item = self.resources.add_item(category, new_data)
+                if item is None:
+                    return self.build_response("404 Not Found")
+                self.record_change(category, "create", item.get("id"), item)
             return self.build_response("200 OK")
+        elif not self.resources.has_category(category):
+            return self.build_response("404 Not Found")
         else:
             return self.build_response("405 Method Not Allowed")
 
-    def handle_resources_item(self, method, resources_data, res_file, category, resource_id, body):
-        category_data = resources_data.get(category, [])
-        found = self.find_by_id(category_data, resource_id)
-        if method == "HEAD":
-            return self.respond_json(found, head_only=True) if found else self.build_response("404 Not Found")
-        elif method == "GET":
-            return self.respond_json(found) if found else self.build_response("404 Not Found")
+    def handle_resources_item(self, method, category, resource_id, body):
+        if method in ("GET", "HEAD"):
+            found = self.resources.get_item(category, resource_id)
+            if not found:
+                return self.build_response("404 Not Found")
+            return self.respond_json(found, head_only=method == "HEAD")
         elif method == "PUT":
             new_obj = self.validate_json(body)
-            if new_obj is None or not found:
-                return self.build_response("400 Bad Request" if new_obj is None else "404 Not Found")
-            idx = category_data.index(found)
-            ordered_obj = {"id": found["id"]}
-            ordered_obj.update(new_obj)
-            category_data[idx] = ordered_obj
-            resources_data[category] = category_data
-            self.write_json_file(res_file, resources_data)
+            if new_obj is None:
+                return self.build_response("400 Bad Request")
+            item = self.resources.update_item(category, resource_id, new_obj)
+            if item is None:
+                return self.build_response("404 Not Found")
+            self.record_change(category, "update", item.get("id"), item)
             return self.build_response("200 OK")
         elif method == "DELETE":
-            if not found:
+            deleted = self.resources.delete_item(category, resource_id)
+            if deleted is None:
                 return self.build_response("404 Not Found")
-            category_data.remove(found)
-            resources_data[category] = category_data
-            self.write_json_file(res_file, resources_data)
+            self.record_change(category, "delete", deleted.get("id"))
             return self.build_response("200 OK")
         else:
             return self.build_response("405 Method Not Allowed")
 
     def get_next_id(self, items):
-        return max([obj.get("id", 0) for obj in items] or [0]) + 1
+        return next_id(items)
 
 if __name__ == "__main__":
-    try:
-        port_input = input("Put the port to start the server (default 8080): ").strip()
-        port = int(port_input) if port_input else 8080
-    except ValueError:
-        print("Not valid port, port 8080 will be used")
-        port = 8080
-    except KeyboardInterrupt:
-        print("\nExecution canceled by the user.")
-        exit()
-    server = SimpleHTTPServer(port=port)
+    parser = argparse.ArgumentParser(description="Simple HTTP server")
+    parser.add_argument("--port", type=int, help="port to listen on (asked interactively if omitted)")
+    parser.add_argument("--profile", action="store_true",
+                        help="record per-phase timings and allow cProfile captures via SIGUSR2 or /_profile")
+    parser.add_argument("--dedup", action="store_true",
+                        help="store uploads once per content hash under Server/private/blobs")
+    parser.add_argument("--store", choices=STORE_BACKENDS, default="json",
+                        help="where /resources is kept: resources.json or an SQLite database (default: json)")
+    parser.add_argument("--cache-ttl", type=float, default=RESOURCE_CACHE_TTL,
+                        help="seconds GET /resources responses are cached (0 disables; default: %(default)s)")
+    parser.add_argument("--rate-limit", action="append", default=[], metavar="CLASS=RATE[/BURST]",
+                        help="per-IP limit for a route class (%s), e.g. write=5/20; repeatable" % "/".join(ROUTE_CLASSES))
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT,
+                        help="requests served at once before answering 503 (0 = unlimited; default: %(default)s)")
+    parser.add_argument("--max-subscribers", type=int, default=MAX_SUBSCRIBERS,
+                        help="change streams open at once before answering 503 (0 = unlimited; default: %(default)s)")
+    parser.add_argument("--max-streamed-body", type=int, default=MAX_STREAMED_BODY_BYTES, metavar="BYTES",
+                        help="largest multipart upload or resumable chunk, written to disk as it arrives "
+                             "(other bodies are read into memory and limited to 64 MiB; default: %(default)s)")
+    parser.add_argument("--header-timeout", type=float, default=HEADER_TIMEOUT,
+                        help="seconds to receive the request headers (0 = no limit; default: %(default)s)")
+    parser.add_argument("--body-min-rate", type=float, default=BODY_MIN_RATE,
+                        help=f"minimum upload rate in bytes/s after a {BODY_GRACE:g}s grace period (0 = no limit; default: %(default)s)")
+    parser.add_argument("--send-timeout", type=float, default=SEND_TIMEOUT,
+                        help="seconds the client has to read each 256 KiB of the response (0 = no limit; default: %(default)s)")
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT,
+                        help="seconds in-flight requests get to finish on SIGTERM/SIGHUP (default: %(default)s)")
+    parser.add_argument("--keepalive-timeout", type=float, default=KEEPALIVE_TIMEOUT,
+                        help="seconds an idle persistent connection stays open (0 closes after every response; default: %(default)s)")
+    parser.add_argument("--durability", choices=DURABILITY_POLICIES, default=DURABILITY_FILE,
+                        help="fsync policy for uploads and resources.json (default: file)")
+    parser.add_argument("--replica-of", metavar="URL",
+                        help="run as a read replica of the server at URL (e.g. http://localhost:8080)")
+    parser.add_argument("--replica-writes", choices=REPLICA_WRITE_MODES, default="redirect",
+                        help="what a replica does with /resources writes: redirect them to the primary or proxy them (default: redirect)")
+    parser.add_argument("--backend", action="append", default=[], metavar="HOST:PORT",
+                        help="act as a reverse proxy / load balancer for this server instead of serving Server/; repeatable")
+    parser.add_argument("--balance", choices=BALANCE_STRATEGIES, default="round-robin",
+                        help="how a backend is picked: in turn, the least busy one or by a consistent hash of the path (default: round-robin)")
+    args = parser.parse_args()
+    rate_limits = {}
+    for spec in args.rate_limit:
+        try:
+            route_class, rate, burst = parse_limit(spec)
+        except ValueError as e:
+            parser.error(str(e))
+        if route_class not in ROUTE_CLASSES:
+            parser.error(f"Unknown route class {route_class!r} (expected one of {', '.join(ROUTE_CLASSES)})")
+        rate_limits[route_class] = (rate, burst)
+    for spec in args.backend:
+        try:
+            parse_backend(spec)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.replica_of:
+        try:
+            parse_primary(args.replica_of)
+        except ValueError as e:
+            parser.error(str(e))
+    port = args.port
+    if port is None and LISTEN_FD_ENV not in os.environ:
+        try:
+            port_input = input("Put the port to start the server (default 8080): ").strip()
+            port = int(port_input) if port_input else 8080
+        except ValueError:
+            print("Not valid port, port 8080 will be used")
+            port = 8080
+        except KeyboardInterrupt:
+            print("\nExecution canceled by the user.")
+            exit()
+    server = SimpleHTTPServer(port=port, profiling=args.profile, durability=args.durability, dedup=args.dedup,
+                              store=args.store, resource_cache_ttl=args.cache_ttl,
+                              rate_limits=rate_limits, max_in_flight=args.max_in_flight,
+                              max_subscribers=args.max_subscribers, max_streamed_body=args.max_streamed_body,
+                              header_timeout=args.header_timeout, body_min_rate=args.body_min_rate,
+                              send_timeout=args.send_timeout, drain_timeout=args.drain_timeout,
+                              keepalive_timeout=args.keepalive_timeout, replica_of=args.replica_of,
+                              replica_writes=args.replica_writes, backends=args.backend, balance=args.balance)
     server.start()
\ No newline at end of file
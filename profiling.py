@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Instrumentación opcional del servidor: tiempos por fase de cada petición
+    y capturas de cProfile bajo demanda, guardadas en Server/private/ para
+    analizarlas después con pstats o snakeviz.
+"""
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+from datetime import datetime
+
+PHASES = ("accept_wait", "read_headers", "read_body", "log", "route", "handler", "send")
+
+
+class PhaseTimer:
+    def __init__(self, started=None):
+        self.last = started if started is not None else time.perf_counter()
+        self.phases = {}
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - self.last)
+        self.last = now
+
+
+class NullTimer:
+    phases = {}
+
+    def mark(self, phase):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class PhaseLog:
+    """Appends one JSON line of phase timings per request."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def write(self, method, route, status, phases):
+        record = {
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "method": method,
+            "route": route,
+            "status": status,
+            "phases_ms": {k: round(v * 1000, 3) for k, v in phases.items()},
+        }
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+class ProfileCapture:
+    """cProfile capture that can be switched on and off while the server runs.
+
+    Since Python 3.12 only one cProfile profiler can be enabled in the whole
+    process at a time, so requests are profiled one after another: a
+    request that arrives while another one is being profiled runs without
+    a profiler instead of failing. The results are merged and written out
+    when the capture stops.
+    """
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.active = False
+        self.started = None
+        self.stats = None
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.profiling = threading.Lock()  # held while a profiler is enabled
+
+    def start(self):
+        with self.lock:
+            if not self.active:
+                self.active = True
+                self.started = datetime.now()
+                self.stats = None
+                self.requests = 0
+        return self.status()
+
+    def stop(self):
+        with self.lock:
+            if not self.active:
+                return None
+            self.active = False
+            stats, self.stats = self.stats, None
+            name = f"profile-{self.started.strftime('%Y%m%d-%H%M%S')}.prof"
+        path = os.path.join(self.out_dir, name)
+        if stats is None:
+            return None
+        stats.dump_stats(path)
+        return path
+
+    def toggle(self):
+        if self.active:
+            path = self.stop()
+            print(f"Profiling stopped, profile written to {path}" if path else "Profiling stopped, no requests captured")
+        else:
+            self.start()
+            print("Profiling started")
+
+    def status(self):
+        return {
+            "active": self.active,
+            "started": self.started.isoformat(timespec="seconds") if self.started else None,
+            "requests": self.requests,
+        }
+
+    def run(self, func, *args):
+        """func(*args), under a profiler if a capture is active and no other request holds the profiler."""
+        if not self.active or not self.profiling.acquire(blocking=False):
+            return func(*args)
+        try:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiling tool (a debugger, coverage...) owns the hooks.
+                return func(*args)
+            try:
+                return func(*args)
+            finally:
+                profile.disable()
+                self.collect(profile)
+        finally:
+            self.profiling.release()
+
+    def collect(self, profile):
+        with self.lock:
+            if not self.active:
+                return
+            try:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+            except TypeError:
+                return  # nothing was recorded
+            self.requests += 1
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Réplicas de solo lectura de /resources. Un nServer arrancado con
+    --replica-of http://HOST:PUERTO sigue el registro global de cambios del
+    primario (/resources/_changes, Server-Sent Events), aplica cada evento a
+    un MemoryResourceStore local y atiende las lecturas desde él. Las
+    escrituras se redirigen al primario (307) o se le reenvían. El estado de
+    la replicación (secuencia aplicada y retraso) se publica en /_replication
+    y en /_metrics.
+
+How to execute:
+    python3 nServer.py --port 8080
+    python3 nServer.py --port 8081 --replica-of http://localhost:8080
+    curl http://localhost:8081/_replication
+"""
+import http.client
+import json
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+from changefeed import parse_events
+
+REPLICATION_PATH = "/resources/_changes"
+READ_TIMEOUT = 10.0    # a stream silent for this long (heartbeats included) is considered dead
+RECONNECT_MIN = 0.5    # first wait before reconnecting, doubled on each failure
+RECONNECT_MAX = 10.0
+FORWARD_TIMEOUT = 30.0
+
+
+def parse_primary(url):
+    """(host, port, base URL) from 'http://HOST:PORT' (or just 'HOST:PORT')."""
+    parts = urlsplit(url if "://" in url else "http://" + url)
+    if parts.scheme != "http" or not parts.hostname:
+        raise ValueError(f"Invalid primary URL {url!r}, expected http://HOST:PORT")
+    return parts.hostname, parts.port or 80, f"http://{parts.netloc}"
+
+
+class Replicator:
+    """Follows the primary's change log and applies it to a local store.
+
+    Every change is applied under lock(category) and then reported to
+    on_change(category, kind, resource_id, data), the same way the primary
+    records its own writes, so the replica's cache and change streams stay
+    consistent with what it serves. Events only ever set state (an item,
+    a whole category, an absence), so replaying one that the initial
+    snapshot already reflects is harmless.
+
+    The lag is the time since the replica last knew it had applied
+    everything the primary had published: the primary sends a heartbeat
+    with its current sequence number when the stream is idle, so a
+    healthy replica stays below the heartbeat interval.
+    """
+
+    def __init__(self, primary_url, store, on_change, lock):
+        self.host, self.port, self.primary_url = parse_primary(primary_url)
+        self.store = store
+        self.on_change = on_change
+        self.lock = lock
+        self.last_event_id = None
+        self.applied_seq = 0
+        self.primary_seq = 0
+        self.caught_up_at = None
+        self.events_applied = 0
+        self.reconnects = 0
+        self.connected = False
+        self.synced = threading.Event()
+        self.stopping = threading.Event()
+        self.sock = None
+
+    def start(self):
+        threading.Thread(target=self.run, name="replicator", daemon=True).start()
+
+    def stop(self):
+        self.stopping.set()
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def run(self):
+        delay = RECONNECT_MIN
+        while not self.stopping.is_set():
+            try:
+                if self.follow():
+                    delay = RECONNECT_MIN
+            except (OSError, ValueError, http.client.HTTPException) as e:
+                if not self.stopping.is_set():
+                    print(f"Replication from {self.primary_url} interrupted: {e}")
+            self.connected = False
+            if self.stopping.wait(delay):
+                break
+            delay = min(delay * 2, RECONNECT_MAX)
+            self.reconnects += 1
+
+    def follow(self):
+        """Read the change stream until it ends. Returns True if at least one event was received."""
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=READ_TIMEOUT)
+        received = False
+        try:
+            headers = {"Accept": "text/event-stream"}
+            if self.last_event_id:
+                headers["Last-Event-ID"] = self.last_event_id
+            conn.request("GET", REPLICATION_PATH, headers=headers)
+            self.sock = conn.sock
+            response = conn.getresponse()
+            if response.status != 200:
+                raise http.client.HTTPException(f"primary answered {response.status} {response.reason}")
+            self.connected = True
+            lines = (line.decode("utf-8") for line in iter(response.readline, b""))
+            for event_id, kind, data in parse_events(lines):
+                if self.stopping.is_set():
+                    break
+                self.handle(kind, json.loads(data))
+                self.last_event_id = event_id
+                received = True
+        finally:
+            self.sock = None
+            conn.close()
+        return received
+
+    def handle(self, kind, payload):
+        seq = payload["seq"]
+        if kind == "heartbeat":
+            self.primary_seq = seq
+        else:
+            if kind == "reset":
+                self.apply_reset(payload["data"])
+                self.primary_seq = seq
+            else:
+                self.apply(kind, payload["category"], payload["id"], payload["data"])
+                self.primary_seq = max(self.primary_seq, seq)
+            self.applied_seq = seq
+            self.events_applied += 1
+        if self.applied_seq >= self.primary_seq:
+            self.caught_up_at = time.monotonic()
+
+    def apply_reset(self, data):
+        """Replace everything with a snapshot (first connection, primary restart or a gap in the stream)."""
+        stale = set(self.store.dump()) - set(data)
+        self.store.load(data)
+        for category in list(data) + sorted(stale):
+            with self.lock(category):
+                self.on_change(category, "replace", None, data.get(category, []))
+        self.synced.set()
+
+    def apply(self, kind, category, resource_id, data):
+        with self.lock(category):
+            if kind in ("create", "update"):
+                self.store.put_item(category, data)
+            elif kind == "delete":
+                self.store.delete_item(category, resource_id)
+            elif kind == "replace":
+                self.store.replace_category(category, data)
+            else:
+                return
+            self.on_change(category, kind, resource_id, data)
+
+    def lag(self):
+        """Seconds since the replica was last known to be up to date, or None before the first sync."""
+        return None if self.caught_up_at is None else time.monotonic() - self.caught_up_at
+
+    def status(self):
+        lag = self.lag()
+        return {
+            "role": "replica",
+            "primary": self.primary_url,
+            "connected": self.connected,
+            "synced": self.synced.is_set(),
+            "applied_seq": self.applied_seq,
+            "primary_seq": self.primary_seq,
+            "seq_lag": max(0, self.primary_seq - self.applied_seq),
+            "lag_seconds": None if lag is None else round(lag, 3),
+            "events_applied": self.events_applied,
+            "reconnects": self.reconnects,
+        }
+
+    def forward(self, method, path, body, content_type=None):
+        """Send a write to the primary and return its (status, content type, body)."""
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=FORWARD_TIMEOUT)
+        try:
+            headers = {"Content-Type": content_type} if content_type else {}
+            conn.request(method, path, body=body or None, headers=headers)
+            response = conn.getresponse()
+            content = response.read()
+            return (f"{response.status} {response.reason}",
+                    response.getheader("Content-Type", "text/plain"), content)
+        finally:
+            conn.close()
@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Almacenes para los recursos de /resources. JSONResourceStore guarda todo
+    en Server/private/resources.json (el formato de siempre); SQLiteResourceStore
+    guarda cada elemento como una fila de una tabla de documentos en SQLite
+    (modo WAL, índices por categoría e id), de modo que crear, modificar o
+    borrar un elemento no obliga a reescribir todas las categorías.
+    MemoryResourceStore lo mantiene solo en memoria (lo usan las réplicas).
+
+How to execute:
+    Importar resources.json a la base de datos, o exportarla de vuelta:
+        python3 resource_store.py import
+        python3 resource_store.py export --json copia.json --db Server/private/resources.db
+"""
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from storage import DURABILITY_FILE, DURABILITY_FULL, DURABILITY_NONE, atomic_write
+
+STORE_BACKENDS = ("json", "sqlite")
+DEFAULT_DIR = os.path.join("Server", "private")
+
+
+def find_by_id(items, resource_id):
+    return next((obj for obj in items if str(obj.get("id")) == str(resource_id)), None)
+
+
+def next_id(items):
+    return max([obj.get("id", 0) for obj in items] or [0]) + 1
+
+
+class ResourceStore:
+    """Interface used by the /resources handlers.
+
+    Categories keep their creation order and items their insertion order.
+    Items are matched by str(item["id"]); add_item() gives new items the
+    next integer id of their category. Each method is atomic on its own.
+    """
+
+    def dump(self):
+        """All categories as {name: [items]}."""
+        raise NotImplementedError
+
+    def load(self, data):
+        """Replace every category with the contents of data ({name: [items]})."""
+        raise NotImplementedError
+
+    def has_category(self, category):
+        raise NotImplementedError
+
+    def get_category(self, category):
+        """Items of category, or None if it does not exist."""
+        raise NotImplementedError
+
+    def replace_category(self, category, items):
+        raise NotImplementedError
+
+    def add_item(self, category, obj, create=False):
+        """Append obj with a new id and return the stored item, or None if the category is missing."""
+        raise NotImplementedError
+
+    def get_item(self, category, resource_id):
+        raise NotImplementedError
+
+    def update_item(self, category, resource_id, obj):
+        """Replace the item keeping its id; return the stored item, or None if it does not exist."""
+        raise NotImplementedError
+
+    def delete_item(self, category, resource_id):
+        """Return the deleted item, or None if it did not exist."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JSONResourceStore(ResourceStore):
+    """The whole document in one JSON file, rewritten atomically on every change."""
+
+    def __init__(self, path, durability=DURABILITY_FILE):
+        self.path = path
+        self.durability = durability
+        # Held across read-modify-write so concurrent changes are not lost.
+        self.lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _write(self, data):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        encoded = json.dumps(data, indent=4, ensure_ascii=False).encode("utf-8")
+        atomic_write(self.path, encoded, self.durability)
+
+    def dump(self):
+        return self._read()
+
+    def load(self, data):
+        with self.lock:
+            self._write(data)
+
+    def has_category(self, category):
+        return category in self._read()
+
+    def get_category(self, category):
+        return self._read().get(category)
+
+    def replace_category(self, category, items):
+        with self.lock:
+            data = self._read()
+            data[category] = items
+            self._write(data)
+
+    def add_item(self, category, obj, create=False):
+        with self.lock:
+            data = self._read()
+            if category not in data and not create:
+                return None
+            items = data.setdefault(category, [])
+            item = {"id": next_id(items)}
+            item.update(obj)
+            items.append(item)
+            self._write(data)
+            return item
+
+    def get_item(self, category, resource_id):
+        return find_by_id(self._read().get(category, []), resource_id)
+
+    def update_item(self, category, resource_id, obj):
+        with self.lock:
+            data = self._read()
+            items = data.get(category, [])
+            found = find_by_id(items, resource_id)
+            if found is None:
+                return None
+            item = {"id": found["id"]}
+            item.update(obj)
+            items[items.index(found)] = item
+            self._write(data)
+            return item
+
+    def delete_item(self, category, resource_id):
+        with self.lock:
+            data = self._read()
+            items = data.get(category, [])
+            found = find_by_id(items, resource_id)
+            if found is None:
+                return None
+            items.remove(found)
+            self._write(data)
+            return found
+
+
+class MemoryResourceStore(ResourceStore):
+    """Everything in a dict, nothing on disk. Used by read replicas, which rebuild it from the primary."""
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def dump(self):
+        with self.lock:
+            return {category: list(items) for category, items in self.data.items()}
+
+    def load(self, data):
+        with self.lock:
+            self.data = {category: list(items) for category, items in data.items()}
+
+    def has_category(self, category):
+        return category in self.data
+
+    def get_category(self, category):
+        with self.lock:
+            items = self.data.get(category)
+            return list(items) if items is not None else None
+
+    def replace_category(self, category, items):
+        with self.lock:
+            self.data[category] = list(items)
+
+    def add_item(self, category, obj, create=False):
+        with self.lock:
+            if category not in self.data and not create:
+                return None
+            items = self.data.setdefault(category, [])
+            item = {"id": next_id(items)}
+            item.update(obj)
+            items.append(item)
+            return item
+
+    def put_item(self, category, item):
+        """Store item as it is (id included), replacing the item with the same id. Creates the category."""
+        with self.lock:
+            items = self.data.setdefault(category, [])
+            found = find_by_id(items, item.get("id"))
+            if found is None:
+                items.append(item)
+            else:
+                items[items.index(found)] = item
+            return item
+
+    def get_item(self, category, resource_id):
+        with self.lock:
+            return find_by_id(self.data.get(category, []), resource_id)
+
+    def update_item(self, category, resource_id, obj):
+        with self.lock:
+            items = self.data.get(category, [])
+            found = find_by_id(items, resource_id)
+            if found is None:
+                return None
+            item = {"id": found["id"]}
+            item.update(obj)
+            items[items.index(found)] = item
+            return item
+
+    def delete_item(self, category, resource_id):
+        with self.lock:
+            items = self.data.get(category, [])
+            found = find_by_id(items, resource_id)
+            if found is not None:
+                items.remove(found)
+            return found
+
+
+class SQLiteResourceStore(ResourceStore):
+    """One row per item in a generic document table.
+
+    item_key holds str(id) for lookups and num_id the integer id (if any)
+    so the next id is an index lookup instead of a scan. WAL lets readers
+    run while a write is committing.
+    """
+
+    SYNCHRONOUS = {DURABILITY_NONE: "OFF", DURABILITY_FILE: "NORMAL", DURABILITY_FULL: "FULL"}
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS categories (name TEXT PRIMARY KEY)",
+        "CREATE TABLE IF NOT EXISTS items ("
+        " seq INTEGER PRIMARY KEY AUTOINCREMENT, category TEXT NOT NULL,"
+        " item_key TEXT, num_id INTEGER, doc TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS items_by_category ON items (category)",
+        "CREATE INDEX IF NOT EXISTS items_by_key ON items (category, item_key)",
+        "CREATE INDEX IF NOT EXISTS items_by_num_id ON items (category, num_id)",
+    )
+
+    def __init__(self, path, durability=DURABILITY_FILE, timeout=10.0):
+        self.path = path
+        self.durability = durability
+        self.timeout = timeout
+        self.pool = queue.LifoQueue()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.transaction() as db:
+            for statement in self.SCHEMA:
+                db.execute(statement)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.SYNCHRONOUS[self.durability]}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection (requests run on short-lived threads, so none is kept per thread)."""
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            self.pool.put(conn)
+
+    @contextmanager
+    def transaction(self, write=True):
+        """BEGIN ... COMMIT, rolled back if the block raises.
+
+        Writers start with BEGIN IMMEDIATE so they take the write lock up
+        front instead of failing to upgrade a read lock halfway through.
+        """
+        with self.connection() as db:
+            db.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    @staticmethod
+    def _row(category, obj):
+        resource_id = obj.get("id") if isinstance(obj, dict) else None
+        num_id = resource_id if isinstance(resource_id, int) and not isinstance(resource_id, bool) else None
+        key = str(resource_id) if isinstance(obj, dict) else None
+        return category, key, num_id, json.dumps(obj, ensure_ascii=False)
+
+    def _insert(self, db, category, items):
+        db.executemany("INSERT INTO items (category, item_key, num_id, doc) VALUES (?, ?, ?, ?)",
+                       (self._row(category, obj) for obj in items))
+
+    def _find(self, db, category, resource_id):
+        return db.execute("SELECT seq, doc FROM items WHERE category = ? AND item_key = ? ORDER BY seq LIMIT 1",
+                          (category, str(resource_id))).fetchone()
+
+    def dump(self):
+        data = {}
+        with self.transaction(write=False) as db:
+            rows = db.execute("SELECT c.name, i.doc FROM categories c LEFT JOIN items i ON i.category = c.name "
+                              "ORDER BY c.rowid, i.seq").fetchall()
+        for name, doc in rows:
+            items = data.setdefault(name, [])
+            if doc is not None:
+                items.append(json.loads(doc))
+        return data
+
+    def load(self, data):
+        with self.transaction() as db:
+            db.execute("DELETE FROM items")
+            db.execute("DELETE FROM categories")
+            for category, items in data.items():
+                db.execute("INSERT INTO categories (name) VALUES (?)", (category,))
+                self._insert(db, category, items)
+
+    def has_category(self, category):
+        with self.connection() as db:
+            return db.execute("SELECT 1 FROM categories WHERE name = ?", (category,)).fetchone() is not None
+
+    def get_category(self, category):
+        with self.transaction(write=False) as db:
+            if db.execute("SELECT 1 FROM categories WHERE name = ?", (category,)).fetchone() is None:
+                return None
+            rows = db.execute("SELECT doc FROM items WHERE category = ? ORDER BY seq", (category,))
+            return [json.loads(doc) for doc, in rows]
+
+    def replace_category(self, category, items):
+        with self.transaction() as db:
+            db.execute("INSERT OR IGNORE INTO categories (name) VALUES (?)", (category,))
+            db.execute("DELETE FROM items WHERE category = ?", (category,))
+            self._insert(db, category, items)
+
+    def add_item(self, category, obj, create=False):
+        with self.transaction() as db:
+            if create:
+                db.execute("INSERT OR IGNORE INTO categories (name) VALUES (?)", (category,))
+            elif db.execute("SELECT 1 FROM categories WHERE name = ?", (category,)).fetchone() is None:
+                return None
+            last = db.execute("SELECT MAX(num_id) FROM items WHERE category = ?", (category,)).fetchone()[0]
+            item = {"id": (last or 0) + 1}
+            item.update(obj)
+            self._insert(db, category, [item])
+            return item
+
+    def get_item(self, category, resource_id):
+        with self.connection() as db:
+            row = self._find(db, category, resource_id)
+        return json.loads(row[1]) if row else None
+
+    def update_item(self, category, resource_id, obj):
+        with self.transaction() as db:
+            row = self._find(db, category, resource_id)
+            if row is None:
+                return None
+            item = {"id": json.loads(row[1])["id"]}
+            item.update(obj)
+            _, key, num_id, doc = self._row(category, item)
+            db.execute("UPDATE items SET item_key = ?, num_id = ?, doc = ? WHERE seq = ?", (key, num_id, doc, row[0]))
+            return item
+
+    def delete_item(self, category, resource_id):
+        with self.transaction() as db:
+            row = self._find(db, category, resource_id)
+            if row is None:
+                return None
+            db.execute("DELETE FROM items WHERE seq = ?", (row[0],))
+            return json.loads(row[1])
+
+    def close(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def import_json(store, json_path):
+    """Replace the contents of store with json_path. Returns the number of items imported."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    store.load(data)
+    return sum(len(items) for items in data.values())
+
+
+def export_json(store, json_path, durability=DURABILITY_FILE):
+    """Write the contents of store to json_path in the resources.json format."""
+    data = store.dump()
+    encoded = json.dumps(data, indent=4, ensure_ascii=False).encode("utf-8")
+    atomic_write(json_path, encoded, durability)
+    return sum(len(items) for items in data.values())
+
+
+def open_store(backend, directory=DEFAULT_DIR, durability=DURABILITY_FILE):
+    """Open the store used by the server; a new SQLite database is seeded from resources.json."""
+    json_path = os.path.join(directory, "resources.json")
+    if backend == "json":
+        return JSONResourceStore(json_path, durability)
+    if backend == "sqlite":
+        db_path = os.path.join(directory, "resources.db")
+        is_new = not os.path.exists(db_path)
+        store = SQLiteResourceStore(db_path, durability)
+        if is_new and os.path.exists(json_path):
+            count = import_json(store, json_path)
+            print(f"Imported {count} resources from {json_path} into {db_path}")
+        return store
+    raise ValueError(f"Unknown resource store: {backend!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy resources between resources.json and the SQLite store")
+    parser.add_argument("command", choices=("import", "export"),
+                        help="import: JSON -> SQLite (replaces the database contents); export: SQLite -> JSON")
+    parser.add_argument("--json", default=os.path.join(DEFAULT_DIR, "resources.json"))
+    parser.add_argument("--db", default=os.path.join(DEFAULT_DIR, "resources.db"))
+    args = parser.parse_args()
+    store = SQLiteResourceStore(args.db)
+    try:
+        if args.command == "import":
+            count = import_json(store, args.json)
+            print(f"Imported {count} resources from {args.json} into {args.db}")
+        else:
+            count = export_json(store, args.json)
+            print(f"Exported {count} resources from {args.db} to {args.json}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
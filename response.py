@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Respuestas HTTP de nServer como objetos: la cabecera se guarda en bytes
+    (con las líneas de estado y cabeceras comunes ya codificadas) y el cuerpo
+    como una lista de buffers (bytes o memoryview de un mmap), que se envían
+    juntos con socket.sendmsg() sin concatenarlos en un único bloque.
+"""
+import socket
+import time
+from http import HTTPStatus
+
+SEND_CHUNK = 256 * 1024
+
+STATUS_LINES = {f"{s.value} {s.phrase}": f"HTTP/1.1 {s.value} {s.phrase}\r\n".encode() for s in HTTPStatus}
+CONNECTION_HEADERS = {False: b"Connection: close\r\n", True: b"Connection: keep-alive\r\n"}
+_content_type_headers = {}
+
+
+def status_line(status):
+    line = STATUS_LINES.get(status)
+    if line is None:
+        line = STATUS_LINES[status] = f"HTTP/1.1 {status}\r\n".encode()
+    return line
+
+
+def content_type_header(content_type):
+    header = _content_type_headers.get(content_type)
+    if header is None:
+        header = _content_type_headers[content_type] = f"Content-Type: {content_type}\r\n".encode()
+    return header
+
+
+class Response:
+    """Status, encoded header lines and body buffers of one response.
+
+    header_block holds every header line except Connection, which is added
+    when the head is rendered so the same response (e.g. a cached one) can
+    be sent on a connection that stays open or on one that closes.
+    """
+
+    __slots__ = ("status", "header_block", "body", "head_only", "keep_alive")
+    long_lived = False
+
+    def __init__(self, status, header_block, body=(), head_only=False, keep_alive=False):
+        self.status = status
+        self.header_block = header_block
+        self.body = body
+        self.head_only = head_only
+        self.keep_alive = keep_alive
+
+    @classmethod
+    def build(cls, status, content=b"", content_type="text/plain", content_length=None, extra_headers=None,
+              head_only=False):
+        body = content.encode("utf-8") if isinstance(content, str) else content
+        length = content_length if content_length is not None else len(body)
+        header_block = content_type_header(content_type) + b"Content-Length: %d\r\n" % length
+        if extra_headers:
+            header_block += "".join(f"{name}: {value}\r\n" for name, value in extra_headers.items()).encode()
+        return cls(status, header_block, (body,) if len(body) else (), head_only)
+
+    @property
+    def status_code(self):
+        return int(self.status[:3])
+
+    def head(self):
+        return status_line(self.status) + self.header_block + CONNECTION_HEADERS[self.keep_alive] + b"\r\n"
+
+    def buffers(self):
+        return [self.head()] if self.head_only else [self.head(), *self.body]
+
+    def __len__(self):
+        head = len(status_line(self.status)) + len(self.header_block) + len(CONNECTION_HEADERS[self.keep_alive]) + 2
+        return head if self.head_only else head + sum(map(len, self.body))
+
+    def without_body(self):
+        return Response(self.status, self.header_block, self.body, True, self.keep_alive)
+
+    def with_headers(self, header_lines):
+        """Copy with extra encoded header lines (each ending in CRLF)."""
+        return Response(self.status, self.header_block + header_lines, self.body, self.head_only, self.keep_alive)
+
+    def to_bytes(self):
+        return b"".join(self.buffers())
+
+    def send(self, sock, timeout=None, chunk=SEND_CHUNK):
+        """Write the response with as few syscalls as possible. Returns the bytes sent.
+
+        Head and body buffers go out together through sendmsg(), so the
+        body is never copied to prepend the head. With a timeout, the peer
+        must accept each chunk bytes within that many seconds, otherwise
+        socket.timeout is raised.
+        """
+        buffers = [memoryview(part) for part in self.buffers() if len(part)]
+        sendmsg = getattr(sock, "sendmsg", None)
+        sent = 0
+        mark = chunk
+        deadline = time.monotonic() + timeout if timeout else None
+        sock.settimeout(timeout or None)
+        while buffers:
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout("send deadline exceeded")
+                sock.settimeout(remaining)
+            n = sendmsg(buffers) if sendmsg else sock.send(buffers[0])
+            sent += n
+            if sent >= mark and deadline is not None:
+                deadline = time.monotonic() + timeout
+                mark = (sent // chunk + 1) * chunk
+            while n:
+                if n >= len(buffers[0]):
+                    n -= len(buffers.pop(0))
+                else:
+                    buffers[0] = buffers[0][n:]
+                    n = 0
+        return sent
+
+
+class StreamingResponse(Response):
+    """Response whose body is produced by an iterator while it is being sent (no Content-Length).
+
+    The connection is always closed afterwards. len() is the number of
+    bytes actually sent. long_lived marks streams that last as long as the
+    client listens (Server-Sent Events) rather than a transfer.
+    """
+
+    __slots__ = ("stream", "sent", "long_lived")
+
+    def __init__(self, status, header_block, stream, head_only=False, long_lived=False):
+        super().__init__(status, header_block, (), head_only, False)
+        self.stream = stream
+        self.sent = 0
+        self.long_lived = long_lived
+
+    def __len__(self):
+        return self.sent or super().__len__()
+
+    def without_body(self):
+        return StreamingResponse(self.status, self.header_block, iter(()), True)
+
+    def send(self, sock, timeout=None, chunk=SEND_CHUNK):
+        """Send the head, then each chunk the stream yields, until it ends or the peer goes away."""
+        self.keep_alive = False
+        sock.settimeout(timeout or None)
+        try:
+            head = self.head()
+            sock.sendall(head)
+            self.sent = len(head)
+            if self.head_only:
+                return self.sent
+            for data in self.stream:
+                sock.sendall(data)
+                self.sent += len(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            close = getattr(self.stream, "close", None)
+            if close is not None:
+                close()
+        return self.sent
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Caché de respuestas ya construidas (objetos Response) para las
+    peticiones GET de /resources. Cada entrada se etiqueta con su categoría
+    para poder invalidar solo lo afectado por una escritura; además tiene un
+    TTL y la caché está limitada en número de entradas y en bytes (LRU).
+    Las respuestas llevan Cache-Control y Age para que un proxy intermedio
+    también pueda cachearlas.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 5.0
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class ResponseCache:
+    """LRU cache of full HTTP responses, invalidated by tag.
+
+    The tag None is for responses that depend on every tag (the root
+    listing), so invalidating any tag also drops them. A response built
+    while its tag was being invalidated is not stored: callers take
+    generation(tag) before reading the data and pass it to put().
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (response, size, created, tag)
+        self.tags = {}
+        self.generations = {}
+        self.size = 0
+        self.lock = threading.Lock()
+        self.cache_control = f"Cache-Control: max-age={int(ttl)}\r\n".encode()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def generation(self, tag):
+        return self.generations.get(tag, 0)
+
+    def get(self, key):
+        """The cached response with an up-to-date Age header, or None."""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if now - entry[2] >= self.ttl:
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+        return self._render(entry[0], now - entry[2])
+
+    def put(self, key, tag, response, generation):
+        """Store a freshly built response and return it with the cache headers added."""
+        size = len(response)
+        entry = (response, size, time.monotonic(), tag)
+        with self.lock:
+            if size <= self.max_bytes and self.generations.get(tag, 0) == generation:
+                if key in self.entries:
+                    self._remove(key)
+                self.entries[key] = entry
+                self.tags.setdefault(tag, set()).add(key)
+                self.size += size
+                while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                    self._remove(next(iter(self.entries)))
+        return self._render(response, 0)
+
+    def invalidate(self, tag):
+        """Drop every response for tag and every response tagged None."""
+        with self.lock:
+            for t in {tag, None}:
+                self.generations[t] = self.generations.get(t, 0) + 1
+                for key in list(self.tags.get(t, ())):
+                    self._remove(key)
+
+    def _remove(self, key):
+        _, size, _, tag = self.entries.pop(key)
+        self.size -= size
+        keys = self.tags.get(tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.tags[tag]
+
+    def _render(self, response, age):
+        return response.with_headers(self.cache_control + b"Age: %d\r\n" % age)
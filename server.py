@@ -7,6 +7,10 @@ from http import HTTPStatus
 from urllib.parse import unquote, urlparse
 from pathlib import Path
 
+from dirindex import DirectoryIndex, FileInfo
+from http_parser import RequestParser, HTTPParseError, lingering_close
+from storage import PathLocks, atomic_write, is_temp_name
+
 DEFAULT_HOST = 'localhost'
 DEFAULT_PORT = 8080
 SERVER_DIR = Path('Server')
@@ -21,6 +25,9 @@ class SimpleHTTPServer:
         self.resources_file = PRIVATE_DIR / 'resources.json'
         self.log_file = PRIVATE_DIR / 'server.log'
         self.resources_file.parent.mkdir(parents=True, exist_ok=True)
+        self.write_locks = PathLocks()
+        self.index = DirectoryIndex(SERVER_DIR, exclude=(PRIVATE_DIR.name,),
+                                    content_type=lambda p: self._content_type(Path(p)), ignore=is_temp_name)
         self._load_resources()
 
     def _load_resources(self):
@@ -33,16 +40,16 @@ class SimpleHTTPServer:
             self.resources = {}
 
     def _write_resources(self):
-        self.resources_file.write_text(
-            json.dumps(self.resources, indent=4, ensure_ascii=False),
-            encoding='utf-8'
-        )
+        data = json.dumps(self.resources, indent=4, ensure_ascii=False).encode('utf-8')
+        with self.write_locks.hold(self.resources_file):
+            atomic_write(str(self.resources_file), data)
 
     def start(self):
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as srv:
             srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             srv.bind((self.host, self.port))
             srv.listen(5)
+            self.index.start()
             print(f"Listening on {self.host}:{self.port}...")
             while True:
                 client, addr = srv.accept()
@@ -55,11 +62,12 @@ class SimpleHTTPServer:
 
     def _handle_client(self, client, addr):
         try:
-            data = self._recv_all(client)
-            request_line, headers, body = self._parse_request(data)
-            method, raw_path, _ = request_line.split()
+            parser = self._recv_request(client)
+            if parser is None:
+                return
+            method, raw_path, headers, body = parser.method, parser.path, parser.headers, parser.body
             path = unquote(urlparse(raw_path).path)
-            self._log_request(addr, request_line, headers, body)
+            self._log_request(addr, parser.request_line, headers, body)
 
             if path.startswith('/resources'):
                 resp = self._route_resources(method, path, body)
@@ -67,54 +75,30 @@ class SimpleHTTPServer:
                 resp = self._route_file(method, path, headers, body)
 
             client.sendall(resp)
+        except HTTPParseError as e:
+            print(f"Rejected request from {addr}: {e}")
+            client.sendall(self._response(e.status, str(e).encode()))
+            lingering_close(client)
         except Exception as e:
             print(f"Error handling client {addr}: {e}")
             client.sendall(self._response(HTTPStatus.INTERNAL_SERVER_ERROR))
         finally:
             client.close()
 
-    def _recv_all(self, sock):
-        data = bytearray()
-        while True:
+    def _recv_request(self, sock):
+        parser = RequestParser()
+        while not parser.headers_complete:
             chunk = sock.recv(BUFFER_SIZE)
             if not chunk:
-                break
-            data.extend(chunk)
-            if b'\r\n\r\n' in data:
-                break
-        headers_end = data.find(b"\r\n\r\n") + 4
-        headers = data[:headers_end]
-        cl = self._get_content_length(headers)
-        if cl:
-            to_read = cl - (len(data) - headers_end)
-            while to_read > 0:
-                chunk = sock.recv(min(BUFFER_SIZE, to_read))
-                if not chunk:
-                    break
-                data.extend(chunk)
-                to_read -= len(chunk)
-        return bytes(data)
-
-    def _parse_request(self, raw):
-        header_end = raw.find(b"\r\n\r\n")
-        header_bytes = raw[:header_end]
-        body = raw[header_end+4:]
-        lines = header_bytes.decode('utf-8', errors='ignore').split('\r\n')
-        request_line = lines[0]
-        headers = {k: v for k, v in (
-            ln.split(':', 1) for ln in lines[1:] if ':' in ln
-        )}
-        return request_line, headers, body
-
-    def _get_content_length(self, header_bytes):
-        try:
-            text = header_bytes.decode('utf-8', errors='ignore')
-            for line in text.split('\r\n'):
-                if line.lower().startswith('content-length'):
-                    return int(line.split(':', 1)[1].strip())
-        except Exception:
-            pass
-        return 0
+                return None
+            parser.feed(chunk)
+        while not parser.complete:
+            chunk = sock.recv(min(BUFFER_SIZE, parser.remaining))
+            if not chunk:
+                # A body cut short must not be routed: a PUT would install half a file.
+                raise HTTPParseError(HTTPStatus.BAD_REQUEST, "Request body ended before Content-Length")
+            parser.feed(chunk)
+        return parser
 
     def _log_request(self, addr, request_line, headers, body):
         ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -135,11 +119,12 @@ class SimpleHTTPServer:
         if not str(filepath).startswith(str(SERVER_DIR.resolve())):
             return self._response(HTTPStatus.FORBIDDEN)
         if method in ('GET', 'HEAD'):
-            if not filepath.exists() or not filepath.is_file():
+            info = self._file_info(filepath)
+            if info is None:
                 return self._response(HTTPStatus.NOT_FOUND)
             ims = headers.get('If-Modified-Since')
             if ims:
-                mtime = datetime.utcfromtimestamp(filepath.stat().st_mtime)
+                mtime = datetime.utcfromtimestamp(int(info.mtime))
                 try:
                     ims_dt = datetime.strptime(ims, '%a, %d %b %Y %H:%M:%S GMT')
                     if mtime <= ims_dt:
@@ -152,19 +137,36 @@ class SimpleHTTPServer:
                 content_type=self._content_type(filepath)
             )
         if method in ('PUT', 'POST'):
+            if is_temp_name(filepath.name):
+                return self._response(HTTPStatus.FORBIDDEN)
             filepath.parent.mkdir(parents=True, exist_ok=True)
-            mode = 'wb' if body else 'w'
-            with open(filepath, mode) as f:
-                f.write(body if body else '')
-            status = HTTPStatus.OK if filepath.exists() else HTTPStatus.CREATED
+            with self.write_locks.hold(filepath):
+                existed = filepath.exists()
+                atomic_write(str(filepath), body)
+            self._file_written(filepath)
+            status = HTTPStatus.OK if existed else HTTPStatus.CREATED
             return self._response(status, f"File {'updated' if status==HTTPStatus.OK else 'created'}".encode())
         if method == 'DELETE':
             if filepath.exists():
                 filepath.unlink()
+                self._file_written(filepath)
                 return self._response(HTTPStatus.OK, b'Deleted')
             return self._response(HTTPStatus.NOT_FOUND)
         return self._response(HTTPStatus.METHOD_NOT_ALLOWED)
 
+    def _file_info(self, filepath):
+        rel_path = str(filepath.relative_to(SERVER_DIR.resolve()))
+        if self.index.active and not self.index.is_excluded(rel_path):
+            return self.index.get(rel_path)
+        if not filepath.is_file():
+            return None
+        st = filepath.stat()
+        return FileInfo(st.st_size, st.st_mtime, self._content_type(filepath))
+
+    def _file_written(self, filepath):
+        if self.index.active:
+            self.index.refresh(str(filepath.relative_to(SERVER_DIR.resolve())))
+
     def _route_resources(self, method, path, body):
         segments = path.strip('/').split('/')
         _, cat, *rest = segments + [None]*3
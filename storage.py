@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Escritura atómica de ficheros: los datos se escriben en un fichero
+    temporal del mismo directorio y se renombran con os.replace(), de modo
+    que un lector nunca ve un fichero a medio escribir y un fallo no deja
+    el original corrupto. Incluye locks por ruta para serializar escrituras
+    concurrentes sobre el mismo fichero y un almacén direccionado por
+    contenido (BlobStore) que guarda una sola copia de cada fichero subido.
+"""
+import hashlib
+import json
+import os
+import secrets
+import threading
+from contextlib import contextmanager
+
+DURABILITY_NONE = "none"   # rename only; data reaches disk when the OS flushes it
+DURABILITY_FILE = "file"   # fsync the new file before renaming it into place
+DURABILITY_FULL = "full"   # also fsync the directory so the rename itself survives a crash
+DURABILITY_POLICIES = (DURABILITY_NONE, DURABILITY_FILE, DURABILITY_FULL)
+BLOB_MODE = 0o444  # blobs are shared by every name linked to them, so nobody may edit one in place
+
+
+def is_temp_name(name):
+    """True for the hidden temporary files created by atomic_write()."""
+    return name.startswith(".") and name.endswith(".tmp")
+
+
+def fsync_directory(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class AtomicFile:
+    """A file written in pieces to a hidden temporary next to path and renamed into place by commit().
+
+    Until commit() readers keep seeing the previous file (or none);
+    discard() removes the temporary instead. A temporary reopened with
+    tmp_path is kept if commit() fails, since it holds data received
+    before (a resumable upload).
+    """
+
+    def __init__(self, path, durability=DURABILITY_FILE, tmp_path=None):
+        if durability not in DURABILITY_POLICIES:
+            raise ValueError(f"Unknown durability policy: {durability!r}")
+        self.path = path
+        self.durability = durability
+        self.resumed = tmp_path is not None
+        if tmp_path is None:
+            directory = os.path.dirname(path) or "."
+            self.tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{secrets.token_hex(6)}.tmp")
+            fd = os.open(self.tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        else:
+            # Carry on with a temporary kept from before (a resumable upload), on the same filesystem as path.
+            self.tmp_path = tmp_path
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o666)
+        self.file = os.fdopen(fd, "wb")
+        self.size = os.fstat(fd).st_size
+
+    def write(self, data):
+        self.file.write(data)
+        self.size += len(data)
+
+    def sync(self):
+        """Make what was written so far durable (according to the policy) without committing it."""
+        self.file.flush()
+        if self.durability != DURABILITY_NONE:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        """Close the temporary but keep it, to be reopened with tmp_path later."""
+        self.file.close()
+
+    def commit(self, path=None):
+        """Rename the data to path (default: the path given when opening), on the same filesystem."""
+        path = path or self.path
+        try:
+            if self.durability != DURABILITY_NONE:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            self.file.close()
+            try:
+                os.chmod(self.tmp_path, os.stat(path).st_mode & 0o7777)
+            except FileNotFoundError:
+                pass
+            os.replace(self.tmp_path, path)
+        except BaseException:
+            if self.resumed:
+                self.file.close()
+            else:
+                self.discard()
+            raise
+        if self.durability == DURABILITY_FULL:
+            fsync_directory(os.path.dirname(path) or ".")
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.unlink(self.tmp_path)
+        except OSError:
+            pass
+
+
+def atomic_write(path, data, durability=DURABILITY_FILE):
+    """Replace path with data (bytes, or an iterable of byte chunks) atomically."""
+    pending = AtomicFile(path, durability)
+    try:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            pending.write(data)
+        else:
+            for chunk in data:
+                pending.write(chunk)
+    except BaseException:
+        pending.discard()
+        raise
+    pending.commit()
+
+
+class PathLocks:
+    """One lock per path, created on first use and discarded when no thread holds or waits on it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    @contextmanager
+    def hold(self, path):
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+
+class BlobStore:
+    """Content-addressed storage for uploads.
+
+    Each distinct body is stored once as <root>/<aa>/<sha256>; public names
+    are hard links to their blob, so duplicates only cost a directory entry.
+    names.json maps each public name to its digest, size and mtime so the
+    digest can be used as a strong ETag while the file is unchanged, plus
+    the mtime of the blob when the name was linked to it.
+
+    Since an edit in place of one name would change every duplicate, blobs
+    are read-only: a file is changed by replacing it (a PUT, or an editor
+    that saves to a new file and renames it), which only unlinks that name.
+    A blob whose mtime no longer matches what was recorded was written to
+    anyway (e.g. by root) and is never reused for new uploads.
+    """
+
+    def __init__(self, root, durability=DURABILITY_FILE):
+        self.root = root
+        self.durability = durability
+        self.names_path = os.path.join(root, "names.json")
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        try:
+            with open(self.names_path, encoding="utf-8") as f:
+                self.names = json.load(f)
+        except (OSError, ValueError):
+            self.names = {}
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def store(self, target_path, name, data, digest=None):
+        """Make target_path hold data, sharing the blob with any identical upload. Returns the digest."""
+        digest = digest or hashlib.sha256(data).hexdigest()
+        blob = self.blob_path(digest)
+        with self.lock:
+            if not self._intact(blob, len(data), digest):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                atomic_write(blob, data, self.durability)
+                os.chmod(blob, BLOB_MODE)
+            self._publish(blob, target_path, name, digest)
+        return digest
+
+    def store_file(self, target_path, name, pending, digest):
+        """Like store() for a body already written to an AtomicFile, which becomes the blob if it is new."""
+        blob = self.blob_path(digest)
+        with self.lock:
+            if self._intact(blob, pending.size, digest):
+                pending.discard()
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                pending.commit(blob)
+                os.chmod(blob, BLOB_MODE)
+            self._publish(blob, target_path, name, digest)
+        return digest
+
+    def _intact(self, blob, size, digest):
+        """True if blob can be shared: it exists, has the right size and was not modified since it was stored."""
+        try:
+            st = os.stat(blob)
+        except FileNotFoundError:
+            return False
+        recorded = {entry.get("blob_mtime", entry["mtime"]) for entry in self.names.values() if entry["sha256"] == digest}
+        if st.st_size != size or (recorded and st.st_mtime not in recorded):
+            if st.st_size == size:
+                print(f"Blob {digest} was modified in place, storing it again")
+            return False
+        return True
+
+    def _publish(self, blob, target_path, name, digest):
+        """Point target_path at blob and record it under name (called with the lock held)."""
+        previous = self.names.get(name)
+        self._link(blob, target_path)
+        st = os.stat(target_path)
+        self.names[name] = {"sha256": digest, "size": st.st_size, "mtime": st.st_mtime,
+                            "blob_mtime": os.stat(blob).st_mtime}
+        self._save()
+        if previous and previous["sha256"] != digest:
+            self._collect(previous["sha256"])
+
+    def forget(self, name):
+        """Drop name from the map (after the public file was deleted) and free its blob if unused."""
+        with self.lock:
+            previous = self.names.pop(name, None)
+            if previous:
+                self._save()
+                self._collect(previous["sha256"])
+
+    def digest_for(self, name, size, mtime):
+        entry = self.names.get(name)
+        if entry and entry["size"] == size and entry["mtime"] == mtime:
+            return entry["sha256"]
+        return None
+
+    def _link(self, blob, target_path):
+        tmp_path = os.path.join(os.path.dirname(target_path) or ".",
+                                f".{os.path.basename(target_path)}.{secrets.token_hex(6)}.tmp")
+        try:
+            os.link(blob, tmp_path)
+        except OSError:
+            # No hard links here (other filesystem, Windows FAT...): fall back to a copy.
+            with open(blob, "rb") as f:
+                atomic_write(target_path, iter(lambda: f.read(1024 * 1024), b""), self.durability)
+            return
+        try:
+            os.replace(tmp_path, target_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _collect(self, digest):
+        blob = self.blob_path(digest)
+        try:
+            if os.stat(blob).st_nlink <= 1:
+                os.unlink(blob)
+        except FileNotFoundError:
+            pass
+
+    def _save(self):
+        data = json.dumps(self.names, indent=4, ensure_ascii=False).encode("utf-8")
+        atomic_write(self.names_path, data, self.durability)
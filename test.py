@@ -1,9 +1,35 @@
 # -*- coding: utf-8 -*-
 import unittest
+import signal
 import socket
+import subprocess
+import sys
 import json
+import hashlib
+import io
 import os
+import re
+import stat
+import tarfile
+import tempfile
+import http.client
+import threading
+import time
+from contextlib import nullcontext, redirect_stdout
 from datetime import datetime
+from admission import RateLimiter, parse_limit
+from archive import select_paths, tar_stream
+from balancer import Balancer
+from changefeed import parse_events
+from http_parser import MAX_BODY_BYTES
+from multipart import MultipartParser
+import nServer
+from profiling import ProfileCapture
+from nClient import HttpCache, encode_multipart, plan_sync
+from replication import Replicator
+from uploads import UploadError, UploadStore, parse_content_range
+from resource_store import MemoryResourceStore, SQLiteResourceStore, export_json, import_json
+from storage import BlobStore
 
 # python3 -m unittest test.py -v
 
@@ -304,5 +330,821 @@ class TestHTTPServer(unittest.TestCase):
             log_content = log.read()
         self.assertIn("GET /index.html HTTP/1.1", log_content)
 
+    def test_metrics_endpoint(self):
+        """GET /_metrics exposes request counters in Prometheus format"""
+        self.send_request("GET", "/index.html")
+        response = self.send_request("GET", "/_metrics")
+        self.assertIn("HTTP/1.1 200 OK", response)
+        self.assertIn("Content-Type: text/plain; version=0.0.4", response)
+        self.assertIn('http_requests_total{method="GET",route="static",status="200"}', response)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="static",le="+Inf"}', response)
+
+    def test_metrics_not_writable(self):
+        response = self.send_request("POST", "/_metrics", body="x")
+        self.assertIn("405 Method Not Allowed", response)
+
+    def test_profile_endpoint_disabled_by_default(self):
+        response = self.send_request("POST", "/_profile", body="")
+        self.assertNotIn("200 OK", response)
+
+    def send_raw(self, data):
+        """Envía bytes tal cual y devuelve la respuesta como texto"""
+        with socket.create_connection((self.host, self.port)) as sock:
+            sock.sendall(data)
+            response = b''
+            while True:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                response += chunk
+        return response.decode('utf-8', errors='replace')
+
+    def test_lowercase_content_length(self):
+        """Header names are case-insensitive"""
+        body = json.dumps({"nombre": "Gato minúsculas"}).encode('utf-8')
+        request = (
+            b"POST /resources/gatos HTTP/1.1\r\nhost: localhost\r\n"
+            b"content-length: " + str(len(body)).encode() + b"\r\nconnection: close\r\n\r\n" + body
+        )
+        response = self.send_raw(request)
+        self.assertIn("HTTP/1.1 201 Created", response)
+
+    def test_headers_too_large(self):
+        request = b"GET /index.html HTTP/1.1\r\nX-Big: " + b"a" * (70 * 1024) + b"\r\n\r\n"
+        response = self.send_raw(request)
+        self.assertIn("431 Request Header Fields Too Large", response)
+
+    def test_non_ascii_content_length(self):
+        """Un Content-Length con dígitos no ASCII es un 400, no un error interno"""
+        response = self.send_raw("PUT /digits.txt HTTP/1.1\r\nContent-Length: ²\r\n\r\n".encode("utf-8"))
+        self.assertIn("400 Bad Request", response)
+
+    def test_body_too_large(self):
+        response = self.send_raw(b"PUT /big.txt HTTP/1.1\r\nContent-Length: 1000000000000\r\n\r\n")
+        self.assertIn("413 Request Entity Too Large", response)
+
+    def test_streamed_upload_over_memory_limit(self):
+        """Solo los cuerpos que se leen en memoria están limitados a 64 MiB; una subida multipart puede pasar de ahí"""
+        size = MAX_BODY_BYTES + 1
+        response = self.send_raw(b"PUT /big.txt HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % size)
+        self.assertIn("413 Request Entity Too Large", response)
+        boundary = "----TestBoundaryBig"
+        body = encode_multipart(boundary, [("file", "multi_big.bin", "application/octet-stream", bytes(size))])
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            conn.request("POST", "/", body=body, headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+            self.assertEqual(conn.getresponse().status, 201)
+            self.assertEqual(os.path.getsize(os.path.join("Server", "multi_big.bin")), size)
+        finally:
+            conn.close()
+            self.send_request("DELETE", "/multi_big.bin")
+
+    def test_path_cache_hits(self):
+        """Repeated static requests are resolved from the path cache"""
+        self.send_request("GET", "/index.html")
+        self.send_request("GET", "/index.html")
+        response = self.send_request("GET", "/_metrics")
+        self.assertIn('http_cache_requests_total{cache="path",result="hit"}', response)
+
+    def test_etag_not_modified(self):
+        """A repeated GET with If-None-Match gets 304 from the directory index"""
+        response = self.send_request("GET", "/index.html")
+        etag = [l.split(":", 1)[1].strip() for l in response.split("\r\n") if l.startswith("ETag:")][0]
+        self.assertIn("Last-Modified:", response)
+        response = self.send_request("GET", "/index.html", headers={"If-None-Match": etag})
+        self.assertIn("HTTP/1.1 304 Not Modified", response)
+
+    def test_file_listing(self):
+        response = self.send_request("GET", "/_files")
+        self.assertIn("HTTP/1.1 200 OK", response)
+        listing = json.loads(response.split("\r\n\r\n", 1)[1])
+        paths = {entry["path"] for entry in listing}
+        self.assertIn("index.html", paths)
+        self.assertFalse(any(p.startswith("private") for p in paths))
+
+    def test_dropped_in_file_is_served(self):
+        """Files copied straight into Server/ are picked up without restarting"""
+        path = "Server/dropped_in.txt"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("hola")
+        try:
+            deadline = time.time() + 3
+            response = ""
+            while time.time() < deadline and "200 OK" not in response:
+                response = self.send_request("GET", "/dropped_in.txt")
+                time.sleep(0.05)
+            self.assertIn("HTTP/1.1 200 OK", response)
+        finally:
+            os.remove(path)
+
+    def test_range_large_file(self):
+        """Byte ranges of a large (memory-mapped) file"""
+        with open("Server/a.gif", "rb") as f:
+            f.seek(1000)
+            expected = f.read(100)
+        response = self.send_request("GET", "/a.gif", headers={"Range": "bytes=1000-1099"}, is_binary=True)
+        self.assertIn(b"HTTP/1.1 206 Partial Content", response)
+        self.assertIn(b"Content-Length: 100", response)
+        self.assertEqual(response.split(b"\r\n\r\n", 1)[1], expected)
+
+    def test_full_large_file(self):
+        with open("Server/a.mp4", "rb") as f:
+            expected = f.read()
+        response = self.send_request("GET", "/a.mp4", is_binary=True)
+        self.assertEqual(response.split(b"\r\n\r\n", 1)[1], expected)
+
+    def test_range_not_satisfiable(self):
+        response = self.send_request("GET", "/index.html", headers={"Range": "bytes=99999-"})
+        self.assertIn("416 Range Not Satisfiable", response)
+
+    def test_put_new_file_created(self):
+        """PUT of a file that does not exist yet answers 201 Created"""
+        try:
+            response = self.send_request("PUT", "/new_upload.txt", body="nuevo")
+            self.assertIn("HTTP/1.1 201 Created", response)
+            self.assertIn("File new_upload.txt was successfully created", response)
+        finally:
+            self.send_request("DELETE", "/new_upload.txt")
+
+
+    def test_resources_cache_headers(self):
+        self.send_request("GET", "/resources/perros")
+        response = self.send_request("GET", "/resources/perros")
+        self.assertIn("HTTP/1.1 200 OK", response)
+        self.assertIn("Cache-Control: max-age=", response)
+        self.assertIn("Age: ", response)
+
+    def test_resources_cache_invalidated_on_write(self):
+        """Una escritura en la categoría se ve en el siguiente GET aunque estuviera cacheada"""
+        self.send_request("GET", "/resources/gatos")
+        self.send_request("GET", "/resources")
+        self.send_request("POST", "/resources/gatos", body=json.dumps({"nombre": "Cacheado"}))
+        self.assertIn("Cacheado", self.send_request("GET", "/resources/gatos"))
+        self.assertIn("Cacheado", self.send_request("GET", "/resources"))
+
+    def test_pipelined_requests(self):
+        """Varias peticiones enviadas de una vez se responden en orden por la misma conexión"""
+        response = self.send_raw(
+            b"GET /index.html HTTP/1.1\r\nHost: localhost\r\n\r\n"
+            b"GET /no_existe.html HTTP/1.1\r\nHost: localhost\r\n\r\n"
+            b"HEAD /resources HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+        )
+        statuses = re.findall(r"HTTP/1\.1 \d{3} [^\r]*\r\n", response)
+        self.assertEqual(statuses, ["HTTP/1.1 200 OK\r\n", "HTTP/1.1 404 Not Found\r\n", "HTTP/1.1 200 OK\r\n"])
+        self.assertEqual(response.count("Connection: keep-alive"), 2)
+
+    def test_keep_alive(self):
+        with socket.create_connection((self.host, self.port)) as sock:
+            for _ in range(2):
+                sock.sendall(b"GET /resources/perros HTTP/1.1\r\nHost: localhost\r\n\r\n")
+                head = b''
+                while b"\r\n\r\n" not in head:
+                    head += sock.recv(4096)
+                self.assertIn(b"HTTP/1.1 200 OK", head)
+                self.assertIn(b"Connection: keep-alive", head)
+                length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+                body = head.split(b"\r\n\r\n", 1)[1]
+                while len(body) < length:
+                    body += sock.recv(4096)
+
+    def test_change_stream(self):
+        """El stream de cambios empieza con el estado actual y después envía cada cambio"""
+        with socket.create_connection((self.host, self.port), timeout=5) as sock:
+            sock.sendall(b"GET /resources/perros/_changes HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            received = b''
+            while b"event: reset" not in received:
+                received += sock.recv(65536)
+            self.assertIn(b"Content-Type: text/event-stream", received)
+            self.send_request("POST", "/resources/perros", body=json.dumps({"nombre": "Evento"}))
+            while b"event: create" not in received:
+                received += sock.recv(65536)
+            self.assertIn("Evento", received.decode("utf-8").split("event: create")[1])
+
+    def test_multipart_upload(self):
+        """Un POST multipart a / guarda cada fichero con su nombre; a una ruta de fichero, el único fichero ahí"""
+        with open("a.gif", "rb") as f:
+            gif = f.read()
+        boundary = "----TestBoundary1234"
+        body = encode_multipart(boundary, [("file", "multi_a.gif", "image/gif", gif),
+                                           ("file", "multi_b.txt", "text/plain", "hola\r\n--casi")])
+        headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+        try:
+            response = self.send_request("POST", "/", body=body, headers=headers)
+            self.assertIn("HTTP/1.1 201 Created", response)
+            self.assertIn('"file": "multi_b.txt"', response)
+            self.assertEqual(self.send_request("GET", "/multi_a.gif", is_binary=True).split(b"\r\n\r\n", 1)[1], gif)
+            self.assertTrue(self.send_request("GET", "/multi_b.txt").endswith("\r\n\r\nhola\r\n--casi"))
+            response = self.send_request("PUT", "/multi_c.txt", body=body, headers=headers)
+            self.assertIn("HTTP/1.1 400 Bad Request", response)
+            truncated = body[:len(body) // 2]
+            response = self.send_request("POST", "/", body=truncated, headers=headers)
+            self.assertIn("HTTP/1.1 400 Bad Request", response)
+        finally:
+            for name in ("multi_a.gif", "multi_b.txt"):
+                self.send_request("DELETE", f"/{name}")
+
+    def test_chunked_request_rejected(self):
+        """Un cuerpo chunked no se interpreta como otra petición en la misma conexión"""
+        smuggled = b"GET /a.txt HTTP/1.1\r\nHost: localhost\r\n\r\n"
+        for extra in (b"", b"Content-Length: 4\r\n"):
+            with socket.create_connection((self.host, self.port), timeout=5) as sock:
+                sock.sendall(b"POST /resources/perros HTTP/1.1\r\nHost: localhost\r\nTransfer-Encoding: chunked\r\n"
+                             + extra + b"\r\n" + b"%x\r\n" % len(smuggled) + smuggled + b"\r\n0\r\n\r\n")
+                response = b''
+                while True:
+                    data = sock.recv(4096)
+                    if not data:
+                        break
+                    response += data
+            self.assertIn(b"501 Not Implemented" if not extra else b"400 Bad Request", response)
+            self.assertEqual(response.count(b"HTTP/1.1 "), 1)
+
+    def test_truncated_put(self):
+        """Un PUT cuyo cliente cierra antes de mandar todo el cuerpo no crea el fichero"""
+        with socket.create_connection((self.host, self.port), timeout=5) as sock:
+            sock.sendall(b"PUT /truncated.txt HTTP/1.1\r\nHost: localhost\r\nContent-Length: 1000\r\n\r\n" + b"x" * 300)
+            sock.shutdown(socket.SHUT_WR)
+            response = b''
+            while True:
+                data = sock.recv(4096)
+                if not data:
+                    break
+                response += data
+        self.assertIn(b"400 Bad Request", response)
+        self.assertIn("404 Not Found", self.send_request("GET", "/truncated.txt"))
+
+    def test_put_temp_name_forbidden(self):
+        """Un PUT no puede crear un fichero con nombre de temporal (.x.tmp), que el índice ignoraría"""
+        self.assertIn("403 Forbidden", self.send_request("PUT", "/.nombre.0123456789ab.tmp", body="hola"))
+        self.assertFalse(os.path.exists(os.path.join("Server", ".nombre.0123456789ab.tmp")))
+
+    def test_resumable_upload(self):
+        """Una subida por trozos: HEAD da el offset, un trozo fuera de sitio es 409 y el último crea el fichero"""
+        response = self.send_request("POST", "/_uploads", body=json.dumps({"target": "/resumable.txt", "size": 10}),
+                                     headers={"Content-Type": "application/json"})
+        self.assertIn("HTTP/1.1 201 Created", response)
+        location = re.search(r"Location: (\S+)", response).group(1)
+        try:
+            response = self.send_request("PUT", location, body="01234", headers={"Content-Range": "bytes 0-4/10"})
+            self.assertIn("HTTP/1.1 204 No Content", response)
+            self.assertIn("Upload-Offset: 5", self.send_request("HEAD", location))
+            response = self.send_request("PUT", location, body="89", headers={"Content-Range": "bytes 8-9/10"})
+            self.assertIn("HTTP/1.1 409 Conflict", response)
+            self.assertIn("Upload-Offset: 5", response)
+            response = self.send_request("PUT", location, body="56789", headers={"Content-Range": "bytes 5-9/10"})
+            self.assertIn("HTTP/1.1 201 Created", response)
+            self.assertTrue(self.send_request("GET", "/resumable.txt").endswith("\r\n\r\n0123456789"))
+            self.assertIn("404 Not Found", self.send_request("HEAD", location))
+        finally:
+            self.send_request("DELETE", "/resumable.txt")
+
+    def test_manifest(self):
+        """/_manifest da el sha256 de cada fichero público y lo actualiza cuando el fichero cambia"""
+        try:
+            self.send_request("PUT", "/manifest.txt", body="uno")
+            manifest = json.loads(self.send_request("GET", "/_manifest").split("\r\n\r\n", 1)[1])
+            entries = {entry["path"]: entry for entry in manifest}
+            self.assertEqual(entries["manifest.txt"]["sha256"], hashlib.sha256(b"uno").hexdigest())
+            self.assertEqual(entries["manifest.txt"]["size"], 3)
+            self.assertFalse(any(path.startswith("private") for path in entries))
+            self.send_request("PUT", "/manifest.txt", body="dos")
+            manifest = json.loads(self.send_request("GET", "/_manifest").split("\r\n\r\n", 1)[1])
+            entries = {entry["path"]: entry for entry in manifest}
+            self.assertEqual(entries["manifest.txt"]["sha256"], hashlib.sha256(b"dos").hexdigest())
+        finally:
+            self.send_request("DELETE", "/manifest.txt")
+
+    def test_archive(self):
+        """/_archive devuelve un tar con los ficheros pedidos y nunca incluye los privados"""
+        response = self.send_request("GET", "/_archive?glob=*.txt&path=a.gif", is_binary=True)
+        head, _, body = response.partition(b"\r\n\r\n")
+        self.assertIn(b"Content-Type: application/x-tar", head)
+        with tarfile.open(fileobj=io.BytesIO(body)) as tar:
+            names = tar.getnames()
+            self.assertEqual(names[0], "a.gif")
+            self.assertIn("a.txt", names)
+            with open("a.gif", "rb") as f:
+                self.assertEqual(tar.extractfile("a.gif").read(), f.read())
+        self.assertIn("403 Forbidden", self.send_request("GET", "/_archive?path=private/resources.json"))
+        response = self.send_request("POST", "/_archive", body=json.dumps({"glob": "*"}), is_binary=True)
+        with tarfile.open(fileobj=io.BytesIO(response.partition(b"\r\n\r\n")[2])) as tar:
+            self.assertFalse(any(name.startswith("private") for name in tar.getnames()))
+
+    def test_health(self):
+        response = self.send_request("GET", "/_health")
+        self.assertIn("200 OK", response)
+
+    def test_replication_stream(self):
+        """/resources/_changes empieza con todas las categorías y sigue con los cambios de cualquiera"""
+        with socket.create_connection((self.host, self.port), timeout=5) as sock:
+            sock.sendall(b"GET /resources/_changes HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            received = b''
+            while b"event: reset" not in received:
+                received += sock.recv(65536)
+            self.send_request("POST", "/resources/perros", body=json.dumps({"nombre": "Réplica"}))
+            while b"event: create" not in received:
+                received += sock.recv(65536)
+        body = received.decode("utf-8").split("\r\n\r\n", 1)[1]
+        events = {kind: json.loads(data) for _, kind, data in parse_events(body.splitlines())}
+        self.assertIn("perros", events["reset"]["data"])
+        self.assertEqual(events["create"]["category"], "perros")
+        self.assertEqual(events["create"]["data"]["nombre"], "Réplica")
+        status = json.loads(self.send_request("GET", "/_replication").split("\r\n\r\n", 1)[1])
+        self.assertEqual(status["role"], "primary")
+
+class LocalServer:
+    """A SimpleHTTPServer with its own options, on a port picked by the OS, running in a thread."""
+
+    def __init__(self, **options):
+        self.quiet = redirect_stdout(io.StringIO())  # its console log would be mixed with the test output
+        self.quiet.__enter__()
+        self.server = nServer.SimpleHTTPServer(port=0, **options)
+        self.thread = threading.Thread(target=self.server.start, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if self.server.port:
+                try:
+                    # A whole request, so the probe has been accepted and answered (not just queued) below.
+                    with socket.create_connection(("localhost", self.server.port), timeout=1) as probe:
+                        probe.sendall(b"GET /_health HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+                        if read_until_closed(probe).startswith(b"HTTP/1.1 "):
+                            break
+                except OSError:
+                    pass
+            time.sleep(0.05)
+        while self.server.connections and time.monotonic() < deadline:
+            time.sleep(0.01)  # the probe's thread gives its slot back just after closing
+        return self.server
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.thread.join(10)
+        self.quiet.__exit__(*exc)
+
+
+def read_until_closed(sock):
+    response = b''
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            return response
+        response += data
+
+
+class TestPathCache(unittest.TestCase):
+    def test_lookup_racing_an_invalidation_is_not_cached(self):
+        """Lo que se calculó mientras cambiaban los ficheros no se guarda en la caché de rutas"""
+        with redirect_stdout(io.StringIO()):
+            server = nServer.SimpleHTTPServer(port=0)
+        content_type = server.get_content_type
+
+        def changed_meanwhile(path):
+            server.invalidate_path_cache()  # e.g. a PUT or an inotify event on another thread
+            return content_type(path)
+
+        server.get_content_type = changed_meanwhile
+        server.resolve_static("a.txt")
+        self.assertNotIn("a.txt", server.path_cache)
+        server.get_content_type = content_type
+        server.resolve_static("a.txt")
+        self.assertIn("a.txt", server.path_cache)
+
+
+class TestDeadlines(unittest.TestCase):
+    def test_header_timeout(self):
+        """Un cliente que no termina de mandar las cabeceras a tiempo recibe 408 y se cierra la conexión"""
+        with LocalServer(header_timeout=0.5) as server:
+            with socket.create_connection(("localhost", server.port), timeout=5) as sock:
+                started = time.monotonic()
+                sock.sendall(b"GET /a.txt HTTP/1.1\r\nHost: loc")
+                response = read_until_closed(sock)
+                self.assertLess(time.monotonic() - started, 4)
+            self.assertIn(b"408 Request Timeout", response)
+            self.assertEqual(server.metrics.value("http_slow_clients_total", (("phase", "headers"),)), 1)
+
+
+class TestDrain(unittest.TestCase):
+    def test_sigterm_finishes_in_flight_request(self):
+        """Con SIGTERM el servidor deja de aceptar conexiones pero termina la petición en curso"""
+        with socket.socket() as probe:
+            probe.bind(("localhost", 0))
+            port = probe.getsockname()[1]
+        server = subprocess.Popen([sys.executable, "nServer.py", "--port", str(port)],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + 5
+            while True:
+                try:
+                    sock = socket.create_connection(("localhost", port), timeout=5)
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.05)
+            with sock:
+                sock.sendall(b"PUT /drain.txt HTTP/1.1\r\nHost: localhost\r\nContent-Length: 10\r\n\r\n01234")
+                time.sleep(0.3)
+                server.send_signal(signal.SIGTERM)
+                time.sleep(1)  # more than one accept poll: the listener is closed by now
+                with self.assertRaises(OSError):
+                    socket.create_connection(("localhost", port), timeout=1).close()
+                sock.sendall(b"56789")
+                response = read_until_closed(sock)
+            self.assertIn(b"201 Created", response)
+            self.assertEqual(server.wait(10), 0)
+            with open(os.path.join("Server", "drain.txt"), "rb") as f:
+                self.assertEqual(f.read(), b"0123456789")
+        finally:
+            if server.poll() is None:
+                server.kill()
+            if os.path.exists(os.path.join("Server", "drain.txt")):
+                os.remove(os.path.join("Server", "drain.txt"))
+
+
+class TestAdmission(unittest.TestCase):
+    def test_overload_rejected_without_threads(self):
+        """Con el servidor lleno cada conexión recibe 503 sin que se cree un hilo por ella"""
+        with LocalServer(max_in_flight=1) as server:
+            with socket.create_connection(("localhost", server.port), timeout=5) as busy:
+                busy.sendall(b"GET /a.txt HTTP/1.1\r\n")  # holds the only slot while the headers are pending
+                time.sleep(0.2)
+                threads = threading.active_count()
+                rejected = []
+                try:
+                    for _ in range(30):
+                        sock = socket.create_connection(("localhost", server.port), timeout=5)
+                        rejected.append(sock)
+                        sock.sendall(b"GET /a.txt HTTP/1.1\r\nHost: localhost\r\n\r\n")
+                        self.assertIn(b"503 Service Unavailable", read_until_closed(sock))
+                    # Still connected, so nothing on the server side may be waiting on them.
+                    self.assertLessEqual(threading.active_count(), threads)
+                finally:
+                    for sock in rejected:
+                        sock.close()
+
+    def test_streams_and_idle_connections_do_not_count(self):
+        """Los streams de eventos y las conexiones keep-alive inactivas no ocupan plazas de max_in_flight"""
+        with LocalServer(max_in_flight=2, max_subscribers=3, keepalive_timeout=30) as server:
+            streams, idle = [], []
+            try:
+                for _ in range(3):
+                    sock = socket.create_connection(("localhost", server.port), timeout=5)
+                    sock.sendall(b"GET /resources/_changes HTTP/1.1\r\nHost: localhost\r\n\r\n")
+                    received = b''
+                    while b"event: reset" not in received:
+                        received += sock.recv(65536)
+                    streams.append(sock)
+                for _ in range(2):
+                    conn = http.client.HTTPConnection("localhost", server.port, timeout=5)
+                    conn.request("GET", "/a.txt")
+                    conn.getresponse().read()
+                    idle.append(conn)
+                conn = http.client.HTTPConnection("localhost", server.port, timeout=5)
+                conn.request("GET", "/a.txt", headers={"Connection": "close"})
+                self.assertEqual(conn.getresponse().status, 200)
+                conn.close()
+                for conn in idle:  # and the idle ones can carry on
+                    conn.request("GET", "/a.txt")
+                    self.assertEqual(conn.getresponse().status, 200)
+                with socket.create_connection(("localhost", server.port), timeout=5) as sock:
+                    sock.sendall(b"GET /resources/_changes HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+                    self.assertIn(b"503 Service Unavailable", read_until_closed(sock))
+            finally:
+                for sock in streams:
+                    sock.close()
+                for conn in idle:
+                    conn.close()
+
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.blobs = BlobStore(os.path.join(self.tmp.name, "blobs"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def put(self, name, data):
+        with redirect_stdout(io.StringIO()):
+            return self.blobs.store(os.path.join(self.tmp.name, name), name, data)
+
+    def test_duplicates_share_a_read_only_blob(self):
+        """Un contenido repetido se guarda una vez y nadie puede editarlo sin reemplazarlo"""
+        digest = self.put("a.txt", b"hola")
+        self.put("b.txt", b"hola")
+        a, b = (os.stat(os.path.join(self.tmp.name, name)) for name in ("a.txt", "b.txt"))
+        self.assertEqual(a.st_ino, b.st_ino)
+        self.assertEqual(a.st_ino, os.stat(self.blobs.blob_path(digest)).st_ino)
+        self.assertEqual(stat.S_IMODE(a.st_mode) & 0o222, 0)
+
+    def test_blob_modified_in_place_is_not_reused(self):
+        """Un blob editado en el sitio (p. ej. por root) no se enlaza a nuevas subidas"""
+        self.put("a.txt", b"hola")
+        self.put("b.txt", b"hola")
+        with open(os.path.join(self.tmp.name, "a.txt"), "r+b") as f:
+            f.write(b"HOLA")
+        self.put("c.txt", b"hola")
+        with open(os.path.join(self.tmp.name, "c.txt"), "rb") as f:
+            self.assertEqual(f.read(), b"hola")
+        self.assertNotEqual(os.stat(os.path.join(self.tmp.name, "c.txt")).st_ino,
+                            os.stat(os.path.join(self.tmp.name, "a.txt")).st_ino)
+
+
+class TestSQLiteResourceStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = SQLiteResourceStore(os.path.join(self.tmp.name, "resources.db"))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_crud(self):
+        """Los elementos reciben ids consecutivos y se buscan, modifican y borran por id"""
+        self.assertIsNone(self.store.add_item("gatos", {"nombre": "A"}))
+        self.assertEqual(self.store.add_item("gatos", {"nombre": "A"}, create=True), {"id": 1, "nombre": "A"})
+        self.store.add_item("gatos", {"nombre": "B"})
+        self.assertEqual(self.store.update_item("gatos", "2", {"nombre": "C"}), {"id": 2, "nombre": "C"})
+        self.assertEqual(self.store.delete_item("gatos", 1), {"id": 1, "nombre": "A"})
+        self.assertIsNone(self.store.delete_item("gatos", 1))
+        self.assertEqual(self.store.get_category("gatos"), [{"id": 2, "nombre": "C"}])
+        self.assertIsNone(self.store.get_category("perros"))
+
+    def test_import_export_roundtrip(self):
+        data = {"gatos": [{"id": 1, "nombre": "Mía"}, {"id": 7, "nombre": "Tom"}], "perros": []}
+        src, dst = os.path.join(self.tmp.name, "in.json"), os.path.join(self.tmp.name, "out.json")
+        with open(src, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        self.assertEqual(import_json(self.store, src), 2)
+        self.assertEqual(self.store.add_item("gatos", {"nombre": "Leo"})["id"], 8)
+        export_json(self.store, dst)
+        with open(dst, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), {"gatos": data["gatos"] + [{"id": 8, "nombre": "Leo"}], "perros": []})
+
+
+class TestReplicator(unittest.TestCase):
+    def test_apply_events(self):
+        """Una réplica reconstruye el estado a partir de un reset y los cambios posteriores"""
+        store = MemoryResourceStore()
+        changes = []
+        replica = Replicator("http://localhost:8080", store, lambda *change: changes.append(change),
+                             lambda category: nullcontext())
+        replica.handle("reset", {"seq": 4, "category": None, "id": None,
+                                 "data": {"gatos": [{"id": 1, "nombre": "Mía"}]}})
+        self.assertTrue(replica.synced.is_set())
+        replica.handle("create", {"seq": 5, "category": "gatos", "id": 2, "data": {"id": 2, "nombre": "Tom"}})
+        replica.handle("update", {"seq": 6, "category": "gatos", "id": 1, "data": {"id": 1, "nombre": "Leo"}})
+        replica.handle("create", {"seq": 7, "category": "perros", "id": 1, "data": {"id": 1, "nombre": "Rex"}})
+        replica.handle("delete", {"seq": 8, "category": "gatos", "id": 2, "data": None})
+        self.assertEqual(store.dump(), {"gatos": [{"id": 1, "nombre": "Leo"}], "perros": [{"id": 1, "nombre": "Rex"}]})
+        self.assertEqual(len(changes), 5)
+        replica.handle("heartbeat", {"seq": 10})
+        self.assertEqual(replica.status()["seq_lag"], 2)
+
+
+class TestMultipartParser(unittest.TestCase):
+    def test_split_anywhere(self):
+        """Las partes salen iguales se corte el cuerpo por donde se corte"""
+        body = encode_multipart("xyz", [("a", "uno.bin", "application/octet-stream", bytes(range(256)) + b"\r\n--xy"),
+                                        ("b", "dos.txt", "text/plain", b"")])
+        for step in (1, 2, 5, 13, len(body)):
+            parts = []
+
+            class Sink:
+                def __init__(self, part):
+                    self.part, self.data = part, b""
+
+                def write(self, data):
+                    self.data += data
+
+                def close(self):
+                    parts.append((self.part.name, self.part.filename, self.data))
+
+            parser = MultipartParser("xyz", Sink)
+            for i in range(0, len(body), step):
+                parser.feed(body[i:i + step])
+            parser.finish()
+            self.assertEqual(parts, [("a", "uno.bin", bytes(range(256)) + b"\r\n--xy"), ("b", "dos.txt", b"")])
+
+
+class TestContentRange(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_content_range("bytes 0-4/10"), (0, 4, 10))
+        self.assertEqual(parse_content_range("bytes 5-9/*"), (5, 9, None))
+        for value in ("bytes 5-4/10", "bytes 0-10/10", "bytes=0-4/10", "", None):
+            with self.assertRaises(ValueError):
+                parse_content_range(value)
+
+
+class TestUploadStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.uploads = UploadStore(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_failed_commit_keeps_the_upload(self):
+        """Si no se puede instalar el fichero, lo recibido se conserva y la subida sigue existiendo"""
+        upload_id = self.uploads.create("x.txt", 5)["id"]
+        chunk = self.uploads.begin_chunk(upload_id, "bytes 0-4/5", 5)
+        chunk.feed(b"12345")
+        with self.assertRaises(UploadError) as cm:
+            self.uploads.remove(upload_id)
+        self.assertEqual(cm.exception.status, "409 Conflict")
+        with self.assertRaises(OSError):
+            chunk.pending.commit(os.path.join(self.tmp.name, "missing", "x.txt"))
+        chunk.close()
+        self.assertEqual(self.uploads.info(upload_id)["offset"], 5)
+        self.assertTrue(self.uploads.remove(upload_id))
+
+
+class TestArchive(unittest.TestCase):
+    def test_select_paths(self):
+        available = ["a.txt", "b.gif", "docs/c.txt"]
+        self.assertEqual(select_paths(available, ["/b.gif", "a.txt"], "*.txt"), ["b.gif", "a.txt", "docs/c.txt"])
+        self.assertEqual(select_paths(available, [], "docs/*"), ["docs/c.txt"])
+
+    def test_tar_stream(self):
+        with tempfile.TemporaryDirectory() as root:
+            name = "ñ" * 120 + ".txt"  # needs a PAX header
+            for file_name, data in ((name, b"x" * 1000), ("empty", b"")):
+                with open(os.path.join(root, file_name), "wb") as f:
+                    f.write(data)
+            archive = b"".join(tar_stream(root, [name, "gone", "empty"], chunk=300))
+        self.assertEqual(len(archive) % tarfile.BLOCKSIZE, 0)
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            self.assertEqual(tar.getnames(), [name, "empty"])
+            self.assertEqual(tar.extractfile(name).read(), b"x" * 1000)
+
+
+class TestProfileCapture(unittest.TestCase):
+    def test_concurrent_requests(self):
+        """Una petición que llega mientras otra se perfila se atiende sin perfilar, en vez de fallar"""
+        with tempfile.TemporaryDirectory() as out_dir:
+            capture = ProfileCapture(out_dir)
+            capture.start()
+            inside, release = threading.Event(), threading.Event()
+
+            def slow():
+                inside.set()
+                release.wait(5)
+                return "lenta"
+
+            results = []
+            thread = threading.Thread(target=lambda: results.append(capture.run(slow)))
+            thread.start()
+            self.assertTrue(inside.wait(5))
+            self.assertEqual(capture.run(lambda x: x * 2, 21), 42)
+            release.set()
+            thread.join(5)
+            self.assertEqual(results, ["lenta"])
+            self.assertEqual(capture.status()["requests"], 1)
+            self.assertTrue(os.path.exists(capture.stop()))
+
+
+class TestPlanSync(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.local = {}
+        for name, data in (("same.txt", b"igual"), ("changed.txt", b"nuevo"), ("local.txt", b"solo aqui")):
+            path = os.path.join(self.tmp.name, name)
+            with open(path, "wb") as f:
+                f.write(data)
+            self.local[name] = path
+        entry = lambda data: {"size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+        self.remote = {"same.txt": entry(b"igual"), "changed.txt": entry(b"viejo"), "remote.txt": entry(b"solo alli")}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_push(self):
+        self.assertEqual(plan_sync("push", self.local, self.remote),
+                         [("upload", "changed.txt"), ("upload", "local.txt")])
+        self.assertIn(("delete", "remote.txt"), plan_sync("push", self.local, self.remote, delete=True))
+
+    def test_pull(self):
+        self.assertEqual(plan_sync("pull", self.local, self.remote, delete=True),
+                         [("download", "changed.txt"), ("download", "remote.txt"), ("delete", "local.txt")])
+
+
+class TestHttpCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = HttpCache(self.tmp.name, max_bytes=10)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def headers(self, etag):
+        return f'HTTP/1.1 200 OK\r\nETag: {etag}\r\nLast-Modified: Mon, 19 Oct 2026 12:00:00 GMT'
+
+    def test_revalidation(self):
+        url = "http://localhost:8080/a.txt"
+        self.assertEqual(self.cache.conditional_headers(url), [])
+        self.assertTrue(self.cache.store(url, self.headers('"v1"'), "text/plain", b"hola"))
+        self.assertIn('If-None-Match: "v1"', self.cache.conditional_headers(url))
+        self.assertEqual(self.cache.load(url, 'HTTP/1.1 304 Not Modified\r\nETag: "v2"'), ("text/plain", b"hola"))
+        self.assertIn('If-None-Match: "v2"', HttpCache(self.tmp.name).conditional_headers(url))
+        self.assertFalse(self.cache.store(url, "HTTP/1.1 200 OK", "text/plain", b"sin validador"))
+        self.assertEqual(self.cache.conditional_headers(url), [])
+
+    def test_lru_eviction(self):
+        for name in ("a", "b"):
+            self.cache.store(f"http://h/{name}", self.headers('"x"'), "text/plain", b"12345")
+        self.cache.load("http://h/a")  # a is now more recently used than b
+        self.cache.store("http://h/c", self.headers('"x"'), "text/plain", b"123")
+        self.assertEqual(sorted(entry["url"] for entry in self.cache.entries.values()), ["http://h/a", "http://h/c"])
+        self.assertFalse(self.cache.store("http://h/big", self.headers('"x"'), "text/plain", b"x" * 11))
+
+
+class TestBalancer(unittest.TestCase):
+    def test_consistent_hash(self):
+        """Con hash cada ruta va siempre al mismo backend y quitar uno solo mueve sus rutas"""
+        balancer = Balancer(["localhost:9001", "localhost:9002", "localhost:9003"], "hash", health_interval=0)
+        paths = [f"/fichero{i}.txt" for i in range(300)]
+        before = {path: balancer.candidates(path, [])[0] for path in paths}
+        self.assertEqual(before, {path: balancer.candidates(path + "?v=2", [])[0] for path in paths})
+        self.assertEqual(len(set(before.values())), 3)
+        down = balancer.backends[0]
+        down.healthy = False
+        after = {path: balancer.candidates(path, [])[0] for path in paths}
+        for path in paths:
+            if before[path] is not down:
+                self.assertIs(after[path], before[path])
+            else:
+                self.assertIsNot(after[path], down)
+
+    def test_least_conn(self):
+        balancer = Balancer(["localhost:9001", "localhost:9002"], "least-conn", health_interval=0)
+        balancer.backends[0].active = 5
+        for _ in range(3):
+            self.assertIs(balancer.candidates("/", [])[0], balancer.backends[1])
+        self.assertEqual(balancer.candidates("/", [balancer.backends[1]]), [balancer.backends[0]])
+
+
+class TestProxy(unittest.TestCase):
+    def request(self, port, raw):
+        with socket.create_connection(("localhost", port), timeout=10) as sock:
+            sock.sendall(raw)
+            head, _, body = read_until_closed(sock).partition(b"\r\n\r\n")
+        return head.decode("latin-1"), body
+
+    def test_proxy_in_front_of_a_backend(self):
+        """El proxy reintenta en otro backend si uno no responde, filtra cabeceras hop-by-hop y devuelve 502 sin backends"""
+        with socket.socket() as unused:
+            unused.bind(("localhost", 0))
+            dead = f"localhost:{unused.getsockname()[1]}"  # closed again before the proxy connects
+        with open(os.path.join("Server", "a.txt"), "rb") as f:
+            expected = f.read()
+        big = os.urandom(2 * 1024 * 1024)  # over PROXY_BUFFER_MAX, so it is relayed as it arrives
+        with LocalServer(keepalive_timeout=0.2) as backend:
+            seen = []
+            route = backend.route
+            backend.route = lambda method, path, headers, *args: seen.append(headers) or route(method, path, headers, *args)
+            with LocalServer(backends=[f"localhost:{backend.port}", dead]) as proxy:
+                for _ in range(3):
+                    head, body = self.request(proxy.port, b"GET /a.txt HTTP/1.1\r\nHost: localhost\r\n"
+                                              b"Proxy-Authorization: Basic eDp5\r\nX-Forwarded-For: 10.0.0.1\r\n"
+                                              b"Connection: close\r\n\r\n")
+                    self.assertTrue(head.startswith("HTTP/1.1 200"), head)
+                    self.assertEqual(body, expected)
+                    self.assertEqual(head.lower().count("\r\nconnection:"), 1)
+                    time.sleep(0.3)  # the backend closes the pooled connection, which is then retried on a new one
+                self.assertFalse(proxy.balancer.backends[1].healthy)
+                self.assertEqual(seen[-1]["X-Forwarded-For"], "10.0.0.1, 127.0.0.1")
+                self.assertNotIn("Proxy-Authorization", seen[-1])
+                try:
+                    head, _ = self.request(proxy.port, b"PUT /proxy_big.bin HTTP/1.1\r\nHost: localhost\r\n"
+                                           b"Content-Length: %d\r\nConnection: close\r\n\r\n" % len(big) + big)
+                    self.assertTrue(head.startswith("HTTP/1.1 201"), head)
+                    head, body = self.request(proxy.port, b"GET /proxy_big.bin HTTP/1.1\r\nHost: localhost\r\n"
+                                              b"Connection: close\r\n\r\n")
+                    self.assertTrue(head.startswith("HTTP/1.1 200"), head)
+                    self.assertEqual(body, big)
+                finally:
+                    self.request(proxy.port, b"DELETE /proxy_big.bin HTTP/1.1\r\nConnection: close\r\n\r\n")
+        with LocalServer(backends=[dead]) as proxy:
+            head, _ = self.request(proxy.port, b"GET /a.txt HTTP/1.1\r\nConnection: close\r\n\r\n")
+            self.assertTrue(head.startswith("HTTP/1.1 502"), head)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_burst_then_refill(self):
+        limiter = RateLimiter(rate=2, burst=3)
+        self.assertEqual([limiter.acquire("1.2.3.4", now=0) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(limiter.acquire("1.2.3.4", now=0), 0.5)
+        self.assertEqual(limiter.acquire("5.6.7.8", now=0), 0)
+        self.assertEqual(limiter.acquire("1.2.3.4", now=0.5), 0)
+
+    def test_parse_limit(self):
+        self.assertEqual(parse_limit("write=5/20"), ("write", 5.0, 20.0))
+        self.assertEqual(parse_limit("read=50"), ("read", 50.0, None))
+        with self.assertRaises(ValueError):
+            parse_limit("write")
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
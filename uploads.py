@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Subidas reanudables para nServer. Un cliente crea la subida con
+    POST /_uploads ({"target": "/fichero", "size": N}) y recibe un id; después
+    envía el fichero por trozos con PUT /_uploads/{id} y Content-Range, cada
+    uno a partir de lo que el servidor ya tiene (HEAD /_uploads/{id} lo dice
+    en Upload-Offset). Lo recibido se va añadiendo a
+    Server/private/uploads/{id}.part, así que si la conexión se corta basta con
+    preguntar el offset y seguir; cuando llega el último byte el fichero se
+    renombra a su destino de forma atómica.
+"""
+import json
+import os
+import re
+import secrets
+import threading
+import time
+
+from storage import DURABILITY_FILE, AtomicFile, atomic_write
+
+UPLOADS_PATH = "/_uploads"
+UPLOAD_TTL = 24 * 3600  # unfinished uploads untouched for this long are removed
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_RANGE_RE = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+
+
+class UploadError(Exception):
+    """A request the upload cannot take: status line, message and the offset the client should resume from."""
+
+    def __init__(self, status, message, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def parse_content_range(value):
+    """(start, end, total or None) from 'bytes START-END/TOTAL' or 'bytes START-END/*'."""
+    match = _RANGE_RE.match((value or "").strip())
+    if not match:
+        raise ValueError(f"Invalid Content-Range {value!r}, expected 'bytes START-END/TOTAL'")
+    start, end = int(match.group(1)), int(match.group(2))
+    total = None if match.group(3) == "*" else int(match.group(3))
+    if end < start or (total is not None and end >= total):
+        raise ValueError(f"Invalid Content-Range {value!r}")
+    return start, end, total
+
+
+class Chunk:
+    """Consumer for RequestParser.stream_body(): appends the body of one PUT to the upload's part file."""
+
+    def __init__(self, store, upload_id, meta, pending):
+        self.store = store
+        self.upload_id = upload_id
+        self.meta = meta
+        self.pending = pending
+        self.error = None
+        self.closed = False
+
+    @property
+    def offset(self):
+        return self.pending.size
+
+    @property
+    def complete(self):
+        return self.meta["size"] is not None and self.pending.size == self.meta["size"]
+
+    def feed(self, data):
+        self.pending.write(data)
+
+    def close(self):
+        """Flush what was received, even if the request was cut short, so the client can resume after it."""
+        if not self.closed:
+            self.closed = True
+            try:
+                if not self.pending.file.closed:  # a failed commit already closed (and kept) it
+                    self.pending.sync()
+                    self.pending.close()
+            finally:
+                self.store.release(self.upload_id)
+
+    def committed(self):
+        """Called once pending has been committed to the target: forget the upload."""
+        self.closed = True
+        self.store.release(self.upload_id)
+        self.store.remove(self.upload_id)
+
+
+class RejectedChunk:
+    """Stands in for a Chunk the upload refused: the body is read and dropped, then error is reported."""
+
+    def __init__(self, error):
+        self.error = error
+
+    def feed(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+class UploadStore:
+    """Unfinished uploads: <id>.part with the bytes received so far and <id>.json with target and size."""
+
+    def __init__(self, directory, durability=DURABILITY_FILE, ttl=UPLOAD_TTL):
+        self.directory = directory
+        self.durability = durability
+        self.ttl = ttl
+        self.active = set()  # ids with a chunk being received
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, upload_id):
+        if not _ID_RE.match(upload_id or ""):
+            return None, None
+        base = os.path.join(self.directory, upload_id)
+        return base + ".part", base + ".json"
+
+    def _load(self, upload_id):
+        part_path, meta_path = self._paths(upload_id)
+        if part_path is None:
+            return None
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, upload_id, meta):
+        data = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        atomic_write(self._paths(upload_id)[1], data, self.durability)
+
+    def create(self, target, size=None):
+        """Start an upload for target (a file name under the server directory) and return its info."""
+        self.sweep()
+        upload_id = secrets.token_hex(16)
+        part_path, _ = self._paths(upload_id)
+        open(part_path, "xb").close()
+        self._save(upload_id, {"target": target, "size": size, "created": time.time()})
+        return self.info(upload_id)
+
+    def info(self, upload_id):
+        """{"id", "target", "size", "offset"} or None if there is no such upload."""
+        meta = self._load(upload_id)
+        if meta is None:
+            return None
+        try:
+            offset = os.path.getsize(self._paths(upload_id)[0])
+        except OSError:
+            return None
+        return {"id": upload_id, "target": meta["target"], "size": meta["size"], "offset": offset}
+
+    def begin_chunk(self, upload_id, content_range, content_length):
+        """A Chunk to receive a PUT body at the current offset; raises UploadError if it cannot be taken."""
+        meta = self._load(upload_id)
+        if meta is None:
+            raise UploadError("404 Not Found", "No such upload")
+        try:
+            start, end, total = parse_content_range(content_range)
+        except ValueError as e:
+            raise UploadError("400 Bad Request", str(e))
+        if end - start + 1 != content_length:
+            raise UploadError("400 Bad Request", "Content-Range does not match Content-Length")
+        if total is not None and meta["size"] is not None and total != meta["size"]:
+            raise UploadError("400 Bad Request", f"The upload is {meta['size']} bytes long, not {total}")
+        if meta["size"] is not None and end >= meta["size"]:
+            raise UploadError("400 Bad Request", "Content-Range goes past the end of the upload")
+        with self.lock:
+            if upload_id in self.active:
+                raise UploadError("409 Conflict", "Another chunk of this upload is being received")
+            self.active.add(upload_id)
+        try:
+            pending = AtomicFile(None, self.durability, tmp_path=self._paths(upload_id)[0])
+            if start != pending.size:
+                pending.close()
+                raise UploadError("409 Conflict", f"Expected a chunk starting at {pending.size}", pending.size)
+            if meta["size"] is None and total is not None:
+                meta["size"] = total
+                self._save(upload_id, meta)
+        except BaseException:
+            self.release(upload_id)
+            raise
+        return Chunk(self, upload_id, meta, pending)
+
+    def release(self, upload_id):
+        with self.lock:
+            self.active.discard(upload_id)
+
+    def remove(self, upload_id):
+        """Drop an upload (finished or abandoned). Returns False if it did not exist.
+
+        Raises UploadError (409) while a chunk of it is being received.
+        """
+        part_path, meta_path = self._paths(upload_id)
+        if part_path is None or not os.path.exists(meta_path):
+            return False
+        with self.lock:
+            if upload_id in self.active:
+                raise UploadError("409 Conflict", "A chunk of this upload is being received")
+            for path in (meta_path, part_path):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+        return True
+
+    def sweep(self):
+        """Remove the uploads nobody has added to for ttl seconds."""
+        now = time.time()
+        for name in os.listdir(self.directory):
+            upload_id, ext = os.path.splitext(name)
+            if ext != ".json" or upload_id in self.active:
+                continue
+            part_path, meta_path = self._paths(upload_id)
+            if part_path is None:
+                continue
+            try:
+                touched = os.path.getmtime(part_path if os.path.exists(part_path) else meta_path)
+            except OSError:
+                continue
+            if now - touched > self.ttl:
+                print(f"Removing abandoned upload {upload_id}")
+                try:
+                    self.remove(upload_id)
+                except UploadError:
+                    pass  # a chunk started meanwhile